@@ -3,12 +3,17 @@ from dash import html
 import dash_bootstrap_components as dbc
 from dash_bootstrap_templates import ThemeChangerAIO
 
+import monitoring
+from pages import fragments, staticbundle
+
 doc_title = 'Dashboard for the analysis of mRNA degradation fragments'
 
-e_stylesheets = [dbc.themes.JOURNAL, dbc.icons.FONT_AWESOME]
+# Local copies when bundled (see pages/staticbundle.py), else the CDNs
+e_stylesheets = [staticbundle.stylesheet(dbc.themes.JOURNAL),
+                 staticbundle.stylesheet(dbc.icons.FONT_AWESOME)]
 
 app = dash.Dash(__name__, use_pages=True,
-                assets_ignore='.#custom.css',
+                assets_ignore='.#custom.css|' + staticbundle.assets_ignore,
                 meta_tags=[
                     {"name": "viewport",
                      "content": "width=device-width, initial-scale=1,\
@@ -17,15 +22,26 @@ app = dash.Dash(__name__, use_pages=True,
                 external_stylesheets=e_stylesheets)
 
 theme_change = ThemeChangerAIO(aio_id="theme",
+                               custom_themes=staticbundle.local_themes(),
                                radio_props={
                                    "className":
                                    "description_h4",
-                                   'value': dbc.themes.JOURNAL},
+                                   "options": staticbundle.theme_options(),
+                                   'value': staticbundle.theme_value(
+                                       dbc.themes.JOURNAL)},
                                button_props={
                                    "className":
                                    "rounded-pill me-4 description_h3"})
 
 app.config.suppress_callback_exceptions = True
+# Flask instance, for WSGI servers (see wsgi.py)
+server = app.server
+# Long lived cache for fingerprinted assets, pre-rendered pages
+staticbundle.init_app(server)
+fragments.init_app(app)
+# Compressed responses, callback payload log and metrics (see
+# monitoring.py)
+monitoring.init_app(app)
 # load_figure_template('journal')
 
 inavbar = dbc.Nav(
@@ -0,0 +1,119 @@
+"""
+Resident memory of worker processes holding the datasets.
+
+Starts N worker processes that each load every dataset, either from the
+TSV files with read_csv or from the memory mapped Arrow files (built
+first if needed), and run import_data for all PyDegradome settings.
+Then, as the app does, they load the warm cache entries of every
+dataset and setting (built first if needed): only their frames ('warm
+frames', memory mapped) or whole entries ('warm cache', with the
+records, catalogs and indexes each worker holds as Python objects).
+Reports per worker RSS and PSS (proportional set size, which splits
+shared pages between the processes using them) read from /proc, so it
+needs Linux.
+
+    python benchmarks/bench_arrow_memory.py [--workers 4]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(repo_dir)
+sys.path.insert(0, repo_dir)
+
+
+def memory_kib():
+    # RSS and PSS of this process
+    values = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            key, *rest = line.split()
+            if key in ('Rss:', 'Pss:'):
+                values[key[:-1]] = int(rest[0])
+    return values
+
+
+def worker(mode, ready, results):
+    from pages import arrowdata
+    from pages import bibsearch as bib
+
+    from pages import warmcache
+
+    before = memory_kib()
+    if mode == 'warm frames':
+        for base in bib.dataset_bases():
+            for settings in warmcache.settings_keys(base):
+                path = warmcache.entry_dir(base, settings)
+                for name in warmcache.frame_names:
+                    warmcache.read_frame(f'{path}/{name}.arrow')
+        return measured(before, ready, results)
+    if mode == 'warm cache':
+        for base in bib.dataset_bases():
+            for settings in warmcache.settings_keys(base):
+                warmcache.get(base, settings)
+        return measured(before, ready, results)
+    if mode == 'read_csv':
+        # Ignore the Arrow files
+        arrowdata.is_current = lambda name, base: False
+    for base in bib.preload_datasets():
+        ivars = bib.import_vars(base)
+        for settings in (0, 1, 2):
+            bib.import_data(base, ivars, settings)
+    measured(before, ready, results)
+
+
+def measured(before, ready, results):
+    after = memory_kib()
+    results.put({key: after[key] - before[key] for key in after})
+    # Stay alive until every worker has measured, so shared pages are
+    # counted as shared
+    ready.wait()
+
+
+def run(mode, workers):
+    context = multiprocessing.get_context('spawn')
+    ready = context.Event()
+    results = context.Queue()
+    processes = [context.Process(target=worker,
+                                 args=(mode, ready, results))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    measures = [results.get() for _ in processes]
+    ready.set()
+    for process in processes:
+        process.join()
+    return measures
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    from pages import arrowdata
+    from pages import bibsearch as bib
+    from pages import warmcache
+    for base in bib.dataset_bases():
+        if not all(arrowdata.is_current(name, base)
+                   for name in arrowdata.table_files):
+            arrowdata.build(base)
+        for settings in warmcache.settings_keys(base):
+            if warmcache.read(base, settings) is None:
+                warmcache.write(base, settings,
+                                warmcache.derive(base, settings))
+
+    print(f"{'loader':>11} {'workers':>8} {'RSS/worker MiB':>15} "
+          f"{'PSS/worker MiB':>15} {'PSS total MiB':>14}")
+    for mode in ('read_csv', 'arrow', 'warm frames', 'warm cache'):
+        measures = run(mode, args.workers)
+        rss = sum(m['Rss'] for m in measures) / len(measures) / 1024
+        pss = sum(m['Pss'] for m in measures) / 1024
+        print(f"{mode:>11} {args.workers:>8} {rss:>15.1f} "
+              f"{pss / len(measures):>15.1f} {pss:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
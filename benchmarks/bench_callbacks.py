@@ -0,0 +1,246 @@
+"""
+Callback level benchmark of the Test cases page.
+
+Replays a user session by calling the callback functions of
+pages/test_cases.py directly, for both datasets and the three
+PyDegradome settings: dataset switch, settings change, table filters,
+barplot regrouping, row clicks through the three plot tabs and the
+bibliography table built from the recorded MEDLINE records in
+benchmarks/fixtures. Reports the time (median of --repeat runs) and
+the peak memory allocated by each step, and compares them with the
+baseline stored in benchmarks/baselines/callbacks.json. Exits with
+status 1 when a step is slower, or allocates more, than the baseline by
+more than --threshold.
+
+The settings change starts from an empty warmcache.entries, so that it
+measures the load of the entry (from data/warm, else its derivation)
+and not a lookup of the one kept by the previous run.
+
+    python benchmarks/bench_callbacks.py
+    python benchmarks/bench_callbacks.py --update-baseline
+
+Timings depend on the machine: update the baseline on the machine used
+for the comparison before changing the code.
+"""
+import argparse
+import gc
+import io
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(repo_dir)
+sys.path.insert(0, repo_dir)
+
+import app  # noqa: E402,F401  (registers the pages)
+from dash_bootstrap_components import themes  # noqa: E402
+from pages import bibsearch as bib  # noqa: E402
+from pages import test_cases as tc  # noqa: E402
+from pages import warmcache  # noqa: E402
+
+fixture = os.path.join(repo_dir, 'benchmarks', 'fixtures',
+                       'pubmed_medline.txt')
+baseline_path = os.path.join(repo_dir, 'benchmarks', 'baselines',
+                             'callbacks.json')
+
+# Absolute margins added to the relative threshold, so that the timing
+# noise of short steps is not reported as a regression, and the
+# smallest baseline time the threshold is applied to
+slack_seconds = 0.01
+slack_kib = 64
+floor_seconds = 0.001
+
+# Steps run without the entries kept in memory by warmcache.get
+cold_steps = ['change settings']
+
+viewport = '1280'
+theme = themes.JOURNAL
+# Arguments Dash passes with the state of the page: a section shown
+# once and open (section_shown, is_open), no region or metric range
+# in the peak table filters (region_input, region_on, metric_range)
+shown = (1, True)
+no_region = (None, 'peak', [])
+
+
+def session(base, settings):
+    """
+    Steps of a session as (name, function) pairs. Each function runs
+    the callbacks of one user action; the state they share (as the
+    stores of the page do) is kept in 'state'.
+    """
+    state = {}
+
+    def switch_dataset():
+        state['ivars'] = tc.set_variables(base)
+        tc.dataSet_description(state['ivars'])
+
+    def change_settings():
+        state['key'] = tc.import_data(base, state['ivars'], settings)
+        tc.dropdown_pytable(state['key'], settings)
+        tc.dropdown_barplot('comparison', 'category_1', state['key'],
+                            state['ivars'])
+
+    def barplot_default():
+        tc.peak_count_barplot(state['key'], state['ivars'], 'comparison',
+                              'category_1', None, None, theme, viewport,
+                              *shown, None)
+
+    def barplot_regroup():
+        for x1, x2 in (('chr', 'category_2'), ('feature_type', 'strand'),
+                       ('comparison', None)):
+            tc.dropdown_barplot(x1, x2, state['key'], state['ivars'])
+            tc.peak_count_barplot(state['key'], state['ivars'], x1, x2,
+                                  None, None, theme, viewport, *shown,
+                                  None)
+
+    def filter_table():
+        first = warmcache.get(**state['key'])['pydeg_records'][0]
+        tc.update_dropdown_options(state['key'], first['category_1'],
+                                   None, None, None, None, None,
+                                   *no_region, *shown, {}, None)
+        tc.update_dropdown_options(state['key'], None, None,
+                                   first['feature_type'], None, None,
+                                   'No', *no_region, *shown, {}, None)
+        state['table'] = tc.update_dropdown_options(
+            state['key'], None, None, None, None, None, None,
+            *no_region, *shown, {}, None)
+
+    def click_rows():
+        for row_id in range(5):
+            cell = {'row': row_id, 'column': 3, 'row_id': row_id}
+            for tab in ('gene_plot', 'peak_plot', 'miRNA_tab'):
+                _, mirna_rows = tc.render_tab_content(
+                    cell, state['key'], tab, *shown)
+                if tab == 'miRNA_tab' and mirna_rows:
+                    tc.render_miRNA_plot(mirna_rows, tab)
+
+    def bibliography():
+        with open(fixture) as f:
+            records = list(bib.iterMedline(io.StringIO(f.read())))
+        pydeg_df = warmcache.get(**state['key'])['pydeg_df']
+        biblio_df = bib.getBibDF(records, pydeg_df.at[0, 'tx_name'])
+        index = bib.mentionIndex(pydeg_df)
+        mentions = [bib.findMentions(record, index) for record in records]
+        biblio_df['Mentions'] = [', '.join(m) for m in mentions]
+        biblio_df.to_dict('records')
+        for row in range(len(records)):
+            tc.cell_clicked_bib({'row': row, 'column': 0}, records, 0, 10,
+                                None)
+
+    return [('switch dataset', switch_dataset),
+            ('change settings', change_settings),
+            ('barplot', barplot_default),
+            ('barplot regroup', barplot_regroup),
+            ('filter table', filter_table),
+            ('click rows', click_rows),
+            ('bibliography', bibliography)]
+
+
+def clear_entries():
+    with warmcache.entries_lock:
+        warmcache.entries.clear()
+
+
+def measure(steps, repeat):
+    # Median time of 'repeat' runs of the whole session, after one run
+    # that fills the caches used on first call, then one run under
+    # tracemalloc for the peak allocation of each step. Garbage is
+    # collected before each step, so that a full collection of the
+    # objects left by an earlier step is not timed with this one
+    for _, step in steps:
+        step()
+    times = {name: [] for name, _ in steps}
+    for _ in range(repeat):
+        for name, step in steps:
+            if name in cold_steps:
+                clear_entries()
+            gc.collect()
+            start = time.perf_counter()
+            step()
+            times[name].append(time.perf_counter() - start)
+    peaks = {}
+    for name, step in steps:
+        if name in cold_steps:
+            clear_entries()
+        tracemalloc.start()
+        step()
+        peaks[name] = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+    return {name: {'seconds': round(statistics.median(times[name]), 5),
+                   'peak_kib': round(peaks[name], 1)}
+            for name, _ in steps}
+
+
+def compare(result, baseline, threshold):
+    # Regressions of one step as text, empty when there is none
+    problems = []
+    if baseline is None:
+        return problems
+    limit = 1 + threshold
+    seconds = max(baseline['seconds'], floor_seconds)
+    if result['seconds'] > seconds * limit + slack_seconds:
+        problems.append(f"time {baseline['seconds'] * 1e3:.1f} -> "
+                        f"{result['seconds'] * 1e3:.1f} ms")
+    if result['peak_kib'] > baseline['peak_kib'] * limit + slack_kib:
+        problems.append(f"memory {baseline['peak_kib']:.0f} -> "
+                        f"{result['peak_kib']:.0f} KiB")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=9)
+    parser.add_argument('--threshold', type=float, default=0.5,
+                        help='Allowed slowdown or extra memory, as a '
+                        'fraction of the baseline')
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='Store the results as the new baseline')
+    args = parser.parse_args()
+
+    if os.path.exists(baseline_path):
+        with open(baseline_path) as f:
+            baselines = json.load(f)
+    else:
+        baselines = {}
+
+    results = {}
+    regressions = 0
+    print(f"{'dataset':>12} {'settings':>8} {'step':>16} {'ms':>9} "
+          f"{'base ms':>9} {'peak KiB':>9} {'base KiB':>9}")
+    for base in bib.dataset_bases():
+        for settings in (0, 1, 2):
+            measures = measure(session(base, settings), args.repeat)
+            for name, result in measures.items():
+                key = f'{base}/{settings}/{name}'
+                results[key] = result
+                baseline = baselines.get(key)
+                problems = compare(result, baseline, args.threshold)
+                regressions += bool(problems)
+                base_ms = f"{baseline['seconds'] * 1e3:9.1f}" \
+                    if baseline else f"{'-':>9}"
+                base_kib = f"{baseline['peak_kib']:9.0f}" \
+                    if baseline else f"{'-':>9}"
+                print(f"{base:>12} {settings:>8} {name:>16} "
+                      f"{result['seconds'] * 1e3:9.1f} {base_ms} "
+                      f"{result['peak_kib']:9.0f} {base_kib}"
+                      + (f"  REGRESSION: {', '.join(problems)}"
+                         if problems else ''))
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(baseline_path), exist_ok=True)
+        with open(baseline_path, 'w') as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+        print(f'Baseline written to {baseline_path}')
+    elif regressions:
+        print(f'{regressions} steps regressed by more than '
+              f'{args.threshold:.0%}')
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
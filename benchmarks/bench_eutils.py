@@ -0,0 +1,204 @@
+"""
+Check and time the E-utilities transport against a local HTTPS stand-in.
+
+A self-signed HTTPS server answers esearch, efetch and esummary with
+recorded responses (gzip encoded when asked for) and can add a delay
+per round trip to emulate the distance to NCBI. The literature search
+sequence of bibsearch (esearch, getPubmedId, getSummaries and
+getRefRecords) is run with a new connection per call, as Bio.Entrez
+does, and with pooled keep-alive connections. Needs the openssl
+command line tool.
+
+    python benchmarks/bench_eutils.py [--searches 10] [--rtt 20]
+"""
+import argparse
+import gzip
+import os
+import shutil
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote_plus, urlsplit
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(repo_dir)
+sys.path.insert(0, repo_dir)
+
+from pages import bibsearch as bib  # noqa: E402
+from pages import eutils  # noqa: E402
+
+fixture = os.path.join(repo_dir, 'benchmarks', 'fixtures',
+                       'pubmed_medline.txt')
+
+esearch_xml = """<?xml version="1.0" encoding="UTF-8" ?>
+<!DOCTYPE eSearchResult PUBLIC "-//NLM//DTD esearch 20060628//EN" \
+"https://eutils.ncbi.nlm.nih.gov/eutils/dtd/20060628/esearch.dtd">
+<eSearchResult><Count>3</Count><RetMax>3</RetMax><RetStart>0</RetStart>
+<IdList>{ids}</IdList>
+<TranslationSet/><QueryTranslation>AT1G22030</QueryTranslation>
+</eSearchResult>
+"""
+
+# (e-mail, E-utility) of every request received by the stand-in
+requests_seen = []
+
+
+def esearch_ids(email):
+    # PMC ids returned by esearch depend on the caller e-mail, so that
+    # callers can check they got their own answer
+    first = zlib.crc32(email.encode()) % 10**7
+    return [str(first + i) for i in range(3)]
+
+
+esummary_doc = """<DocSum><Id>{pmid}</Id>
+<Item Name="PubDate" Type="Date">2021 Mar 22</Item>
+<Item Name="Source" Type="String">Plant Cell</Item>
+<Item Name="AuthorList" Type="List">
+<Item Name="Author" Type="String">Zhang H</Item>
+<Item Name="Author" Type="String">Li L</Item>
+</Item>
+<Item Name="Title" Type="String">Recorded title {pmid}</Item>
+<Item Name="FullJournalName" Type="String">The Plant cell</Item>
+<Item Name="DOI" Type="String">10.1093/plcell/{pmid}</Item>
+</DocSum>"""
+
+esummary_xml = """<?xml version="1.0" encoding="UTF-8" ?>
+<!DOCTYPE eSummaryResult PUBLIC "-//NLM//DTD esummary v1 20041029//EN" \
+"https://eutils.ncbi.nlm.nih.gov/eutils/dtd/20041029/esummary-v1.dtd">
+<eSummaryResult>{docs}</eSummaryResult>
+"""
+
+
+def make_certificate(directory):
+    cert = os.path.join(directory, 'cert.pem')
+    key = os.path.join(directory, 'key.pem')
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048',
+                    '-nodes', '-days', '1', '-subj', '/CN=localhost',
+                    '-addext', 'subjectAltName=DNS:localhost',
+                    '-keyout', key, '-out', cert],
+                   check=True, capture_output=True)
+    return cert, key
+
+
+def make_handler(rtt):
+    with open(fixture, 'rb') as f:
+        medline = f.read()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def setup(self):
+            # TCP and TLS handshakes take about two round trips
+            time.sleep(2 * rtt)
+            self.request.do_handshake()
+            super().setup()
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            time.sleep(rtt)
+            url = urlsplit(self.path)
+            query = dict(part.split('=', 1)
+                         for part in url.query.split('&') if part)
+            cgi = url.path.rsplit('/', 1)[-1]
+            email = unquote_plus(query.get('email', ''))
+            requests_seen.append((email, cgi))
+            if cgi == 'esearch.fcgi':
+                ids = ''.join(f'<Id>{i}</Id>' for i in esearch_ids(email))
+                body = esearch_xml.format(ids=ids).encode()
+                ctype = 'text/xml'
+            elif cgi == 'esummary.fcgi':
+                ids = query.get('id', '').replace('%2C', ',').split(',')
+                docs = ''.join(esummary_doc.format(pmid=i) for i in ids)
+                body = esummary_xml.format(docs=docs).encode()
+                ctype = 'text/xml'
+            else:
+                body, ctype = medline, 'text/plain; charset=UTF-8'
+            self.send_response(200)
+            self.send_header('Content-Type', ctype)
+            if 'gzip' in self.headers.get('Accept-Encoding', ''):
+                body = gzip.compress(body)
+                self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+def start_server(cert, key, rtt):
+    server = ThreadingHTTPServer(('localhost', 0), make_handler(rtt))
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    server.socket = context.wrap_socket(server.socket, server_side=True,
+                                        do_handshake_on_connect=False)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def search_sequence(identity):
+    # Same calls as result_biblio followed by a click on one row
+    ref_ids = bib.esearch('pmc', bib.searchTerm('AT1G22030.1'),
+                          identity=identity)
+    pubmed_ids = bib.getPubmedId(ref_ids, identity)
+    summaries = bib.getSummaries('pubmed', pubmed_ids, identity)
+    records = bib.getRefRecords('pubmed', pubmed_ids[:1],
+                                identity=identity)
+    assert len(pubmed_ids) == 3 and len(summaries) == 3
+    assert 'abstract' in records[0]
+
+
+def run(searches, keep_alive):
+    eutils.keep_alive = keep_alive
+    eutils.clear_pool()
+    eutils.call_log.clear()
+    start = time.perf_counter()
+    identity = bib.entrezIdentity('benchmark@example.com')
+    for _ in range(searches):
+        search_sequence(identity)
+    total = time.perf_counter() - start
+    return total, eutils.timing_summary()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--searches', type=int, default=10)
+    parser.add_argument('--rtt', type=float, default=20,
+                        help='Emulated round trip time (ms)')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        cert, key = make_certificate(directory)
+        server = start_server(cert, key, args.rtt / 1000)
+        eutils.base_url = \
+            f'https://localhost:{server.server_port}/entrez/eutils/'
+        eutils.ssl_context = ssl.create_default_context(cafile=cert)
+        eutils.transport_name = 'pooled'
+        # The stand-in has no rate limit
+        eutils.wait_rate_limit = lambda params: None
+
+        for label, keep_alive in (('new connection per call', False),
+                                  ('pooled keep-alive', True)):
+            total, summary = run(args.searches, keep_alive)
+            calls = sum(s['calls'] for s in summary.values())
+            print(f'{label}: {calls} calls, {total * 1e3:.1f} ms total')
+            for kind, s in summary.items():
+                print(f"  {kind:>6} connections: {s['calls']:>3} calls, "
+                      f"setup {s['setup'] * 1e3:6.2f} ms, "
+                      f"wait {s['wait'] * 1e3:6.2f} ms, "
+                      f"transfer {s['transfer'] * 1e3:6.2f} ms")
+        server.shutdown()
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
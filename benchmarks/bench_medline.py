@@ -0,0 +1,155 @@
+"""
+Microbenchmark of MEDLINE parsing for the literature search.
+
+Compares the previous path (whole response read into a string, parsed
+with nbib and walked by the old getBibDF) against the streaming parser
+in pages/bibsearch.py, using the recorded efetch response in
+benchmarks/fixtures. Run from any directory:
+
+    python benchmarks/bench_medline.py [n_records ...]
+"""
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+import nbib
+import numpy as np
+import pandas as pd
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(repo_dir)
+sys.path.insert(0, repo_dir)
+
+from pages import bibsearch as bib  # noqa: E402
+
+fixture = os.path.join(repo_dir, 'benchmarks', 'fixtures',
+                       'pubmed_medline.txt')
+
+
+# Previous implementation, kept here as the reference
+def legacy_concat_keys(dict, key_1, sep, key_2=None, last_sep=None):
+    keys = ""
+    ilen = len(dict[key_1])
+    for j in range(ilen):
+        if key_2:
+            key = dict[key_1][j][key_2]
+        else:
+            key = dict[key_1][j]
+        if j == 0:
+            keys += key
+        elif j < ilen - 1:
+            keys += sep + " " + key
+        else:
+            if last_sep:
+                keys += last_sep + " " + key
+            else:
+                keys += sep + " " + key
+    return keys
+
+
+def legacy_getBibDF(entries, transcript):
+    keys = ["title", "authors", "journal",
+            "publication_date", "doi", "abstract"]
+    authors_list = []
+    title_list = []
+    publication_date_list = []
+    journal_list = []
+    doi_list = []
+    transcript_list = [transcript] * len(entries)
+    abstract_list = []
+
+    for entrie in entries:
+        for key in keys:
+            if key in entrie.keys():
+                if key == "authors":
+                    authors = legacy_concat_keys(
+                        dict=entrie,
+                        key_1="authors",
+                        key_2="author",
+                        sep=";",
+                        last_sep=" &",
+                    )
+                    icolumn = bib.author_etal(authors)
+                elif key == "publication_date":
+                    icolumn = entrie[key][:4]
+                elif key == "doi":
+                    icolumn = f'<a href="https://doi.org/{entrie[key]}"\
+                    target=" blank"> {bib.elink} </a>'
+                else:
+                    icolumn = entrie[key]
+            else:
+                icolumn = np.nan
+
+            list_name = key + "_list"
+            ilist = locals()[list_name]
+            ilist.append(icolumn)
+
+    data = {
+        "Author(s)": authors_list,
+        "Title": title_list,
+        "Year": publication_date_list,
+        "Journal": journal_list,
+        "Transcript": transcript_list,
+        "Doi": doi_list,
+        "Abstract": abstract_list
+    }
+
+    return pd.DataFrame(data)
+
+
+def legacy_path(text):
+    records = nbib.read(io.StringIO(text).read())
+    return records, legacy_getBibDF(records, 'AT1G22030.1')
+
+
+def streaming_path(text):
+    records = list(bib.iterMedline(io.StringIO(text)))
+    return records, bib.getBibDF(records, 'AT1G22030.1')
+
+
+def make_response(n_records):
+    with open(fixture) as f:
+        records = f.read().strip('\n').split('\n\n')
+    body = [records[i % len(records)] for i in range(n_records)]
+    return '\n' + '\n\n'.join(body) + '\n'
+
+
+def measure(func, text, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(text)
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    func(text)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(times), peak
+
+
+def check(text):
+    # Both paths must produce the same table
+    old_records, old_df = legacy_path(text)
+    new_records, new_df = streaming_path(text)
+    pd.testing.assert_frame_equal(old_df, new_df, check_dtype=False)
+    assert [r['pubmed_id'] for r in old_records] == \
+        [r['pubmed_id'] for r in new_records]
+
+
+def main(sizes):
+    print(f"{'records':>8} {'legacy ms':>10} {'stream ms':>10} "
+          f"{'legacy KiB':>11} {'stream KiB':>11}")
+    for n_records in sizes:
+        text = make_response(n_records)
+        check(text)
+        old_t, old_mem = measure(legacy_path, text)
+        new_t, new_mem = measure(streaming_path, text)
+        print(f"{n_records:>8} {old_t*1e3:>10.2f} {new_t*1e3:>10.2f} "
+              f"{old_mem/1024:>11.1f} {new_mem/1024:>11.1f}")
+
+
+if __name__ == "__main__":
+    sizes = [int(n) for n in sys.argv[1:]] or [10, 100, 500]
+    main(sizes)
@@ -0,0 +1,166 @@
+"""
+HTTP load test replaying recorded Dash callback requests.
+
+Record a browser session, either on the server:
+
+    DASH_RECORD_FILE=session.jsonl python app.py
+
+or from the browser developer tools (Network tab, 'Save all as HAR'),
+then replay its _dash-update-component requests with N virtual users
+against a running app:
+
+    python benchmarks/loadtest.py session.jsonl --users 8 --duration 60
+    python benchmarks/loadtest.py session.har --url http://127.0.0.1:8050
+
+Each virtual user sends the requests of the session in order, on its
+own keep-alive connection and asking for compressed responses as a
+browser does, and starts again at the end of the session. Reports the
+throughput and the latency percentiles by callback output ID. The
+client runs in this process: for many users, check that it is not the
+bottleneck (CPU use of this script) before drawing conclusions.
+"""
+import argparse
+import http.client
+import json
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlsplit
+
+import numpy as np
+
+callback_path = '_dash-update-component'
+
+
+def load_session(path):
+    # Callback requests of a recording, as (output ID, delay before the
+    # request in s, body) in the order they were sent
+    with open(path) as f:
+        text = f.read()
+    requests = []
+    if path.endswith('.har'):
+        for entry in json.loads(text)['log']['entries']:
+            request = entry['request']
+            if request['method'] != 'POST' \
+                    or not request['url'].endswith(callback_path):
+                continue
+            body = json.loads(request['postData']['text'])
+            started = datetime.fromisoformat(entry['startedDateTime'])
+            requests.append((started.timestamp(), body))
+        requests.sort(key=lambda r: r[0])
+    else:
+        lines = [json.loads(line) for line in text.splitlines() if line]
+        requests = [(line['time'], line['body']) for line in lines]
+    session = []
+    for i, (sent, body) in enumerate(requests):
+        delay = sent - requests[i - 1][0] if i else 0.0
+        session.append((body.get('output', '?'), max(delay, 0.0),
+                        json.dumps(body).encode()))
+    return session
+
+
+class VirtualUser(threading.Thread):
+    def __init__(self, url, session, deadline, think, results):
+        super().__init__(daemon=True)
+        self.url = urlsplit(url)
+        self.path = self.url.path.rstrip('/') + '/' + callback_path
+        self.session = session
+        self.deadline = deadline
+        self.think = think
+        self.results = results
+
+    def connect(self):
+        if self.url.scheme == 'https':
+            return http.client.HTTPSConnection(self.url.hostname,
+                                               self.url.port, timeout=300)
+        return http.client.HTTPConnection(self.url.hostname, self.url.port,
+                                          timeout=300)
+
+    def post(self, conn, body):
+        conn.request('POST', self.path, body=body, headers={
+            'Content-Type': 'application/json',
+            'Accept-Encoding': 'br, gzip',
+        })
+        response = conn.getresponse()
+        size = len(response.read())
+        return response.status, size
+
+    def run(self):
+        conn = self.connect()
+        while time.perf_counter() < self.deadline:
+            for output, delay, body in self.session:
+                if time.perf_counter() >= self.deadline:
+                    break
+                if self.think:
+                    time.sleep(delay * self.think)
+                start = time.perf_counter()
+                try:
+                    status, size = self.post(conn, body)
+                except (http.client.HTTPException, OSError):
+                    conn.close()
+                    conn = self.connect()
+                    status, size = 'error', 0
+                elapsed = time.perf_counter() - start
+                self.results.append((output, elapsed, status, size))
+        conn.close()
+
+
+def report(results, wall):
+    by_output = {}
+    for output, elapsed, status, size in results:
+        by_output.setdefault(output, []).append((elapsed, status, size))
+    # 204 is a callback that raised PreventUpdate
+    failed = sum(1 for r in results if r[2] not in (200, 204))
+    print(f'{len(results)} requests in {wall:.1f} s: '
+          f'{len(results) / wall:.1f} requests/s, {failed} failed')
+    print(f"{'calls':>6} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'max ms':>8} {'kB resp':>8} {'errors':>6}  "
+          f"callback")
+    rows = sorted(by_output.items(),
+                  key=lambda item: -sum(r[0] for r in item[1]))
+    for output, calls in rows:
+        latency = np.array([c[0] for c in calls]) * 1e3
+        p50, p95, p99 = np.percentile(latency, [50, 95, 99])
+        errors = sum(1 for c in calls if c[1] not in (200, 204))
+        size = np.mean([c[2] for c in calls]) / 1e3
+        print(f'{len(calls):>6} {len(calls) / wall:>7.1f} {p50:>8.1f} '
+              f'{p95:>8.1f} {p99:>8.1f} {latency.max():>8.1f} '
+              f'{size:>8.1f} {errors:>6}  {output}')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('recording',
+                        help='Session recorded with DASH_RECORD_FILE '
+                        '(.jsonl) or by the browser (.har)')
+    parser.add_argument('--url', default='http://127.0.0.1:8050',
+                        help='Address of the running app')
+    parser.add_argument('--users', type=int, default=4,
+                        help='Concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=30,
+                        help='Seconds of load')
+    parser.add_argument('--think', type=float, default=0,
+                        help='Scale of the recorded pauses between '
+                        'requests (0: none, 1: as recorded)')
+    args = parser.parse_args()
+
+    session = load_session(args.recording)
+    if not session:
+        parser.error(f'no {callback_path} requests in {args.recording}')
+    print(f'{len(session)} requests per session, {args.users} users, '
+          f'{args.duration:.0f} s against {args.url}')
+
+    results = []
+    start = time.perf_counter()
+    users = [VirtualUser(args.url, session, start + args.duration,
+                         args.think, results)
+             for _ in range(args.users)]
+    for user in users:
+        user.start()
+    for user in users:
+        user.join()
+    report(results, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Concurrent literature searches under different NCBI identities.
+
+Runs the search sequence of bench_eutils from many threads at once,
+each with its own e-mail, against the local HTTPS stand-in. Fails if
+any request reaches the server with another thread's identity or if a
+thread gets the answer meant for another one.
+
+    python benchmarks/stress_identity.py [--threads 16] [--searches 5]
+"""
+import argparse
+import os
+import shutil
+import ssl
+import sys
+import tempfile
+import threading
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import bench_eutils as stand_in  # noqa: E402
+from bench_eutils import bib, eutils  # noqa: E402
+
+
+def user_searches(identity, searches, barrier, errors):
+    barrier.wait()
+    try:
+        for _ in range(searches):
+            ref_ids = bib.esearch('pmc', bib.searchTerm('AT1G22030.1'),
+                                  identity=identity)
+            if ref_ids != stand_in.esearch_ids(identity['email']):
+                errors.append(f"{identity['email']} got {ref_ids}")
+            pubmed_ids = bib.getPubmedId(ref_ids, identity)
+            bib.getSummaries('pubmed', pubmed_ids, identity)
+            bib.getFullRecord(pubmed_ids[0], identity)
+    except Exception as error:
+        errors.append(f"{identity['email']}: {error!r}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--searches', type=int, default=5)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        cert, key = stand_in.make_certificate(directory)
+        server = stand_in.start_server(cert, key, 0.005)
+        eutils.base_url = \
+            f'https://localhost:{server.server_port}/entrez/eutils/'
+        eutils.ssl_context = ssl.create_default_context(cafile=cert)
+        eutils.transport_name = 'pooled'
+        eutils.wait_rate_limit = lambda params: None
+
+        identities = [bib.entrezIdentity(f'user{i}@example.com',
+                                         api_key=f'key{i}')
+                      for i in range(args.threads)]
+        barrier = threading.Barrier(args.threads)
+        errors = []
+        threads = [threading.Thread(target=user_searches,
+                                    args=(identity, args.searches,
+                                          barrier, errors))
+                   for identity in identities]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        server.shutdown()
+    finally:
+        shutil.rmtree(directory)
+
+    # Every request must carry one of the identities, and each identity
+    # must account for exactly its own calls
+    per_email = Counter(email for email, cgi in stand_in.requests_seen)
+    expected = {identity['email'] for identity in identities}
+    if set(per_email) != expected:
+        errors.append(f'unexpected identities: {set(per_email) - expected}')
+    esearch_calls = Counter(email for email, cgi in stand_in.requests_seen
+                            if cgi == 'esearch.fcgi')
+    for email in expected:
+        if esearch_calls[email] != args.searches:
+            errors.append(f'{email}: {esearch_calls[email]} esearch calls')
+
+    print(f'{args.threads} threads, {len(stand_in.requests_seen)} requests')
+    if errors:
+        print('\n'.join(errors))
+        sys.exit(1)
+    print('All requests carried the identity of their caller')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+# Gunicorn settings for the production server, see wsgi.py
+import multiprocessing
+import os
+
+wsgi_app = 'wsgi:server'
+chdir = os.path.dirname(os.path.abspath(__file__))
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8050')
+
+# Load the app, and the datasets, once in the master process so that
+# the forked workers share them
+preload_app = True
+workers = int(os.environ.get('WEB_CONCURRENCY',
+                             min(multiprocessing.cpu_count(), 4)))
+threads = int(os.environ.get('GUNICORN_THREADS', 2))
+worker_class = 'gthread' if threads > 1 else 'sync'
+
+# Literature searches wait on NCBI
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG')
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def post_fork(server, worker):
+    server.log.info(f'Worker {worker.pid} started')
@@ -0,0 +1,398 @@
+"""
+Response compression, payload sizes and metrics of the Dash callbacks.
+
+Responses of app.server are compressed with brotli or gzip (whichever
+the browser accepts first) when they are larger than a threshold. Each
+callback request (_dash-update-component) is logged with the size of
+the request, of the JSON response and of the bytes actually sent, by
+callback output ID. Settings, from the environment:
+
+    DASH_COMPRESS        '0' turns compression off
+    COMPRESS_ALGORITHM   preferred encodings, default 'br,gzip'
+    COMPRESS_MIN_SIZE    smallest response compressed (bytes), 500
+    COMPRESS_LEVEL       gzip level, 6
+    COMPRESS_BR_LEVEL    brotli quality, 4
+    PAYLOAD_LOG          '0' turns the payload log off
+    DASH_METRICS         '1' records callback metrics, served on
+                         /metrics (Prometheus) and /metrics.json
+    DASH_PROFILE_DIR     folder for callback profiles, profiling is off
+                         when unset
+    DASH_RECORD_FILE     file where the callback requests are appended,
+                         one JSON line each, for benchmarks/loadtest.py
+
+Callback metrics are kept per process: with several gunicorn workers
+each scrape sees the worker that answered it.
+"""
+import bisect
+import cProfile
+import functools
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+
+import flask
+from dash import _callback
+from dash.exceptions import PreventUpdate
+
+compress = os.environ.get('DASH_COMPRESS', '1') != '0'
+compress_algorithm = os.environ.get('COMPRESS_ALGORITHM', 'br,gzip')
+compress_min_size = int(os.environ.get('COMPRESS_MIN_SIZE', 500))
+compress_level = int(os.environ.get('COMPRESS_LEVEL', 6))
+compress_br_level = int(os.environ.get('COMPRESS_BR_LEVEL', 4))
+payload_log = os.environ.get('PAYLOAD_LOG', '1') != '0'
+metrics_enabled = os.environ.get('DASH_METRICS', '0') == '1'
+profile_dir = os.environ.get('DASH_PROFILE_DIR')
+record_file = os.environ.get('DASH_RECORD_FILE')
+
+callback_path = '_dash-update-component'
+
+logger = logging.getLogger('dash.payload')
+
+# Bytes received and sent by callback output ID, since the start
+payload_totals = {}
+payload_lock = threading.Lock()
+
+# Upper bounds (s) of the latency histogram buckets
+latency_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1, 2.5, 5, 10, 30, 60)
+bucket_labels = [str(b) for b in latency_buckets] + ['+Inf']
+
+# Metrics by callback output ID
+callback_metrics = {}
+metrics_lock = threading.Lock()
+metrics_start = time.time()
+
+# Request header and query flag asking for a profile
+profile_header = 'X-Dash-Profile'
+profile_flag = 'profile'
+
+
+def callback_id():
+    # Output ID of the callback in the current request, e.g.
+    # 'py_table.data' or
+    # '..class1_value.options...comparison_value.options..'
+    body = flask.request.get_json(silent=True) or {}
+    return body.get('output', '?')
+
+
+def measure_response(response):
+    # Runs before compression
+    if flask.request.path.endswith(callback_path) \
+            and not response.direct_passthrough:
+        flask.g.payload_raw = len(response.get_data())
+    return response
+
+
+def log_payload(response):
+    # Runs after compression
+    raw = flask.g.pop('payload_raw', None)
+    if raw is None:
+        return response
+    output = callback_id()
+    received = flask.request.content_length or 0
+    sent = response.content_length or raw
+    encoding = response.headers.get('Content-Encoding', 'identity')
+    with payload_lock:
+        totals = payload_totals.setdefault(
+            output, {'calls': 0, 'request': 0, 'response': 0, 'sent': 0})
+        totals['calls'] += 1
+        totals['request'] += received
+        totals['response'] += raw
+        totals['sent'] += sent
+    logger.info(f'{output}: request {received} B, response {raw} B, '
+                f'sent {sent} B ({encoding})')
+    return response
+
+
+def payload_summary():
+    # Totals by callback output ID, largest responses first
+    with payload_lock:
+        items = [dict(totals, output=output)
+                 for output, totals in payload_totals.items()]
+    return sorted(items, key=lambda t: t['response'], reverse=True)
+
+
+def new_metrics(name):
+    return {
+        'callback': name,
+        'calls': {'ok': 0, 'prevented': 0, 'error': 0},
+        'buckets': [0] * (len(latency_buckets) + 1),
+        'seconds': 0.0,
+        'max_seconds': 0.0,
+        'request_bytes': 0,
+        'response_bytes': 0,
+    }
+
+
+def record_call(output, name, elapsed, status, request_bytes,
+                response_bytes):
+    with metrics_lock:
+        metrics = callback_metrics.get(output)
+        if metrics is None:
+            metrics = callback_metrics[output] = new_metrics(name)
+        metrics['calls'][status] += 1
+        metrics['buckets'][bisect.bisect_left(latency_buckets, elapsed)] += 1
+        metrics['seconds'] += elapsed
+        metrics['max_seconds'] = max(metrics['max_seconds'], elapsed)
+        metrics['request_bytes'] += request_bytes
+        metrics['response_bytes'] += response_bytes
+
+
+def timed_callback(output, func):
+    # 'func' is the callback as wrapped by Dash: it returns the JSON
+    # response, so the time includes the serialisation of the outputs
+    name = getattr(func, '__name__', '?')
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        status, size = 'error', 0
+        try:
+            result = func(*args, **kwargs)
+            status = 'ok'
+            if isinstance(result, (str, bytes)):
+                size = len(result)
+            return result
+        except PreventUpdate:
+            status = 'prevented'
+            raise
+        finally:
+            record_call(output, name, time.perf_counter() - start, status,
+                        flask.request.content_length or 0, size)
+
+    return wrapper
+
+
+def wrap_callbacks(app, wrap):
+    """
+    Replace every callback registered so far, with app.callback or
+    dash.callback, by wrap(output_id, callback). Clientside callbacks
+    run in the browser and are left out.
+    """
+    for callback_map in (app.callback_map, _callback.GLOBAL_CALLBACK_MAP):
+        for output, callback in callback_map.items():
+            func = callback.get('callback')
+            if func is not None:
+                callback['callback'] = wrap(output, func)
+
+
+def metrics_summary():
+    """
+    Metrics by callback output ID: calls by outcome (ok, prevented by
+    PreventUpdate, error), latency (mean, max and the histogram) and
+    total request and response sizes in bytes.
+    """
+    with metrics_lock:
+        items = {output: dict(metrics, calls=dict(metrics['calls']),
+                              buckets=list(metrics['buckets']))
+                 for output, metrics in callback_metrics.items()}
+    summary = []
+    for output, metrics in items.items():
+        calls = sum(metrics['calls'].values())
+        summary.append({
+            'output': output,
+            'callback': metrics['callback'],
+            'calls': metrics['calls'],
+            'mean_seconds': metrics['seconds'] / calls if calls else 0.0,
+            'max_seconds': metrics['max_seconds'],
+            'total_seconds': metrics['seconds'],
+            'histogram': dict(zip(bucket_labels, metrics['buckets'])),
+            'request_bytes': metrics['request_bytes'],
+            'response_bytes': metrics['response_bytes'],
+        })
+    summary.sort(key=lambda m: m['total_seconds'], reverse=True)
+    return {'pid': os.getpid(),
+            'uptime_seconds': time.time() - metrics_start,
+            'callbacks': summary}
+
+
+def label_value(value):
+    return (str(value).replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def metric_labels(metrics):
+    return (f'output="{label_value(metrics["output"])}",'
+            f'callback="{label_value(metrics["callback"])}"')
+
+
+def prometheus_text():
+    # Metrics in the Prometheus text exposition format
+    lines = [
+        '# HELP dash_callback_calls_total Callback invocations by outcome.',
+        '# TYPE dash_callback_calls_total counter',
+    ]
+    summary = metrics_summary()['callbacks']
+    for m in summary:
+        labels = metric_labels(m)
+        for status, count in m['calls'].items():
+            lines.append(f'dash_callback_calls_total{{{labels},'
+                         f'status="{status}"}} {count}')
+    lines += [
+        '# HELP dash_callback_duration_seconds Callback latency.',
+        '# TYPE dash_callback_duration_seconds histogram',
+    ]
+    for m in summary:
+        labels = metric_labels(m)
+        cumulative = 0
+        for bound, count in m['histogram'].items():
+            cumulative += count
+            lines.append(f'dash_callback_duration_seconds_bucket{{{labels},'
+                         f'le="{bound}"}} {cumulative}')
+        lines.append(f'dash_callback_duration_seconds_sum{{{labels}}} '
+                     f'{m["total_seconds"]:.6f}')
+        lines.append(f'dash_callback_duration_seconds_count{{{labels}}} '
+                     f'{cumulative}')
+    for kind in ('request', 'response'):
+        lines += [
+            f'# HELP dash_callback_{kind}_bytes_total Size of the callback '
+            f'{kind}s (JSON).',
+            f'# TYPE dash_callback_{kind}_bytes_total counter',
+        ]
+        for m in summary:
+            labels = metric_labels(m)
+            lines.append(f'dash_callback_{kind}_bytes_total{{{labels}}} '
+                         f'{m[kind + "_bytes"]}')
+    return '\n'.join(lines) + '\n'
+
+
+def init_metrics(app):
+    wrap_callbacks(app, timed_callback)
+    server = app.server
+
+    @server.route('/metrics')
+    def metrics():
+        return flask.Response(prometheus_text(),
+                              mimetype='text/plain; version=0.0.4')
+
+    @server.route('/metrics.json')
+    def metrics_json():
+        return flask.jsonify(metrics_summary())
+
+
+def profile_requested(output, name):
+    """
+    Whether the current request asks for a profile: 'X-Dash-Profile'
+    header, or 'profile' in the query string of the request or of the
+    page it comes from (e.g. /test-cases?profile=peak_count_barplot).
+    '1' profiles every callback, other values only the callbacks whose
+    function name or output ID contain them.
+    """
+    request = flask.request
+    value = request.headers.get(profile_header) \
+        or request.args.get(profile_flag)
+    if not value and request.referrer:
+        query = parse_qs(urlsplit(request.referrer).query)
+        value = query.get(profile_flag, [None])[0]
+    if not value or value == '0':
+        return False
+    return value == '1' or value in name or value in output
+
+
+def inputs_hash(body):
+    # Hash of the values of the inputs and states of the callback
+    values = json.dumps([body.get('inputs'), body.get('state')],
+                        sort_keys=True, default=str)
+    return hashlib.sha1(values.encode()).hexdigest()[:12]
+
+
+def write_profile(profiler, output, name, wall):
+    body = flask.request.get_json(silent=True) or {}
+    digest = inputs_hash(body)
+    stamp = time.strftime('%Y%m%d-%H%M%S')
+    file_name = re.sub(r'[^\w.-]', '_',
+                       f'{stamp}_{name}_{digest}_{wall * 1e3:.0f}ms')
+    os.makedirs(profile_dir, exist_ok=True)
+    path = os.path.join(profile_dir, file_name)
+    profiler.dump_stats(path + '.prof')
+    with open(path + '.json', 'w') as f:
+        json.dump({'output': output, 'callback': name,
+                   'inputs_hash': digest, 'wall_seconds': wall,
+                   'triggered': body.get('changedPropIds'),
+                   'time': stamp, 'pid': os.getpid()}, f, indent=2)
+    print(f'Profile of {name} ({wall * 1e3:.0f} ms) written to {path}.prof',
+          flush=True)
+
+
+def profiled_callback(output, func):
+    # Runs the callback under cProfile when the request asks for it
+    name = getattr(func, '__name__', '?')
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not profile_requested(output, name):
+            return func(*args, **kwargs)
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            return profiler.runcall(func, *args, **kwargs)
+        finally:
+            write_profile(profiler, output, name,
+                          time.perf_counter() - start)
+
+    return wrapper
+
+
+def record_request():
+    # Appends the callback request to record_file, with its time, so
+    # that the session can be replayed
+    request = flask.request
+    if request.method != 'POST' or not request.path.endswith(callback_path):
+        return
+    line = json.dumps({'time': time.time(), 'output': callback_id(),
+                       'body': request.get_json(silent=True)}) + '\n'
+    # A single write on a file opened for appending, so that lines from
+    # several threads or workers are not interleaved
+    fd = os.open(record_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line.encode())
+    finally:
+        os.close(fd)
+
+
+def init_compression(server):
+    from flask_compress import Compress
+
+    server.config.update(
+        COMPRESS_ALGORITHM=[a.strip() for a in compress_algorithm.split(',')
+                            if a.strip()],
+        COMPRESS_MIN_SIZE=compress_min_size,
+        COMPRESS_LEVEL=compress_level,
+        COMPRESS_BR_LEVEL=compress_br_level,
+    )
+    Compress(server)
+
+
+def init_app(app):
+    """
+    Add compression, the payload log and, if enabled, the callback
+    metrics, profiling and request recording to the app. Flask runs
+    the after_request functions in the reverse order they were added,
+    so the payload is measured before compression and logged after it.
+    Call it once every page (and callback) has been registered.
+    """
+    server = app.server
+    if payload_log:
+        if not logger.handlers:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter(
+                '[%(asctime)s] payload %(message)s'))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+        server.after_request(log_payload)
+    if compress:
+        init_compression(server)
+    if payload_log:
+        server.after_request(measure_response)
+    if metrics_enabled:
+        init_metrics(app)
+    if profile_dir:
+        wrap_callbacks(app, profiled_callback)
+    if record_file:
+        server.before_request(record_request)
@@ -0,0 +1,86 @@
+"""
+Arrow IPC (Feather v2) copies of the dataset tables.
+
+The files are written uncompressed so they can be memory mapped: the
+columns are then views on the page cache, shared by every worker
+process, instead of a private pandas copy per worker. Build them with:
+
+    python -m pages.arrowdata
+"""
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+arrow_dir = './data/arrow'
+
+# Tables of a dataset, by key in bibsearch.load_dataset
+table_files = {
+    "miRNA_df": "miRNA_alignment_global_mirmap_{base}",
+    "pydeg_df": "Candidate_peaks_degradome_{base}",
+}
+
+
+def tsv_path(name, base):
+    return f"./data/{table_files[name].format(base=base)}.tsv"
+
+
+def arrow_path(name, base):
+    return f"{arrow_dir}/{table_files[name].format(base=base)}.arrow"
+
+
+def is_current(name, base):
+    # Arrow file exists and was built after the TSV was last changed
+    path = arrow_path(name, base)
+    return (os.path.exists(path)
+            and os.path.getmtime(path) >= os.path.getmtime(tsv_path(name,
+                                                                    base)))
+
+
+def build(base):
+    os.makedirs(arrow_dir, exist_ok=True)
+    for name in table_files:
+        df = pd.read_csv(tsv_path(name, base), sep='\t', low_memory=False)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        with pa.OSFile(arrow_path(name, base), 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+
+def open_table(name, base):
+    # Memory mapped, zero-copy Arrow table
+    source = pa.memory_map(arrow_path(name, base), 'r')
+    return pa.ipc.open_file(source).read_all()
+
+
+def to_frame(table, settings=None, columns=None):
+    """
+    pandas frame of a table (a DataFrame read from the TSV or a memory
+    mapped Arrow table), keeping only the rows of one PyDegradome
+    setting when 'settings' is given and only 'columns' when given.
+    The columns of an Arrow table are views on the mapped file unless
+    its rows are filtered by setting, which copies them.
+    """
+    if isinstance(table, pd.DataFrame):
+        if columns is not None:
+            table = table[columns]
+        if settings is None:
+            return table.copy()
+        return table.loc[table['pydeg_settings'].eq(settings)]
+    if columns is not None:
+        table = table.select(columns)
+    if settings is not None:
+        table = table.filter(pc.equal(table['pydeg_settings'], settings))
+    return table.to_pandas(split_blocks=True, self_destruct=False)
+
+
+def main():
+    from . import bibsearch as bib
+    for base in bib.dataset_bases():
+        build(base)
+        print(f'Built Arrow tables for {base}')
+
+
+if __name__ == "__main__":
+    main()
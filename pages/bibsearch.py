@@ -1,13 +1,21 @@
+import os
 import re
 import plotly.graph_objects as go
-from dash import dcc, html
+from dash import dcc, html, Patch
 import dash_dangerously_set_inner_html
 import dash_bootstrap_components as dbc
 import numpy as np
 import pandas as pd
 from Bio import Entrez
-import nbib
+from . import arrowdata
+from . import eutils
 import json
+import copy
+import glob
+import functools
+import inspect
+import threading
+from collections import OrderedDict
 
 # Custom colors
 mybg = '#ddeff3'
@@ -16,8 +24,46 @@ my_page_bg = 'whitesmoke'
 # Icons
 elink = '<i class="fa fa-arrow-up-right-from-square text-primary"></i>'
 
-# pattern for transcript matching
-tx_pattern = r'\bAT\w*\.[0-9]'
+# MEDLINE tags kept from each record and their names (as in nbib)
+medline_tags = {
+    "PMID": "pubmed_id",
+    "TI": "title",
+    "FAU": "authors",
+    "JT": "journal",
+    "DP": "publication_date",
+    "AID": "doi",
+    "AB": "abstract",
+    "OT": "keywords",
+}
+
+# Identity sent to NCBI along with the user e-mail
+ncbi_tool = os.environ.get('NCBI_TOOL', 'Plotly_Dash-demo')
+ncbi_api_key = os.environ.get('NCBI_API_KEY')
+
+# Full records fetched on demand (abstracts), least recently used first
+record_cache = OrderedDict()
+record_cache_size = 64
+record_cache_lock = threading.Lock()
+
+# NCBI queries in flight, shared by identical concurrent calls
+inflight = {}
+inflight_lock = threading.Lock()
+flight_totals = {"calls": 0, "shared": 0}
+flight_local = threading.local()
+
+# Tables of each dataset, read once per process
+dataset_cache = {}
+dataset_cache_lock = threading.Lock()
+
+# Columns of the bibliography table
+bib_columns = ["Author(s)", "Title", "Year", "Journal",
+               "Transcript", "Doi", "Abstract"]
+
+# MEDLINE tag line ('AB  - text'), the content may be empty
+medline_line = re.compile(r'^([A-Z0-9]{2,4}) *- ?(.*)$')
+
+# pattern for transcript (AT1G01010.1) and gene (AT1G01010) matching
+tx_pattern = re.compile(r'\bAT[0-9CM]G[0-9]{5}(?:\.[0-9]+)?\b', re.I)
 
 # Class definition for headers
 summary_cls = 'border-bottom border-3 border-secondary pb-2 mb-4'
@@ -94,6 +140,16 @@ selected_cols = [
     'id'
 ]
 
+# Genomic coordinates of the peaks, kept apart from the columns sent to
+# the browser
+position_cols = [
+    'peak_start',
+    'peak_stop',
+    'max_peak_test',
+    'gene_region_start',
+    'gene_region_end'
+]
+
 pytable_dropdown_default = dbc.Row([
     dbc.Col([
         dcc.Dropdown(
@@ -129,6 +185,13 @@ pytable_dropdown_default = dbc.Row([
             placeholder='Has miRNA alignment',
             options=['No', 'Yes'],
             className="dropdownFont"
+        )], className='five.columns'),
+    dbc.Col([
+        dcc.Dropdown(
+            id="lit_drop",
+            placeholder='Mentioned in literature',
+            options=['No', 'Yes'],
+            className="dropdownFont"
         )], className='five.columns')
 ])
 
@@ -137,26 +200,54 @@ pydeg_group_description = pd.read_csv(
 )
 
 
+def dataset_bases():
+    # Datasets found in ./data, one per *_local_vars.json file
+    return sorted(os.path.basename(filename)[:-len('_local_vars.json')]
+                  for filename in glob.glob('./data/*_local_vars.json'))
+
+
+def load_dataset(base):
+    """
+    Variables and tables of a dataset, read once per process. Loading
+    them before the server forks its workers lets every worker share
+    the same memory. Tables are pandas DataFrames or memory mapped
+    Arrow tables, use arrowdata.to_frame to get a DataFrame.
+    """
+    with dataset_cache_lock:
+        if base not in dataset_cache:
+            with open(f'./data/{base}_local_vars.json') as f:
+                dataset = {"ivars": json.load(f)}
+            for name in arrowdata.table_files:
+                # Memory mapped Arrow file when built, else the TSV
+                if arrowdata.is_current(name, base):
+                    dataset[name] = arrowdata.open_table(name, base)
+                else:
+                    dataset[name] = pd.read_csv(
+                        arrowdata.tsv_path(name, base),
+                        sep='\t', low_memory=False)
+            dataset_cache[base] = dataset
+    return dataset_cache[base]
+
+
+def preload_datasets():
+    bases = dataset_bases()
+    for base in bases:
+        load_dataset(base)
+    return bases
+
+
 def import_vars(base):
     # Import database variables
-    filename = f'./data/{base}_local_vars.json'
-    with open(filename) as f:
-        ivars = json.load(f)
-
-    return ivars
+    return copy.deepcopy(load_dataset(base)["ivars"])
 
 
 def import_data(base, ivars, py_settings_str):
     base = ivars['ibase']
     py_settings=int(py_settings_str)
+    dataset = load_dataset(base)
 
     # Import miRNA alignment dataframe
-    miRNA_df = pd.read_csv(
-        f"./data/miRNA_alignment_global_mirmap_{base}.tsv",
-        sep='\t',
-        low_memory=False,
-    )
-    miRNA_df = miRNA_df.loc[(miRNA_df['pydeg_settings'].eq(py_settings))]
+    miRNA_df = arrowdata.to_frame(dataset["miRNA_df"], py_settings)
     miRNA_df['id'] = range(0, len(miRNA_df))
     miRNA_df.loc[:, 'Score_y'] = miRNA_df['Score_y'].\
         round(2)
@@ -164,18 +255,16 @@ def import_data(base, ivars, py_settings_str):
         replace(ivars['comparison_dict'])
 
     # Import and process pydegradome data
-    pydeg_main = pd.read_csv(
-        f"./data/Candidate_peaks_degradome_{base}.tsv",
-        sep='\t', low_memory=False
-    )
-    pydeg_main = pydeg_main.loc[(pydeg_main['pydeg_settings'].eq(py_settings))]
+    pydeg_main = arrowdata.to_frame(dataset["pydeg_df"], py_settings)
     pydeg_main['id'] = range(0, len(pydeg_main))
     pydeg_df = pydeg_main[selected_cols]
     pydeg_df.loc[:, 'ratioPTx'] = pydeg_df['ratioPTx'].round(2)
     pydeg_df.loc[:, 'comparison'] = pydeg_df['comparison'].\
         replace(ivars['comparison_dict'])
+    position_df = pydeg_main[position_cols]
 
-    return {"pydeg_df": pydeg_df, "miRNA_df": miRNA_df}
+    return {"pydeg_df": pydeg_df, "miRNA_df": miRNA_df,
+            "position_df": position_df}
 
 
 def toggle_show(n_clicks, is_open):
@@ -230,6 +319,16 @@ def draw_miRNAplot(mirmap_link, globalAln_link):
     return miRNA_alignment_plot
 
 
+def patch_miRNAplot(mirmap_link, globalAln_link):
+    # Patch turning a plot of draw_miRNAplot into the plot of these links
+    plot = draw_miRNAplot(mirmap_link, globalAln_link)
+    patch = Patch()
+    patch['props']['children'][0]['props']['children'] = \
+        plot.children[0].children
+    patch['props']['children'][1]['props']['src'] = plot.children[1].src
+    return patch
+
+
 def get_description(group, category=None, html=True):
     if category:
         text_description = pydeg_group_description[
@@ -249,29 +348,100 @@ def get_description(group, category=None, html=True):
     return description
 
 
-def setEmail(email):
-    Entrez.email = email
-    return None
+def entrezIdentity(email, api_key=None, tool=None):
+    """
+    Who is calling NCBI. Passed to every search function instead of
+    setting the module globals of Bio.Entrez, so that searches made at
+    the same time for different users don't mix identities.
+    """
+    return {"email": email,
+            "api_key": api_key or ncbi_api_key,
+            "tool": tool or ncbi_tool}
+
+
+def flightKey(func, signature, args, kwargs):
+    # Same key for the same query by the same caller (e-mail and API
+    # key), whatever the way the arguments were passed: a request is
+    # never sent to NCBI under another user's identity
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+    identity = bound.arguments.pop("identity", None) or {}
+    bound.arguments["identity"] = (identity.get("email"),
+                                   identity.get("api_key"))
+    return (func.__name__,) + tuple(
+        (name, tuple(value) if isinstance(value, list) else value)
+        for name, value in bound.arguments.items())
+
+
+def singleFlight(func):
+    """
+    Concurrent calls with the same arguments and caller identity wait
+    for the first one and get a copy of its result instead of querying
+    NCBI again.
+    """
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        key = flightKey(func, signature, args, kwargs)
+        with inflight_lock:
+            flight = inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = {"done": threading.Event()}
+                inflight[key] = flight
+            flight_totals["calls"] += 1
+            flight_totals["shared"] += not leader
+        flight_local.calls = getattr(flight_local, "calls", 0) + 1
+        flight_local.shared = getattr(flight_local, "shared", 0) + \
+            (not leader)
+
+        if leader:
+            try:
+                flight["result"] = func(*args, **kwargs)
+            except Exception as error:
+                flight["error"] = error
+                raise
+            finally:
+                with inflight_lock:
+                    del inflight[key]
+                flight["done"].set()
+            return flight["result"]
+
+        flight["done"].wait()
+        if "error" in flight:
+            raise flight["error"]
+        if "result" not in flight:
+            # The first call was interrupted (worker timeout,
+            # KeyboardInterrupt) before it returned or raised: query again
+            return wrapper(*args, **kwargs)
+        return copy.deepcopy(flight["result"])
+    return wrapper
+
+
+def resetFlightStats():
+    # Start counting the queries made by this thread
+    flight_local.calls = 0
+    flight_local.shared = 0
+
+
+def flightStats():
+    # Queries made by this thread since resetFlightStats, how many were
+    # shared with an identical one in flight, and the process totals
+    return {"calls": getattr(flight_local, "calls", 0),
+            "shared": getattr(flight_local, "shared", 0),
+            "total_calls": flight_totals["calls"],
+            "total_shared": flight_totals["shared"]}
 
 
 def concat_keys(dict, key_1, sep, key_2=None, last_sep=None):
-    keys = ""
-    ilen = len(dict[key_1])
-    for j in range(ilen):
-        if key_2:
-            key = dict[key_1][j][key_2]
-        else:
-            key = dict[key_1][j]
-        if j == 0:
-            keys += key
-        elif j < ilen - 1:
-            keys += sep + " " + key
-        else:
-            if last_sep:
-                keys += last_sep + " " + key
-            else:
-                keys += sep + " " + key
-    return keys
+    if key_2:
+        keys = [item[key_2] for item in dict[key_1]]
+    else:
+        keys = list(dict[key_1])
+    if last_sep and len(keys) > 1:
+        return f"{sep} ".join(keys[:-1]) + f"{last_sep} " + keys[-1]
+    return f"{sep} ".join(keys)
 
 
 def author_etal(auth_str):
@@ -283,8 +453,18 @@ def author_etal(auth_str):
         return auth_str
 
 
-def esearch(db, search_term, n_items=5):
-    handle = Entrez.esearch(db=db, term=search_term, retmax=n_items)
+def searchTerm(transcript, op_term=None):
+    # Search for the transcript with and without the isoform suffix
+    transcript_2 = re.sub(r'\.[0-9]$', '', transcript)
+    if op_term:
+        return f"{transcript} OR {transcript_2} AND {op_term}"
+    return f"{transcript} OR {transcript_2}"
+
+
+@singleFlight
+def esearch(db, search_term, n_items=5, identity=None):
+    handle = eutils.eutil("esearch", identity, db=db, term=search_term,
+                          retmax=n_items)
     search_results = Entrez.read(handle)
     handle.close()
     if len(search_results) > 1:
@@ -293,88 +473,225 @@ def esearch(db, search_term, n_items=5):
         return None
 
 
-def getPubmedId(IdList):
-    handle = Entrez.efetch(db="pmc", id=IdList,
-                           retmode="text", rettype="medline")
-    biblio_data = handle.read()
-    handle.close()
-    records = nbib.read(biblio_data)
-
+def parseMedlineLine(line):
+    # Split a MEDLINE line into tag and content. Continuation lines
+    # (blank tag) return None as tag
+    if isinstance(line, bytes):
+        line = line.decode('utf-8')
+    line = line.rstrip('\r\n')
+    match = medline_line.match(line)
+    if match:
+        return match.group(1), match.group(2)
+    return None, line.strip()
+
+
+def compactRecord(fields):
+    # Keep only the fields used by the app, with the same keys and
+    # structure nbib produces for them
+    record = {}
+    for tag, key in medline_tags.items():
+        if tag not in fields:
+            continue
+        values = fields[tag]
+        if tag == 'PMID':
+            record[key] = int(values[0])
+        elif tag == 'FAU':
+            record[key] = [{'author': author} for author in values]
+        elif tag == 'OT':
+            record[key] = values
+        elif tag == 'AID':
+            dois = [aid[:-6] for aid in values if aid.endswith(' [doi]')]
+            if dois:
+                record[key] = dois[0]
+        else:
+            record[key] = values[0]
+    return record
+
+
+def iterMedline(lines):
+    """
+    Parse MEDLINE formatted text one record at a time. 'lines' can be
+    the handle returned by efetch, so the response is consumed
+    as it is streamed instead of being read into a single string.
+    """
+    fields = {}
+    tag = None
+    for line in lines:
+        next_tag, content = parseMedlineLine(line)
+        if next_tag:
+            tag = next_tag
+            if tag in medline_tags:
+                fields.setdefault(tag, []).append(content)
+        elif content:
+            # Multi-line field, append to the last value
+            if tag in medline_tags:
+                value = fields[tag][-1]
+                fields[tag][-1] = f"{value} {content}" if value else content
+        elif fields:
+            # Blank line, end of record
+            yield compactRecord(fields)
+            fields = {}
+            tag = None
+    if fields:
+        yield compactRecord(fields)
+
+
+@singleFlight
+def getPubmedId(IdList, identity=None):
+    handle = eutils.eutil("efetch", identity, db="pmc", id=IdList,
+                          retmode="text", rettype="medline")
     # list ids of references
-    ref_ids = [str(item["pubmed_id"]) for item in records]
+    ref_ids = [str(item["pubmed_id"]) for item in iterMedline(handle)
+               if "pubmed_id" in item]
+    handle.close()
     return ref_ids
 
 
-def fetchRefs(db, idList):
-    handle = Entrez.efetch(db=db, id=idList,
-                           retmode="text", rettype="medline")
+@singleFlight
+def fetchRefs(db, idList, identity=None):
+    handle = eutils.eutil("efetch", identity, db=db, id=idList,
+                          retmode="text", rettype="medline")
     biblio_data = handle.read()
     handle.close()
 
     return biblio_data
 
 
+@singleFlight
 def getRefRecords(db, idList,
-                  ret_mode="text", ret_type="medline"):
+                  ret_mode="text", ret_type="medline", identity=None):
     # Fetch data
-    handle = Entrez.efetch(db=db, id=idList,
-                           retmode=ret_mode, rettype=ret_type)
-    biblio_data = handle.read()
+    handle = eutils.eutil("efetch", identity, db=db, id=idList,
+                          retmode=ret_mode, rettype=ret_type)
+    records = list(iterMedline(handle))
     handle.close()
-    records = nbib.read(biblio_data)
 
     return records
 
 
-def getBibDF(entries, transcript):
-    keys = ["title", "authors", "journal",
-            "publication_date", "doi", "abstract"]
-    authors_list = []
-    title_list = []
-    publication_date_list = []
-    journal_list = []
-    doi_list = []
-    transcript_list = [transcript] * len(entries)
-    abstract_list = []
-
-    counter = 1
-    for entrie in entries:
-        for key in keys:
-            if key in entrie.keys():
-                if key == "authors":
-                    authors = concat_keys(
-                        dict=entrie,
-                        key_1="authors",
-                        key_2="author",
-                        sep=";",
-                        last_sep=" &",
-                    )
-                    icolumn = author_etal(authors)
-                elif key == "publication_date":
-                    icolumn = entrie[key][:4]
-                elif key == "doi":
-                    icolumn = f'<a href="https://doi.org/{entrie[key]}"\
+def summaryRecord(docsum):
+    # Compact record from an esummary document, same keys as iterMedline
+    record = {"pubmed_id": int(docsum["Id"])}
+    if docsum.get("Title"):
+        record["title"] = str(docsum["Title"])
+    if docsum.get("AuthorList"):
+        record["authors"] = [{"author": str(author)}
+                             for author in docsum["AuthorList"]]
+    if docsum.get("FullJournalName"):
+        record["journal"] = str(docsum["FullJournalName"])
+    if docsum.get("PubDate"):
+        record["publication_date"] = str(docsum["PubDate"])
+    if docsum.get("DOI"):
+        record["doi"] = str(docsum["DOI"])
+    return record
+
+
+@singleFlight
+def getSummaries(db, idList, identity=None):
+    """
+    Title, authors, journal, date and doi of each reference. Abstracts
+    are left out and fetched with getFullRecord when displayed.
+    """
+    handle = eutils.eutil("esummary", identity, db=db,
+                          id=",".join(idList))
+    summaries = Entrez.read(handle)
+    handle.close()
+
+    return [summaryRecord(docsum) for docsum in summaries]
+
+
+def getFullRecord(pubmed_id, identity=None):
+    # Full MEDLINE record of a reference, kept in a small LRU cache
+    key = int(pubmed_id)
+    with record_cache_lock:
+        if key in record_cache:
+            record_cache.move_to_end(key)
+            return record_cache[key]
+
+    records = getRefRecords('pubmed', [str(key)], identity=identity)
+    record = records[0] if records else {}
+    with record_cache_lock:
+        record_cache[key] = record
+        if len(record_cache) > record_cache_size:
+            record_cache.popitem(last=False)
+    return record
+
+
+def getBibRow(entrie, transcript):
+    # Table row for a single record
+    if "authors" in entrie:
+        authors = author_etal(concat_keys(
+            dict=entrie,
+            key_1="authors",
+            key_2="author",
+            sep=";",
+            last_sep=" &",
+        ))
+    else:
+        authors = np.nan
+    if "doi" in entrie:
+        doi = f'<a href="https://doi.org/{entrie["doi"]}"\
                     target=" blank"> {elink} </a>'
-                else:
-                    icolumn = entrie[key]
-            else:
-                icolumn = np.nan
-
-            list_name = key + "_list"
-            ilist = locals()[list_name]
-            ilist.append(icolumn)
-
-    data = {
-        "Author(s)": authors_list,
-        "Title": title_list,
-        "Year": publication_date_list,
-        "Journal": journal_list,
-        "Transcript": transcript_list,
-        "Doi": doi_list,
-        "Abstract": abstract_list
+    else:
+        doi = np.nan
+    if "publication_date" in entrie:
+        year = entrie["publication_date"][:4]
+    else:
+        year = np.nan
+
+    row = {
+        "Author(s)": authors,
+        "Title": entrie.get("title", np.nan),
+        "Year": year,
+        "Journal": entrie.get("journal", np.nan),
+        "Transcript": transcript,
+        "Doi": doi,
     }
+    if "abstract" in entrie:
+        row["Abstract"] = entrie["abstract"]
+    return row
 
-    return pd.DataFrame(data)
+
+def getBibDF(entries, transcript):
+    # Summaries (NCBI results) have no abstract, nor the Abstract column
+    # when none of the records has one
+    rows = [getBibRow(entrie, transcript) for entrie in entries]
+    columns = [column for column in bib_columns
+               if column != "Abstract"
+               or any("Abstract" in row for row in rows)]
+    return pd.DataFrame(rows, columns=columns)
+
+
+def mentionIndex(pydeg_df):
+    # Map the transcript and gene IDs of the peak table to peak ids
+    index = {}
+    for tx, peak_id in zip(pydeg_df['tx_name'], pydeg_df['id']):
+        tx = tx.upper()
+        gene = re.sub(r'\.[0-9]+$', '', tx)
+        index.setdefault(tx, []).append(peak_id)
+        if gene != tx:
+            index.setdefault(gene, []).append(peak_id)
+    return index
+
+
+def findMentions(entrie, index):
+    """
+    IDs from 'index' mentioned in the title or abstract of a record.
+    All IDs share the AGI format, so a single regex pass finds every
+    candidate and the index lookup keeps those in the peak table.
+    """
+    text = entrie.get("title", "") + " " + entrie.get("abstract", "")
+    mentions = []
+    for match in tx_pattern.finditer(text):
+        key = match.group(0).upper()
+        if key not in index:
+            # Isoform not in the table, try the gene
+            key = key.split('.')[0]
+            if key not in index:
+                continue
+        if key not in mentions:
+            mentions.append(key)
+    return mentions
 
 
 def printBibSection(iter_query, iter_ref, sep):
@@ -0,0 +1,232 @@
+"""
+HTTP transport for the NCBI E-utilities used by bibsearch.
+
+Bio.Entrez opens a new urllib connection (and TLS handshake) for every
+call. The pooled transport keeps HTTPS connections alive between calls,
+asks for gzip encoded responses and records, for each call, the time
+spent setting up the connection and the time spent on the transfer.
+Select the transport with the ENTREZ_TRANSPORT environment variable
+('pooled', default, or 'entrez' for Bio.Entrez).
+"""
+import http.client
+import io
+import os
+import queue
+import ssl
+import threading
+import time
+import zlib
+from collections import deque
+from urllib.parse import urlencode, urlsplit
+
+from Bio import Entrez
+
+# Settings, can be changed from the environment
+base_url = os.environ.get('ENTREZ_BASE_URL',
+                          'https://eutils.ncbi.nlm.nih.gov/entrez/eutils/')
+connect_timeout = float(os.environ.get('ENTREZ_CONNECT_TIMEOUT', 10))
+read_timeout = float(os.environ.get('ENTREZ_READ_TIMEOUT', 60))
+pool_size = int(os.environ.get('ENTREZ_POOL_SIZE', 4))
+keep_alive = os.environ.get('ENTREZ_KEEP_ALIVE', '1') != '0'
+transport_name = os.environ.get('ENTREZ_TRANSPORT', 'pooled')
+ssl_context = ssl.create_default_context(
+    cafile=os.environ.get('ENTREZ_CAFILE'))
+
+# Idle connections, most recently used first
+pool = queue.LifoQueue(maxsize=pool_size)
+
+# Timing of the last calls
+call_log = deque(maxlen=500)
+
+# NCBI allows 3 requests per second (10 with an API key)
+rate_lock = threading.Lock()
+last_request = [0.0]
+
+
+def wait_rate_limit(params):
+    delay = 0.1 if params.get('api_key') else 0.37
+    with rate_lock:
+        wait = last_request[0] + delay - time.time()
+        if wait > 0:
+            time.sleep(wait)
+        last_request[0] = time.time()
+
+
+def new_connection():
+    url = urlsplit(base_url)
+    if url.scheme == 'https':
+        return http.client.HTTPSConnection(
+            url.hostname, url.port, timeout=connect_timeout,
+            context=ssl_context)
+    return http.client.HTTPConnection(url.hostname, url.port,
+                                      timeout=connect_timeout)
+
+
+def get_connection():
+    try:
+        return pool.get_nowait()
+    except queue.Empty:
+        return new_connection()
+
+
+def release_connection(conn, reusable):
+    if not (keep_alive and reusable):
+        conn.close()
+        return
+    try:
+        pool.put_nowait(conn)
+    except queue.Full:
+        conn.close()
+
+
+def clear_pool():
+    while True:
+        try:
+            pool.get_nowait().close()
+        except queue.Empty:
+            return
+
+
+class PooledResponse(io.RawIOBase):
+    # Body of a response, decompressed as it is read. The connection
+    # goes back to the pool once the body has been read to the end and
+    # the handle is closed
+    def __init__(self, conn, response, timing):
+        self.conn = conn
+        self.response = response
+        self.timing = timing
+        self.start = time.perf_counter()
+        self.pending = b''
+        if response.getheader('Content-Encoding') == 'gzip':
+            self.decompressor = zlib.decompressobj(wbits=31)
+        else:
+            self.decompressor = None
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.response is None:
+            return 0
+        while not self.pending:
+            chunk = self.response.read(len(buffer))
+            if not chunk:
+                if self.decompressor:
+                    self.pending = self.decompressor.flush()
+                    self.decompressor = None
+                    continue
+                return 0
+            if self.decompressor:
+                self.pending = self.decompressor.decompress(chunk)
+            else:
+                self.pending = chunk
+        n = min(len(buffer), len(self.pending))
+        buffer[:n] = self.pending[:n]
+        self.pending = self.pending[n:]
+        return n
+
+    def close(self):
+        if self.response is not None:
+            reusable = (self.response.isclosed()
+                        and not self.response.will_close)
+            self.response.close()
+            self.response = None
+            self.timing['transfer'] = time.perf_counter() - self.start
+            call_log.append(self.timing)
+            release_connection(self.conn, reusable)
+        super().close()
+
+
+def request_params(identity, params):
+    # Identity of the caller (email, api_key, tool) added to the query
+    params = dict(params, **(identity or {}))
+    return {key: value for key, value in params.items()
+            if value is not None}
+
+
+def pooled_open(cgi, params):
+    if isinstance(params.get('id'), (list, tuple)):
+        params['id'] = ','.join(str(i) for i in params['id'])
+    body = urlencode(params)
+    path = urlsplit(base_url).path + f'{cgi}.fcgi'
+    headers = {'Accept-Encoding': 'gzip',
+               'Connection': 'keep-alive' if keep_alive else 'close'}
+    # NCBI asks for POST when the request is long
+    if len(body) > 1000:
+        method = 'POST'
+        headers['Content-Type'] = 'application/x-www-form-urlencoded'
+    else:
+        method, path, body = 'GET', f'{path}?{body}', None
+
+    wait_rate_limit(params)
+    timing = {'cgi': cgi, 'new_connection': False, 'setup': 0.0}
+    for attempt in range(2):
+        # The retry takes a new connection: the idle ones may be as
+        # stale as the one that failed
+        conn = new_connection() if attempt else get_connection()
+        start = time.perf_counter()
+        try:
+            if conn.sock is None:
+                timing['new_connection'] = True
+                conn.connect()
+                conn.sock.settimeout(read_timeout)
+                timing['setup'] = time.perf_counter() - start
+            request_start = time.perf_counter()
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            break
+        except (http.client.HTTPException, OSError):
+            # OSError covers resets, timeouts and TLS errors of a dead
+            # socket
+            conn.close()
+            if attempt or timing['new_connection']:
+                raise
+            # A pooled connection closed by the server: drop the other
+            # idle ones and retry once with a new connection
+            clear_pool()
+    timing['wait'] = time.perf_counter() - request_start
+
+    if response.status != 200:
+        response.read()
+        release_connection(conn, not response.will_close)
+        raise http.client.HTTPException(
+            f'{cgi}: HTTP {response.status} {response.reason}')
+
+    handle = io.BufferedReader(PooledResponse(conn, response, timing))
+    content_type = response.getheader('Content-Type', '')
+    if content_type.startswith('text/plain'):
+        handle = io.TextIOWrapper(handle, encoding='utf-8')
+    return handle
+
+
+def entrez_open(cgi, params):
+    # Previous behaviour: one urllib connection per call. The identity
+    # is passed as parameters, so the Bio.Entrez globals are not used
+    return getattr(Entrez, cgi)(**params)
+
+
+transports = {'pooled': pooled_open, 'entrez': entrez_open}
+
+
+def eutil(cgi, identity=None, **params):
+    """
+    Call an E-utility ('esearch', 'efetch', 'esummary') on behalf of
+    'identity' (see bibsearch.entrezIdentity) and return a handle to
+    the response, as the Bio.Entrez functions do.
+    """
+    return transports[transport_name](cgi, request_params(identity, params))
+
+
+def timing_summary():
+    # Mean setup and transfer time (s) for new and reused connections
+    summary = {}
+    for new in (True, False):
+        calls = [t for t in call_log if t['new_connection'] == new]
+        if calls:
+            summary['new' if new else 'reused'] = {
+                'calls': len(calls),
+                'setup': sum(t['setup'] for t in calls) / len(calls),
+                'wait': sum(t['wait'] for t in calls) / len(calls),
+                'transfer': sum(t['transfer'] for t in calls) / len(calls),
+            }
+    return summary
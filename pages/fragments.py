@@ -0,0 +1,123 @@
+"""
+Pre-rendered HTML fragments, served compressed with an ETag.
+
+Pages whose content does not change while the app runs (the
+Description page) are rendered to HTML once, when the app starts, and
+compressed once with brotli and gzip. Their Dash layout only holds a
+placeholder that fetches
+
+    /fragments/<name>.html?v=<hash>
+
+Browsers keep a versioned fragment for good; the address without ?v=
+is revalidated with If-None-Match. Images of a fragment are loaded
+lazily and carry their dimensions, so the page does not move while
+they arrive.
+"""
+import gzip
+import hashlib
+import re
+import struct
+
+import brotli
+import dash
+import flask
+
+from . import staticbundle
+
+# Fragments by name, with their ETag and encoded bodies
+fragments = {}
+
+image_tag = re.compile(r'<img\b([^>]*?)\s*/?>')
+asset_src = re.compile(r'\bsrc="\./assets/([^"?#]+)"')
+
+# JPEG start of frame markers, the ones holding the image size
+jpeg_frames = set(range(0xc0, 0xd0)) - {0xc4, 0xc8, 0xcc}
+
+
+def image_size(path):
+    """
+    Width and height of a PNG or JPEG file, read from its header. None
+    for other formats.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data.startswith(b'\x89PNG\r\n\x1a\n'):
+        return struct.unpack('>II', data[16:24])
+    if data.startswith(b'\xff\xd8'):
+        i = 2
+        while i + 9 <= len(data):
+            if data[i] != 0xff:
+                return None
+            marker = data[i + 1]
+            if marker == 0xff:
+                # Fill byte
+                i += 1
+                continue
+            if marker in jpeg_frames:
+                height, width = struct.unpack('>HH', data[i + 5:i + 9])
+                return width, height
+            i += 2 + struct.unpack('>H', data[i + 2:i + 4])[0]
+    return None
+
+
+def lazy_images(text):
+    # Images of assets/ loaded when scrolled into view, with their size
+    def rewrite(match):
+        attributes = match.group(1)
+        src = asset_src.search(attributes)
+        if src is None or 'loading=' in attributes:
+            return match.group(0)
+        size = image_size(f'{staticbundle.assets_dir}/{src.group(1)}')
+        extra = ' loading="lazy" decoding="async"'
+        if size and 'width=' not in attributes:
+            extra += f' width="{size[0]}" height="{size[1]}"'
+        return f'<img{attributes}{extra} />'
+
+    return image_tag.sub(rewrite, text)
+
+
+def register(name, text):
+    """
+    Store the HTML 'text' as the fragment 'name', with lazy images and
+    fingerprinted asset addresses. Returns its versioned address, under
+    the app's requests_pathname_prefix.
+    """
+    text = staticbundle.fingerprint_html(lazy_images(text))
+    data = text.encode('utf-8')
+    etag = hashlib.sha1(data).hexdigest()[:16]
+    fragments[name] = {
+        'etag': etag,
+        'identity': data,
+        'br': brotli.compress(data, quality=11),
+        'gzip': gzip.compress(data, compresslevel=9, mtime=0),
+    }
+    return dash.get_relative_path(f'/fragments/{name}.html') + f'?v={etag}'
+
+
+def serve(name):
+    fragment = fragments.get(name)
+    if fragment is None:
+        flask.abort(404)
+    request = flask.request
+    encoding = next((e for e in ('br', 'gzip')
+                     if request.accept_encodings[e]), 'identity')
+    response = flask.Response(fragment[encoding],
+                              mimetype='text/html')
+    if encoding != 'identity':
+        # Also keeps Flask-Compress from compressing it again
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    # Weak: the same ETag stands for every encoding of the fragment
+    response.set_etag(fragment['etag'], weak=True)
+    if request.args.get('v') == fragment['etag']:
+        response.headers['Cache-Control'] = staticbundle.immutable
+    else:
+        response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+
+def init_app(app):
+    # Route under the app's routes_pathname_prefix
+    app.server.add_url_rule(
+        f'{app.config.routes_pathname_prefix}fragments/<name>.html',
+        'fragment', serve)
@@ -0,0 +1,130 @@
+"""
+Overlap of genomic intervals, on sorted numpy arrays.
+
+Intervals are closed ([start, stop], as the peak and gene region
+coordinates of the datasets) and belong to a group (chromosome,
+strand...) given as an integer code. Sorting by (group, start) turns
+an overlap question into binary searches, so that a join of n
+intervals against m costs O((n + m) log m) without a Python loop.
+
+A region index (build_index) keeps the intervals of each chromosome
+sorted by start, with the length of the longest one: the intervals
+overlapping a region start at most that length before it, so two
+binary searches bound them (query).
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+# End of a region covering a whole chromosome: the largest integer the
+# browser keeps exactly, regions are stored there
+whole_chromosome = 2**53 - 1
+
+# Chr3:1,200,000-1,350,000, 3:1200000..1350000, chr3:1250000 or chr3
+region_pattern = re.compile(
+    r'^\s*(?:chr(?:omosome)?)?\s*([a-z0-9]+)\s*'
+    r'(?::\s*([\d,_ ]+?)\s*(?:(?:-|\u2013|\u2014|\.\.)\s*([\d,_ ]+?))?)?\s*$',
+    re.I)
+
+
+def shared_codes(left, right, columns):
+    """
+    Integer codes of the values of 'columns' in the frames 'left' and
+    'right', equal values getting the same code in both.
+    """
+    keys = pd.concat([left[columns], right[columns]], ignore_index=True)
+    codes = keys.groupby(columns, sort=False, dropna=False).ngroup()
+    codes = codes.to_numpy(dtype=np.int64)
+    return codes[:len(left)], codes[len(left):]
+
+
+def overlaps_any(codes, starts, stops, other_codes, other_starts,
+                 other_stops):
+    """
+    For each interval of the first set, whether an interval of the
+    other set in the same group overlaps it.
+
+    The other set is sorted by (group, start) with the largest stop
+    seen so far: an interval overlaps one of them when, among those of
+    its group starting at or before its stop, the largest stop reaches
+    its start. Groups are laid out one after another on a single axis
+    (code * span + coordinate) so that one searchsorted covers them.
+    """
+    found = np.zeros(len(codes), dtype=bool)
+    if not len(codes) or not len(other_codes):
+        return found
+    span = int(max(np.max(stops), np.max(other_stops))) + 1
+    other_codes = np.asarray(other_codes, dtype=np.int64) * span
+    keys = other_codes + np.asarray(other_starts, dtype=np.int64)
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    reach = np.maximum.accumulate(
+        other_codes[order] + np.asarray(other_stops, dtype=np.int64)[order])
+    codes = np.asarray(codes, dtype=np.int64) * span
+    last = np.searchsorted(keys, codes + stops, side='right') - 1
+    candidates = last >= 0
+    found[candidates] = reach[last[candidates]] \
+        >= codes[candidates] + np.asarray(starts)[candidates]
+    return found
+
+
+def build_index(chroms, starts, stops):
+    """
+    Region index of intervals: for each chromosome, the starts in
+    increasing order, the stops and the positions of the intervals in
+    the same order, and the length of the longest interval.
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    stops = np.asarray(stops, dtype=np.int64)
+    index = {}
+    for chrom, rows in pd.Series(chroms).groupby(
+            np.asarray(chroms)).indices.items():
+        rows = rows[np.argsort(starts[rows], kind='stable')]
+        index[chrom] = {'starts': starts[rows], 'stops': stops[rows],
+                        'rows': rows,
+                        'longest': int(np.max(stops[rows] - starts[rows]))}
+    return index
+
+
+def query(index, chrom, start, stop):
+    """
+    Positions (sorted) of the intervals of 'index' on 'chrom' that
+    overlap [start, stop]: O(log n + k) for k intervals starting
+    between start - longest and stop.
+    """
+    found = index.get(chrom)
+    if found is None:
+        return np.empty(0, dtype=np.int64)
+    first = np.searchsorted(found['starts'], start - found['longest'],
+                            side='left')
+    last = np.searchsorted(found['starts'], stop, side='right')
+    rows = found['rows'][first:last]
+    return np.sort(rows[found['stops'][first:last] >= start])
+
+
+def parse_region(text, chromosomes):
+    """
+    Region typed by the user as a dict with 'chr', 'start' and 'stop'
+    (a chromosome alone is the whole chromosome). The chromosome is
+    matched to one of 'chromosomes' ignoring case. None when the text
+    is not a region of one of them.
+    """
+    match = region_pattern.match(text or '')
+    if match is None:
+        return None
+    chrom = next((c for c in chromosomes
+                  if str(c).lower() == match.group(1).lower()), None)
+    if chrom is None:
+        return None
+
+    def position(value):
+        return int(re.sub(r'[,_ ]', '', value))
+
+    if match.group(2) is None:
+        start, stop = 0, whole_chromosome
+    else:
+        start = position(match.group(2))
+        stop = position(match.group(3)) if match.group(3) else start
+    return {'chr': chrom, 'start': min(start, stop),
+            'stop': max(start, stop)}
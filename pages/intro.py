@@ -1,47 +1,19 @@
+import html as html_text
+
 import dash
-from dash import html, Input, Output, callback, State, MATCH
-# import plotly.express as px
-import dash_bootstrap_components as dbc
-# import json
-from dash_dangerously_set_inner_html import DangerouslySetInnerHTML
+from dash import dcc, html, Input, Output, clientside_callback
 from . import bibsearch as bib
+from . import fragments
 
 dash.register_page(__name__, path='/', name='Description')
 
-# Class definition for headers
-# icon_hide = "fas fa-angle-up me-4 align-self-center icon"
-# icon_show = "fas fa-angle-down me-4 align-self-center icon"
-# hdr_hide = 'd-flex bg-opacity-25 bg-primary'
-# hdr_show = 'd-flex bg-opacity-10 bg-primary'
-# hdr_div = 'd-flex bg-opacity-25 bg-primary'
-layout = html.Main([
-    # Summary
-    html.Section([
-        dbc.Alert([html.H2('Summary',
-                           className=bib.summary_cls),
-
-                   DangerouslySetInnerHTML('''
+summary_html = '''
 <p>
 This Dash app summarizes the analysis of mRNA degradation fragments using a third party python script (<code>PyDegradome</code> <a href="#citeproc_bib_item_2">Gaglia, Rycroft, and Glaunsinger 2015</a>) followed by a custom classification. The result is a table of transcripts (containing signals of degradation fragments, <i>peaks</i>) sorted according to two main classification criteria. Plots for the accumulation of degradation fragments along the transcript are linked for the user to inspect. Additionally, alignments of sequences around peaks and known miRNA are shown for alignment scores above certain threshold. Finally, an option to search for related literature based on the transcript name and other search criteria is presented. As a proof of concept the analysis of two data sets is presented.
 </p>
-        ''')], color='primary')
-    ]),
-    # Description Pydegradome
-    html.Section([
-        dbc.Alert([
-            html.Div([
-                html.H2('PyDegradome description',
-                        className='flex-fill'),
-                html.I(className=bib.icon_hide,
-                       id={"type": "btn_i", "section": "description"},
-                       n_clicks=0)
-            ], id={"type": "header_i", "section": "description"},
-                     className=bib.hdr_div),
-            dbc.Collapse(
-                is_open=True,
-                id={"type":"description_i_html", "section": "description"},
-                className="mt-4",
-                children=DangerouslySetInnerHTML('''
+        '''
+
+description_html = '''
 <p>
 <code>PyDegradome</code> is a python script developed by <a href="#citeproc_bib_item_2">Gaglia, Rycroft, and Glaunsinger 2015</a> for the study of mRNA targets of a viral endonuclease upon infection of human cells. Broadly, the script compares two samples, one having the factor thought to be involved in the production of mRNA degradation fragments (<i>test</i>) and another devoided of such factor (<i>control</i>); from this comparison a table is presented with genomic coordinates for regions where degradation intermediates are accumulated differently in the test sample. Differential accumulation of degradation intermediates in the control sample is not reported unless the test is repeated and the order of samples is reversed.
 </p>
@@ -74,25 +46,9 @@ Significant peaks are reported in a text file (see below); genomic coordinates f
 [0, 0, 0, 0, 1, 0, 0, 0, 0, 0, 3, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
 </pre>
 </div>        
-                     '''))
-        ], color='secondary')
-    ]),
-    # Post Pydegradome
-    html.Section([
-        dbc.Alert([
-            html.Div([
-                html.H2('Classification post PyDegradome',
-                        className='flex-fill'),
-                html.I(className=bib.icon_hide,
-                       id={"type": "btn_i", "section": "classification"},
-                       n_clicks=0)
-            ], id={"type": "header_i", "section": "classification"},
-                     className=bib.hdr_div),
-            dbc.Collapse(
-                is_open=True,
-                id={"type": "description_i_html", "section": "classification"},
-                className="mt-4",
-                children=DangerouslySetInnerHTML("""
+                     '''
+
+classification_html = """
 <p>
 As shown above the results of the <code>PyDegradome</code> script require some level of post processing by the user; at least, the annotation of the genomic coordinates to the corresponding gene and (following the original work,  <a href="#citeproc_bib_item_2">Gaglia, Rycroft, and Glaunsinger 2015</a> Figure 1D) the identification of shared peaks between replicates. Additionally, there are not recommended settings for the analysis rather, the authors advice to test different values for the <i>multiplicative factor (MF)</i> and the <i>confidence interval (CI)</i>) in order to identify those that would result in peaks with the highest confidence  (See <a href="#citeproc_bib_item_2">Gaglia, Rycroft, and Glaunsinger 2015</a> p. 5 and Figure S2B).
 </p>
@@ -159,25 +115,9 @@ The two classification steps along with the annotation, summary and other steps
 <li><a href="https://github.com/ssl-bio/R_postpydeg">R package</a></li>
 <li><a href="https://github.com/ssl-bio/Plotly_Dash-demo/">Dash app</a></li>
 </ul>
-                     """)),
-        ], color='secondary')
-    ]),
-    # Alignment of miRNA species
-    html.Section([
-        dbc.Alert([
-            html.Div([
-                html.H2('Alignment of sequences around peaks with known miRNA',
-                        className='flex-fill'),
-                html.I(className=bib.icon_hide,
-                       id={"type": "btn_i", "section": "alignment"},
-                       n_clicks=0)
-            ], id={"type": "header_i", "section": "alignment"},
-                     className=bib.hdr_div),
-            dbc.Collapse(
-                is_open=True,
-                id={"type": "description_i_html", "section": "alignment"},
-                className="mt-4",
-                children=DangerouslySetInnerHTML("""
+                     """
+
+alignment_html = """
 <p>
 As stated above, the <code>PyDegradome</code> script (<a href="#citeproc_bib_item_2">Gaglia, Rycroft, and Glaunsinger 2015</a>) was developed to study the targets of an endonuclease; this, driven by the fact that most of the software available for the study of mRNA degradation fragments is aimed to the identification of potential miRNA targets. For plants that is particularly the case as the endonuclease involved in the ribosome-associated mRNA control remains to be discovered (<a href="#citeproc_bib_item_4">Karamyshev and Karamysheva 2018</a>). In this context, it was tested whether sequences found around the identified peaks could align to known miRNA species. To this end, two different approaches were tested. The first one, performed a <i>global pairwise-alignment</i> (implemented in <code>biopython</code> V. 1.75 (<a href="#citeproc_bib_item_1">Cock et al. 2009</a>) using a 22nt region centered around the peak whereas, the second one used a program that predicts the strength of the interaction between a miRNA and a putative target (<code>Mirmap</code>, <a href="#citeproc_bib_item_7">Vejnar and Zdobnov 2012</a>); in this case a longer sequence around peaks (40nt) was tested against to known miRNAs.
 </p>
@@ -189,25 +129,9 @@ To set a threshold for the alignment score, which would account for the mismatch
 <p>
 Note that due to storage limitation the alignment was conducted on sequences from peaks classified in one of the following categories, 1-A, 1-B, 2-A or 2-B
 </p>      
-                      """))
-        ], color='secondary')
-    ]),
-    # Search for related literature
-    html.Section([
-        dbc.Alert([
-            html.Div([
-                html.H2('Search for related literature',
-                        className='flex-fill'),
-                html.I(className=bib.icon_hide,
-                       id={"type": "btn_i", "section": "search"},
-                       n_clicks=0)
-            ], id={"type": "header_i", "section": "search"},
-                     className=bib.hdr_div),
-            dbc.Collapse(
-                is_open=True,
-                id={"type": "description_i_html", "section": "search"},
-                className="mt-4",
-                children=DangerouslySetInnerHTML("""
+                      """
+
+search_html = """
 <p>
 A function to select literature mentioning transcripts of interest is included in the app. Each classified peak has a checkbox for selecting those transcripts with potential interest (Figure <a href="#orgfaf92ea">6</a>, upper panel). Then, on the section <i>Related literature for the selected transcripts</i> three fields for setting the query are presented (Figure <a href="#orgfaf92ea">6</a>, lower panel). The first is a registered e-mail address for carrying a query on NCBI (<a href="https://account.ncbi.nlm.nih.gov/">login link</a>); next is a field to include additional search terms (using an <code>AND</code> keyword in the background) and finally there is a field for specifying the number of bibliographic entries to be retrieved per selected transcript with a default of 5 and a maximum of 100 (an arbitrary value to avoid overloading the server).
 </p>
@@ -221,51 +145,77 @@ A function to select literature mentioning transcripts of interest is included i
 <p>
 The search is carried using <code>biopython</code>'s <a href="https://biopython.org/docs/1.75/api/Bio.Entrez.html#"><code>Bio.entrez</code></a> querying NCBI's PubMed Central (PMC) database. Search results are displayed in a table with basic information of each retrieved reference and a section below with the reference abstract which can be accessed by clicking on a row. Besides the basic bibliographic information, the table also includes a column with the transcript's name used for the query, a link to the publication's web page and a checkbox for selecting and downloading references in <code>medline</code> (a format that is similar to <code>RIS</code> and can be parsed by most reference management software). 
 </p>    
-                     """))
-        ], color='secondary')
-    ]),
-    # References
-    html.Section([
-        dbc.Alert([
-            html.Div([
-                html.H2('References',
-                        className='flex-fill'),
-                html.I(className=bib.icon_hide,
-                       id={"type": "btn_i", "section": "references"},
-                       n_clicks=0)
-            ], id={"type": "header_i", "section": "references"},
-                     className=bib.hdr_div),
-            dbc.Collapse(
-                is_open=True,
-                id={"type": "description_i_html", "section": "references"},
-                className="mt-4",
-                children=[
-                    html.Div(
-                        bib.get_description('references',
-                                            'intro'),
-                        className='description_h3',
-                        id='study_description'
-                    )
-                ]
-            )
-        ], color='secondary')
+                     """
+
+
+def section_html(section, title, body):
+    """
+    Static HTML of a section whose content can be hidden by clicking on
+    its header, styled as the Dash headers of the other pages.
+    """
+    return f'''
+<section>
+<div class="alert alert-secondary" role="alert">
+<details open class="description_i" id="description_{section}">
+<summary class="{bib.hdr_div}">
+<h2 class="flex-fill">{html_text.escape(title)}</h2>
+<i class="{bib.icon_hide}"></i>
+</summary>
+<div class="mt-4">{body}</div>
+</details>
+</div>
+</section>'''
+
+
+def page_html():
+    references = ''.join(
+        bib.get_description('references', 'intro', html=False))
+    return ''.join([
+        f'''
+<section>
+<div class="alert alert-primary" role="alert">
+<h2 class="{bib.summary_cls}">Summary</h2>
+{summary_html}
+</div>
+</section>''',
+        section_html('description', 'PyDegradome description',
+                     description_html),
+        section_html('classification', 'Classification post PyDegradome',
+                     classification_html),
+        section_html('alignment',
+                     'Alignment of sequences around peaks with known miRNA',
+                     alignment_html),
+        section_html('search', 'Search for related literature',
+                     search_html),
+        section_html('references', 'References',
+                     f'<div class="description_h3" id="study_description">'
+                     f'{references}</div>'),
     ])
+
+
+# The page does not change while the app runs: rendered once and served
+# compressed from /fragments/ (see fragments.py)
+fragment_src = fragments.register('description', page_html())
+
+layout = html.Main([
+    dcc.Store(id='description_src', data=fragment_src),
+    html.Div(id='description_page')
 ])
 
 
 # [F] Callback functions
-@callback(
-    [Output({"type": "description_i_html", "section": MATCH}, "is_open"),
-     Output({"type": "btn_i", "section": MATCH}, "className"),
-     Output({"type": "header_i", "section": MATCH}, "className")],
-    [Input({"type": "btn_i", "section": MATCH}, "n_clicks")],
-    [State({"type": "description_i_html", "section": MATCH}, "is_open")],
-    prevent_initial_call=True
+# The fragment is shown with the DangerouslySetInnerHTML component
+# (loaded by bibsearch)
+clientside_callback(
+    """async (src) => {
+    const response = await fetch(src);
+    if (!response.ok) {
+        return window.dash_clientside.no_update;
+    }
+    return {namespace: 'dash_dangerously_set_inner_html',
+            type: 'DangerouslySetInnerHTML',
+            props: {children: await response.text()}};
+    }""",
+    Output('description_page', 'children'),
+    Input('description_src', 'data'),
 )
-def toggle_collapse(n, is_open):
-    toggle_section = bib.toggle_show(n, is_open)
-    hide_show = toggle_section[0]
-    btn = toggle_section[1]
-    hdr = toggle_section[2]
-
-    return hide_show, btn, hdr
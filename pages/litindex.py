@@ -0,0 +1,253 @@
+"""
+Local literature index (SQLite FTS5) for the transcripts of a dataset.
+
+The index is filled offline by harvesting NCBI with the same functions
+used by the 'Related literature' section, so searches for transcripts
+already in the index are answered locally. Build or refresh it with:
+
+    python -m pages.litindex Zhang-2021 --email user@example.com
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import time
+
+import pandas as pd
+
+from . import bibsearch as bib
+
+# Number of references kept per transcript when harvesting
+harvest_items = 20
+
+schema = """
+CREATE TABLE IF NOT EXISTS records (
+    pubmed_id INTEGER PRIMARY KEY,
+    record TEXT NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS refs USING fts5(
+    title, abstract, keywords
+);
+CREATE TABLE IF NOT EXISTS tx_refs (
+    tx_name TEXT NOT NULL,
+    pubmed_id INTEGER NOT NULL,
+    rank INTEGER NOT NULL,
+    PRIMARY KEY (tx_name, pubmed_id)
+);
+CREATE TABLE IF NOT EXISTS harvested (
+    tx_name TEXT PRIMARY KEY,
+    n_items INTEGER NOT NULL,
+    n_found INTEGER NOT NULL,
+    updated REAL NOT NULL
+);
+"""
+
+# Tokens of an Entrez style boolean query
+query_token = re.compile(r'"[^"]*"|\(|\)|\[[^\]]*\]|[^\s()"\[\]]+')
+
+
+def index_path(base):
+    return f'./data/literature_{base}.sqlite'
+
+
+def open_index(base, write=False):
+    # Read-only connections unless harvesting. Returns None if there is
+    # no index for the dataset
+    path = index_path(base)
+    if write:
+        conn = sqlite3.connect(path)
+        conn.executescript(schema)
+        return conn
+    if not os.path.exists(path):
+        return None
+    return sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+
+
+def fts_query(op_term):
+    """
+    Translate a search term written for Entrez (AND/OR/NOT, quotes and
+    parentheses) into an FTS5 query. Field tags such as [Title] are
+    dropped and every word is quoted so that hyphens or dots are not
+    read as FTS5 syntax.
+    """
+    terms = []
+    for token in query_token.findall(op_term):
+        if token.startswith('['):
+            continue
+        if token in ('(', ')', 'AND', 'OR', 'NOT'):
+            terms.append(token)
+        elif token.startswith('"'):
+            terms.append(token)
+        elif token.endswith('*'):
+            terms.append('"' + token[:-1].replace('"', '') + '"*')
+        else:
+            terms.append('"' + token.replace('"', '') + '"')
+
+    # FTS5 operators are strictly binary: 'a AND NOT b' becomes
+    # 'a NOT b' and dangling operators are dropped. A NOT without a left
+    # operand has no FTS5 equivalent. Unmatched parentheses are dropped
+    # or closed, empty ones removed
+    operators = ('AND', 'OR', 'NOT')
+    query = []
+    depth = 0
+    for term in terms:
+        if term == 'NOT' and (not query or query[-1] in ('(', 'OR')):
+            raise ValueError(f'Unsupported search term, NOT needs a term '
+                             f'before it: {op_term}')
+        if term in operators:
+            if not query or query[-1] == '(':
+                continue
+            if query[-1] in operators:
+                if term == 'NOT':
+                    query[-1] = term
+                continue
+        elif term == '(':
+            depth += 1
+        elif term == ')':
+            if not depth:
+                continue
+            depth -= 1
+            if query[-1] in operators:
+                query.pop()
+            if query[-1] == '(':
+                query.pop()
+                continue
+        query.append(term)
+    while query and query[-1] in operators + ('(',):
+        if query.pop() == '(':
+            depth -= 1
+    return ' '.join(query + [')'] * depth)
+
+
+def add_records(conn, transcript, records, n_items):
+    conn.execute("DELETE FROM tx_refs WHERE tx_name = ?", (transcript,))
+    for rank, record in enumerate(records):
+        pubmed_id = record['pubmed_id']
+        conn.execute("INSERT OR REPLACE INTO records VALUES (?, ?)",
+                     (pubmed_id, json.dumps(record)))
+        conn.execute("DELETE FROM refs WHERE rowid = ?", (pubmed_id,))
+        conn.execute(
+            "INSERT INTO refs (rowid, title, abstract, keywords) "
+            "VALUES (?, ?, ?, ?)",
+            (pubmed_id, record.get('title', ''),
+             record.get('abstract', ''),
+             '; '.join(record.get('keywords', []))))
+        conn.execute("INSERT OR REPLACE INTO tx_refs VALUES (?, ?, ?)",
+                     (transcript, pubmed_id, rank))
+    conn.execute("INSERT OR REPLACE INTO harvested VALUES (?, ?, ?, ?)",
+                 (transcript, n_items, len(records), time.time()))
+
+
+def dataset_transcripts(base):
+    pydeg_main = pd.read_csv(
+        f"./data/Candidate_peaks_degradome_{base}.tsv",
+        sep='\t', usecols=['tx_name']
+    )
+    return sorted(pydeg_main['tx_name'].unique())
+
+
+def harvest(base, email, n_items=harvest_items, refresh=False,
+            max_age_days=None):
+    """
+    Search NCBI for every transcript of the dataset and store the
+    references in the local index. Transcripts already harvested are
+    skipped unless 'refresh' is set or their entry is older than
+    'max_age_days'.
+    """
+    identity = bib.entrezIdentity(email)
+    conn = open_index(base, write=True)
+    done = dict(conn.execute("SELECT tx_name, updated FROM harvested"))
+    if max_age_days is not None:
+        oldest = time.time() - max_age_days * 86400
+    else:
+        oldest = None
+
+    transcripts = dataset_transcripts(base)
+    for i, transcript in enumerate(transcripts):
+        if transcript in done and not refresh:
+            if oldest is None or done[transcript] >= oldest:
+                continue
+        ref_ids = bib.esearch('pmc', bib.searchTerm(transcript),
+                              n_items=n_items, identity=identity)
+        if ref_ids:
+            ref_ids_pubmed = bib.getPubmedId(ref_ids, identity)
+            records = bib.getRefRecords('pubmed', ref_ids_pubmed,
+                                        identity=identity)
+        else:
+            records = []
+        with conn:
+            add_records(conn, transcript, records, n_items)
+        print(f'[{i + 1}/{len(transcripts)}] {transcript}: '
+              f'{len(records)} references')
+    conn.close()
+
+
+def search_local(conn, transcript, op_term=None, n_items=5):
+    """
+    References for a transcript from the local index, filtered by
+    'op_term'. Returns None when the transcript was not harvested, when
+    its harvest was truncated and more references or an 'op_term' are
+    asked for, or when 'op_term' cannot be translated to FTS5, so the
+    caller falls back to NCBI.
+    """
+    harvested = conn.execute(
+        "SELECT n_items, n_found FROM harvested WHERE tx_name = ?",
+        (transcript,)).fetchone()
+    if harvested is None:
+        return None
+    kept, found = harvested
+    # A harvest that hit its limit may have left out references NCBI
+    # would return, when more are asked for or when 'op_term' (searched
+    # by NCBI in the full texts) filters them
+    truncated = found >= kept
+    if truncated and (n_items > kept or op_term):
+        return None
+
+    try:
+        query = fts_query(op_term) if op_term else ''
+    except ValueError as error:
+        print(error)
+        return None
+    if query:
+        try:
+            rows = conn.execute(
+                "SELECT r.record FROM tx_refs t "
+                "JOIN refs ON refs.rowid = t.pubmed_id "
+                "JOIN records r ON r.pubmed_id = t.pubmed_id "
+                "WHERE t.tx_name = ? AND refs MATCH ? "
+                "ORDER BY t.rank LIMIT ?",
+                (transcript, query, n_items)).fetchall()
+        except sqlite3.OperationalError as error:
+            # A query FTS5 cannot parse: NCBI is asked instead
+            print(f'Local index: {error}')
+            return None
+    else:
+        rows = conn.execute(
+            "SELECT r.record FROM tx_refs t "
+            "JOIN records r ON r.pubmed_id = t.pubmed_id "
+            "WHERE t.tx_name = ? ORDER BY t.rank LIMIT ?",
+            (transcript, n_items))
+    return [json.loads(record) for (record,) in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Harvest literature for the transcripts of a dataset '
+        'into a local full-text index')
+    parser.add_argument('base', help='Dataset name, e.g. Zhang-2021')
+    parser.add_argument('--email', required=True,
+                        help='E-mail address registered on NCBI')
+    parser.add_argument('--n-items', type=int, default=harvest_items,
+                        help='References kept per transcript')
+    parser.add_argument('--refresh', action='store_true',
+                        help='Search again transcripts already indexed')
+    parser.add_argument('--max-age-days', type=float,
+                        help='Refresh entries older than this')
+    args = parser.parse_args()
+    harvest(args.base, args.email, n_items=args.n_items,
+            refresh=args.refresh, max_age_days=args.max_age_days)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Transcripts and peaks found in two datasets, or in two PyDegradome
+settings of one dataset.
+
+The peak tables of the two sides are joined on tx_name (a hash join)
+and the peaks of each pair are compared by their genomic coordinates:
+two peaks are close when the gap between them is at most 'window'
+nucleotides (0: they overlap). Each side's peaks are then counted by
+classification, with those whose transcript has peaks on the other side
+and those with a close peak there.
+
+Results are kept per (sides, window), the last max_results of them.
+Every pair of settings of the first two datasets is computed at startup
+for the default window (see preload), so that the Dataset overlap page
+opens without computing.
+"""
+import itertools
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from . import bibsearch as bib
+from . import warmcache
+
+# Largest gap between two peaks counted as the same site (nucleotides)
+windows = [0, 10, 50, 200]
+default_window = 10
+
+# Columns of a peak in the joined table, those of each side get the
+# suffix _a or _b
+shared_cols = ['tx_name', 'gene_name', 'chr', 'strand']
+side_cols = ['feature_type', 'comparison', 'category_1', 'category_2',
+             'ratioPTx', 'peak_start', 'peak_stop', 'max_peak_test']
+# Columns dropped from the records of the joined table
+hidden_cols = ['row_a', 'row_b', 'peak_start_a', 'peak_stop_a',
+               'peak_start_b', 'peak_stop_b']
+group_cols = ['category_1', 'category_2']
+measures = ['Peaks', 'Shared transcript', 'Close peak']
+
+# Results of this process, by (base_a, settings_a, base_b, settings_b,
+# window), least recently used first
+results = OrderedDict()
+results_lock = threading.Lock()
+max_results = 32
+
+
+def peaks(base, settings):
+    # Peaks of a dataset and setting, with their coordinates
+    entry = warmcache.get(base, settings)
+    columns = shared_cols + [c for c in side_cols
+                             if c not in bib.position_cols]
+    positions = [c for c in side_cols if c in bib.position_cols]
+    return entry['pydeg_df'][columns].join(entry['position_df'][positions])
+
+
+def join(a, b):
+    """
+    Pairs of peaks of the same transcript in the tables 'a' and 'b',
+    with the row of each peak in its table and the gap between them.
+    """
+    a = a.assign(row_a=np.arange(len(a)))
+    b = b[['tx_name'] + side_cols].assign(row_b=np.arange(len(b)))
+    pairs = a.merge(b, on='tx_name', suffixes=('_a', '_b'))
+    gap = np.maximum(pairs['peak_start_b'] - pairs['peak_stop_a'],
+                     pairs['peak_start_a'] - pairs['peak_stop_b'])
+    pairs['gap'] = np.maximum(gap, 0)
+    return pairs
+
+
+def side_counts(df, shared_rows, close_rows):
+    """
+    Peaks of a side by value of each column of group_cols: all of them,
+    those whose transcript is on the other side and those with a close
+    peak there. Records with the column value, measure and count.
+    """
+    flags = pd.DataFrame({
+        'Peaks': 1,
+        'Shared transcript': np.isin(np.arange(len(df)), shared_rows),
+        'Close peak': np.isin(np.arange(len(df)), close_rows),
+    })
+    counts = {}
+    for column in group_cols:
+        grouped = flags.groupby(df[column].to_numpy()).sum()
+        counts[column] = [
+            {column: value, 'measure': measure, 'count': int(count)}
+            for value, row in grouped.iterrows()
+            for measure, count in row.items()]
+    return counts
+
+
+def compute(base_a, settings_a, base_b, settings_b, window):
+    a = peaks(base_a, settings_a)
+    b = peaks(base_b, settings_b)
+    pairs = join(a, b).sort_values(['gap', 'tx_name'], kind='stable')
+    close = pairs['gap'].to_numpy() <= window
+    pairs['close'] = np.where(close, 'Yes', 'No')
+    return {
+        'pairs': pairs.drop(columns=hidden_cols).reset_index(drop=True),
+        'counts': {
+            'a': side_counts(a, pairs['row_a'], pairs['row_a'][close]),
+            'b': side_counts(b, pairs['row_b'], pairs['row_b'][close]),
+        },
+        'totals': {
+            'transcripts_a': int(a['tx_name'].nunique()),
+            'transcripts_b': int(b['tx_name'].nunique()),
+            'shared_transcripts': int(pairs['tx_name'].nunique()),
+            'close_transcripts': int(pairs.loc[close, 'tx_name'].nunique()),
+            'pairs': len(pairs),
+            'close_pairs': int(close.sum()),
+        },
+    }
+
+
+def check(base, settings):
+    if base not in bib.dataset_bases() \
+            or settings not in warmcache.settings_keys(base):
+        raise ValueError(f'Unknown dataset or settings: {base}, {settings}')
+
+
+def get(base_a, settings_a, base_b, settings_b, window=default_window):
+    """
+    Joined peaks ('pairs', a frame sorted by gap), counts by
+    classification of each side ('counts') and totals of two datasets
+    and settings. The returned values are shared between requests and
+    must not be modified. Values from the browser are checked against
+    the datasets, their settings and the windows (ValueError).
+    """
+    check(base_a, settings_a)
+    check(base_b, settings_b)
+    if window not in windows:
+        raise ValueError(f'Unknown window: {window}')
+    key = (base_a, int(settings_a), base_b, int(settings_b), int(window))
+    with results_lock:
+        if key in results:
+            results.move_to_end(key)
+        else:
+            results[key] = compute(*key)
+            if len(results) > max_results:
+                results.popitem(last=False)
+        return results[key]
+
+
+def default_bases():
+    # The two datasets compared when the page opens
+    bases = bib.dataset_bases()
+    return bases[0], bases[1 % len(bases)]
+
+
+def preload():
+    # Every pair of settings of the default datasets, default window
+    base_a, base_b = default_bases()
+    keys = list(itertools.product(warmcache.settings_keys(base_a),
+                                  warmcache.settings_keys(base_b)))
+    for settings_a, settings_b in keys:
+        get(base_a, settings_a, base_b, settings_b)
+    return keys
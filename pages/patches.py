@@ -0,0 +1,106 @@
+"""
+Partial updates (dash.Patch) of the large outputs of the Test cases
+page.
+
+The browser keeps, in a dcc.Store next to the component, a short
+description of what it was last sent: a digest of the parts of a
+figure, or the filters that selected the rows of a table. The callback
+compares the new value with it and sends only what changed: the trace
+attributes and layout keys of a figure, the rows removed from and
+added to a table. The whole value is sent when its shape changed or
+when the patch would not be smaller.
+"""
+import hashlib
+import json
+
+import numpy as np
+import plotly
+from dash import Patch, no_update
+
+# Size of a row deletion in a patch, as a fraction of a row of the
+# peak table (about 50 and 600 bytes of JSON)
+delete_cost = 0.1
+# Each operation copies the list in the browser: above this number of
+# rows removed or added the whole list is sent
+max_row_operations = 1000
+
+
+def encode(value):
+    return json.dumps(value, cls=plotly.utils.PlotlyJSONEncoder)
+
+
+def parts(value, depth, path=()):
+    """
+    Parts of a JSON value by path, going down 'depth' levels of dicts
+    and of lists of dicts (trace lists, component children).
+    """
+    if depth and isinstance(value, dict) and value:
+        items = value.items()
+    elif depth and isinstance(value, list) \
+            and any(isinstance(item, dict) for item in value):
+        items = enumerate(value)
+    else:
+        return {path: value}
+    found = {}
+    for key, item in items:
+        found.update(parts(item, depth - 1, path + (key,)))
+    return found
+
+
+def digest(value, depth):
+    # Hash of each part of 'value' (plain JSON), by JSON encoded path
+    return {json.dumps(path): hashlib.sha1(
+                json.dumps(part, sort_keys=True).encode()).hexdigest()[:12]
+            for path, part in parts(value, depth).items()}
+
+
+def json_update(value, previous, depth=3):
+    """
+    Output for a prop holding 'value' (a figure or a component), with
+    the digest to store: a Patch of the parts that differ from the
+    value described by 'previous', or the whole value when its parts
+    are not the same. The value is converted to JSON once, here, and
+    returned as such so that Dash does not convert it again.
+    """
+    plain = json.loads(encode(value))
+    current = digest(plain, depth)
+    if not previous or previous.keys() != current.keys():
+        return plain, current
+    changed = [key for key, part in current.items() if previous[key] != part]
+    if not changed:
+        return no_update, current
+    patch = Patch()
+    for key in changed:
+        path = json.loads(key)
+        part, target = plain, patch
+        for step in path[:-1]:
+            part, target = part[step], target[step]
+        target[path[-1]] = part[path[-1]]
+    return patch, current
+
+
+def rows_update(records, previous, current):
+    """
+    Output for the data of a DataTable showing the records at positions
+    'current' (sorted), when it shows those at 'previous' (None if
+    unknown): a Patch removing and inserting rows, or the rows.
+    """
+    rows = [records[i] for i in current]
+    if previous is None:
+        return rows
+    previous = np.asarray(previous)
+    removed = np.flatnonzero(~np.isin(previous, current))
+    added = np.flatnonzero(~np.isin(current, previous))
+    if not removed.size and not added.size:
+        return no_update
+    if removed.size + added.size > max_row_operations \
+            or added.size + removed.size * delete_cost >= len(rows):
+        return rows
+    patch = Patch()
+    # Removed from the end first so that the positions stay valid,
+    # then inserted at their final positions in order
+    for i in removed[::-1]:
+        del patch[int(i)]
+    for i in added:
+        patch.insert(int(i), rows[i])
+    return patch
@@ -0,0 +1,247 @@
+"""
+Local, fingerprinted copies of the theme stylesheets and icon fonts.
+
+The app links the Bootstrap themes (dbc.themes) and Font Awesome from
+CDNs. The bundle command downloads every theme offered by the theme
+changer and Font Awesome, inlines their @import rules, copies the fonts
+they use and writes minified files named after a hash of their content
+into assets/:
+
+    python -m pages.staticbundle
+
+When assets/vendor-manifest.json exists the app uses these copies, so
+it starts without network access and does not wait on third-party
+servers. Files with a content hash in their name, and assets requested
+with a version query (?m=, added by Dash, or ?v=, see asset_url), are
+served with immutable cache headers.
+"""
+import functools
+import hashlib
+import json
+import os
+import re
+import urllib.request
+from urllib.parse import urldefrag, urljoin
+
+import dash
+import dash_bootstrap_components as dbc
+import flask
+
+assets_dir = './assets'
+font_dir = 'vendor-fonts'
+manifest_path = f'{assets_dir}/vendor-manifest.json'
+# Dash must not add the bundled stylesheets to every page, the theme
+# changer picks one
+assets_ignore = r'^vendor-.*\.css$'
+
+# Google Fonts (imported by several themes) answers with woff2 fonts
+# only to browsers it knows
+user_agent = ('Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 '
+              '(KHTML, like Gecko) Chrome/120.0 Safari/537.36')
+
+dark_themes = ["CYBORG", "DARKLY", "SLATE", "SOLAR", "SUPERHERO", "VAPOR"]
+
+immutable = 'public, max-age=31536000, immutable'
+# Names written by copy_resource (name.<hash>.woff2) and write_css
+# (vendor-name.<hash>.min.css)
+hashed_name = re.compile(r'\.[0-9a-f]{10}(\.min)?\.[a-z0-9]+$')
+
+import_rule = re.compile(
+    r'@import\s+(?:url\()?\s*["\']?([^"\')\s;]+)["\']?\s*\)?[^;]*;')
+url_value = re.compile(r'url\(\s*(["\']?)([^"\')]+)\1\s*\)')
+
+
+def theme_urls():
+    # Bootstrap themes of dash-bootstrap-components, by name
+    return {name: getattr(dbc.themes, name) for name in dir(dbc.themes)
+            if name.isupper()
+            and str(getattr(dbc.themes, name)).startswith('http')}
+
+
+def fetch(url):
+    request = urllib.request.Request(url, headers={'User-Agent': user_agent})
+    with urllib.request.urlopen(request, timeout=60) as response:
+        return response.read()
+
+
+def content_hash(data):
+    return hashlib.sha1(data).hexdigest()[:10]
+
+
+def minify_css(text):
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.S)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+    return text.replace(';}', '}').strip()
+
+
+def copy_resource(url, copied):
+    # Font or image used by a stylesheet, saved once under its hash
+    if url not in copied:
+        data = fetch(url)
+        stem, ext = os.path.splitext(os.path.basename(url.split('?')[0]))
+        name = f'{stem}.{content_hash(data)}{ext}'
+        os.makedirs(f'{assets_dir}/{font_dir}', exist_ok=True)
+        with open(f'{assets_dir}/{font_dir}/{name}', 'wb') as f:
+            f.write(data)
+        copied[url] = name
+    return copied[url]
+
+
+def bundle_css(url, copied):
+    """
+    Stylesheet at 'url' with its @import rules inlined and its url()
+    references pointing to local copies (paths relative to assets/).
+    """
+    text = fetch(url).decode('utf-8')
+    text = re.sub(r'@charset\s+"[^"]*";', '', text)
+
+    # Imported stylesheets are processed on their own and put back once
+    # the references of this one are rewritten
+    imported = []
+
+    def inline(match):
+        imported.append(bundle_css(urljoin(url, match.group(1)), copied))
+        return f'/*import-{len(imported) - 1}*/'
+
+    text = import_rule.sub(inline, text)
+
+    def localize(match):
+        target = match.group(2)
+        if target.startswith(('data:', '#')):
+            return match.group(0)
+        target, fragment = urldefrag(urljoin(url, target))
+        name = copy_resource(target, copied)
+        suffix = f'#{fragment}' if fragment else ''
+        return f'url({font_dir}/{name}{suffix})'
+
+    text = url_value.sub(localize, text)
+    for i, css in enumerate(imported):
+        text = text.replace(f'/*import-{i}*/', css)
+    return text
+
+
+def write_css(stem, text):
+    data = minify_css(text).encode('utf-8')
+    name = f'vendor-{stem}.{content_hash(data)}.min.css'
+    with open(f'{assets_dir}/{name}', 'wb') as f:
+        f.write(data)
+    return name
+
+
+def build():
+    copied = {}
+    manifest = {'themes': {}, 'icons': {}}
+    for name, url in sorted(theme_urls().items()):
+        manifest['themes'][name] = write_css(name.lower(),
+                                             bundle_css(url, copied))
+        print(f'Bundled theme {name}')
+    manifest['icons']['FONT_AWESOME'] = write_css(
+        'font-awesome', bundle_css(dbc.icons.FONT_AWESOME, copied))
+    print('Bundled Font Awesome')
+
+    # Files of previous bundles
+    current = set(manifest['themes'].values()) \
+        | set(manifest['icons'].values())
+    for name in os.listdir(assets_dir):
+        if re.match(assets_ignore, name) and name not in current:
+            os.remove(f'{assets_dir}/{name}')
+    fonts = set(copied.values())
+    if os.path.isdir(f'{assets_dir}/{font_dir}'):
+        for name in os.listdir(f'{assets_dir}/{font_dir}'):
+            if name not in fonts:
+                os.remove(f'{assets_dir}/{font_dir}/{name}')
+
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+
+def load_manifest():
+    try:
+        with open(manifest_path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+manifest = load_manifest()
+
+
+def stylesheet(url):
+    """
+    Local copy of a theme or icon stylesheet (dbc.themes.*,
+    dbc.icons.FONT_AWESOME) when bundled, else its CDN address.
+    """
+    if manifest:
+        bundled = {**{u: manifest['themes'].get(n)
+                      for n, u in theme_urls().items()},
+                   dbc.icons.FONT_AWESOME: manifest['icons']['FONT_AWESOME']}
+        if bundled.get(url):
+            return f'/assets/{bundled[url]}'
+    return url
+
+
+def theme_value(url):
+    """
+    Value of a theme in the theme changer. Local themes are given by
+    their file name, which the theme changer looks up in assets/.
+    """
+    local = stylesheet(url)
+    return local.rsplit('/', 1)[-1] if local != url else url
+
+
+def local_themes():
+    # Bundled themes for ThemeChangerAIO(custom_themes=...), None if
+    # there is no bundle
+    if not manifest:
+        return None
+    return {name.lower(): theme_value(url)
+            for name, url in theme_urls().items()}
+
+
+def theme_options():
+    # Options of the theme changer, dark themes labelled as such
+    return [{'label': name, 'value': theme_value(url),
+             'label_id': ('theme-switch-label-dark' if name in dark_themes
+                          else 'theme-switch-label')}
+            for name, url in sorted(theme_urls().items())]
+
+
+def template_from_theme(value):
+    # Plotly template of a theme changer value, local or CDN
+    for name, url in theme_urls().items():
+        if value in (url, theme_value(url)):
+            return name.lower()
+    return 'bootstrap'
+
+
+@functools.lru_cache(maxsize=None)
+def asset_url(path):
+    # Address of a file in assets/ with a hash of its content, so that
+    # it can be cached for good
+    with open(f'{assets_dir}/{path}', 'rb') as f:
+        digest = content_hash(f.read())
+    return f'{dash.get_asset_url(path)}?v={digest}'
+
+
+def fingerprint_html(text):
+    # Versioned addresses for the assets referenced by an HTML block
+    return re.sub(r'(src|href)="\./assets/([^"?#]+)"',
+                  lambda m: f'{m.group(1)}="{asset_url(m.group(2))}"', text)
+
+
+def cache_headers(response):
+    request = flask.request
+    if response.status_code == 200 and request.path.startswith('/assets/') \
+            and (hashed_name.search(request.path)
+                 or 'm' in request.args or 'v' in request.args):
+        response.headers['Cache-Control'] = immutable
+    return response
+
+
+def init_app(server):
+    server.after_request(cache_headers)
+
+
+if __name__ == "__main__":
+    build()
@@ -1,15 +1,19 @@
-import re
 import dash
 from dash import dcc, html, Input, Output, callback, \
-    dash_table, no_update, State, MATCH, clientside_callback
+    dash_table, no_update, State, MATCH, ALL, clientside_callback
 import dash_bootstrap_components as dbc
-from dash_bootstrap_templates import ThemeChangerAIO, \
-    template_from_url
+from dash_bootstrap_templates import ThemeChangerAIO
 import dash_dangerously_set_inner_html
 import dash_breakpoints
 import plotly.express as px
 import pandas as pd
 from . import bibsearch as bib
+from . import intervals
+from . import litindex
+from . import patches
+from . import staticbundle
+from . import typeahead
+from . import warmcache
 
 dash.register_page(__name__, name='Test cases')
 
@@ -96,6 +100,469 @@ dataSet_cards = dbc.CardGroup([
         className=bib.dataSetOff),
 ])
 
+
+def section_placeholder(section):
+    """
+    Children of a section built the first time it is shown: an empty
+    body, watched until it scrolls into view, and the number of times
+    the section was shown (see the callbacks of these sections).
+    """
+    return [
+        html.Div(
+            html.Div(id=f'{section}_placeholder',
+                     className='section_placeholder'),
+            id={"type": "section_body", "section": section}),
+        dcc.Store(
+            data=0,
+            id={"type": "section_shown", "section": section}
+        )
+    ]
+
+
+def summary_contents():
+    return [
+        html.Div(
+            bib.get_description('peak_count'),
+            className='description_h3 mt-3 mb-4'
+        ),
+        dbc.Row([
+            dbc.Col([
+                dbc.Label('X-axis variable',
+                          className='description_h4'),
+                dcc.Dropdown(
+                    id='x_axis_value',
+                    value='comparison',
+                    placeholder='Value for x axis',
+                    options=[
+                        {'label': bib.new_columns[x_axis],
+                         'value': x_axis} for x_axis in
+                        bib.selected_cols[1:4]
+                    ], className="dropdownFont"
+                )
+            ], className='four.columns'),
+            dbc.Col([
+                dbc.Label('Group data by',
+                          className='description_h4'),
+                dcc.Dropdown(
+                    id='group_value',
+                    value='category_1',
+                    placeholder='Select a value divide bars',
+                    options=[
+                        {'label': bib.new_columns[group],
+                         'value': group} for group in
+                        bib.selected_cols[4:10]
+                    ], className="dropdownFont"
+                ),
+            ], className='four.columns'),
+            dbc.Col([
+                dbc.Label('Exclude from classification 1',
+                          className='description_h4'),
+                dcc.Dropdown(
+                    id='class1_value',
+                    placeholder='Remove one or more',
+                    multi=True,
+                    persistence=False,
+                    className="dropdownFont"
+                ),
+            ], className='four.columns'),
+            dbc.Col([
+                dbc.Label('Remove comparison',
+                          className='description_h4'),
+                dcc.Dropdown(
+                    id='comparison_value',
+                    className="dropdownFont"
+                ),
+            ], className='four.columns')
+        ], className="mb-3"),
+        html.Div([
+            dcc.Graph(id='peak_count_barplot',
+                      figure=bib.make_empty_fig(),
+                      ),
+            # Parts of the figure in the browser
+            dcc.Store(id='peak_count_barplot_digest'),
+        ]),
+        html.Div(
+            id='factor_description',
+            className='mt-4 description_h3'
+        )
+    ]
+
+
+def candidates_contents():
+    return [
+        html.Div(
+            bib.get_description('peak_list'),
+            className='description_h3',
+            id='peak_list'
+        ),
+        html.Div([
+            html.Div([
+                dcc.Dropdown(
+                    id='tx_search',
+                    placeholder='Search a transcript, gene name or '
+                                'description',
+                    options=[],
+                    className="dropdownFont mb-1"
+                ),
+                html.Div(id='tx_search_feedback',
+                         className='description_h4 mb-2'),
+                html.Div(id="dropdown_pytable",
+                         className="mb-2",
+                         children=bib.pytable_dropdown_default),
+                dbc.Row([
+                    dbc.Col([
+                        dbc.Input(
+                            id='region_input',
+                            type='text',
+                            placeholder='Genomic region, e.g. '
+                                        'Chr3:1,200,000-1,350,000',
+                            debounce=True,
+                            style={"fontSize": "0.750rem"}
+                        ),
+                        dbc.FormFeedback(
+                            'A chromosome of the dataset, optionally '
+                            'with a position or a range',
+                            type='invalid'
+                        )
+                    ]),
+                    dbc.Col([
+                        dbc.RadioItems(
+                            id='region_on',
+                            options=[
+                                {'label': 'Peak', 'value': 'peak'},
+                                {'label': 'Gene region', 'value': 'gene'}
+                            ],
+                            value='peak',
+                            inline=True,
+                            className='dropdownFont'
+                        )
+                    ], width='auto', className='align-self-center')
+                ], className="mb-2"),
+                dbc.Row([
+                    dbc.Col([
+                        html.Div([
+                            html.Span(bib.new_columns[column],
+                                      className='flex-fill'),
+                            html.Span(id={"type": "metric_range_text",
+                                          "metric": column})
+                        ], className='d-flex dropdownFont'),
+                        dcc.Graph(
+                            id={"type": "metric_histogram",
+                                "metric": column},
+                            figure=bib.make_empty_fig(),
+                            config={'staticPlot': True},
+                            style={'height': '3rem'}
+                        ),
+                        dcc.RangeSlider(
+                            id={"type": "metric_range", "metric": column},
+                            min=0,
+                            max=1,
+                            step=0.05,
+                            value=[0, 1],
+                            marks=None,
+                            allowCross=False
+                        )
+                    ]) for column in warmcache.metric_columns
+                ], className="mb-2"),
+                html.Div([
+                    dash_table.DataTable(
+                        id='py_table',
+                        columns=[
+                            {'name': ['', 'Rank'],
+                             'id': 'img_rank'},
+                            {'name': ['Classification', '1'],
+                             'id': 'category_1'},
+                            {'name': ['Classification', '2'],
+                             'id': 'category_2'},
+                            {'name': ['', 'Transcript'],
+                             'id': 'tx_name'},
+                            {'name': ['', 'Repr.?'],
+                             'id': 'rep_gene'},
+                            {'name': ['', 'Feature'],
+                             'id': 'feature_type'},
+                            {'name': ['', 'Gene name'],
+                             'id': 'gene_name'},
+                            {'name': ['Peak(T):', 'Tx Max(C)'],
+                             'id': 'ratioPTx'},
+                            {'name': ['Peaks', '2>'],
+                             'id': 'MorePeaks'},
+                            {'name': ['Also called', 'with settings'],
+                             'id': 'concordance'},
+                            {'name': 'Comparison',
+                             'id': 'comparison'},
+                            {'name': 'Plot link',
+                             'id': 'plot_link'},
+                            {'name': 'Alignment link',
+                             'id': 'miRNA_link'},
+                        ],
+                        style_table={'overflowX': 'auto'},
+                        merge_duplicate_headers=True,
+                        page_size=15,
+                        page_current=0,
+                        row_selectable='multi',
+                        selected_rows=[],
+                        hidden_columns=['comparison',
+                                        'plot_link', 'miRNA_link'],
+                        active_cell=initial_active_cell,
+                        style_cell={
+                            'font-size': '0.575rem',
+                            'font-family': 'sans-serif',
+                            'padding': '0.5em 0.5em',
+                            'backgroundColor': 'var(--bs-light)',
+                            'color': 'var(--bs-dark)'
+                        },
+                        style_header={
+                            'backgroundColor': 'var(--bs-primary)',
+                            'fontWeight': '700'
+                        },
+                        style_data_conditional=([
+                            {'if': {
+                                'filter_query':
+                                '{plot_link} = Yes',
+                                'column_id': 'tx_name'
+                            },
+                             'backgroundColor': 'var(--bs-secondary)',
+                             'fontWeight': 'bold'},
+                            {'if': {
+                                'filter_query':
+                                '{miRNA_link} = Yes',
+                                'column_id': 'tx_name'
+                            },
+                             'color': 'var(--bs-primary)',
+                             'fontWeight': 'bold'}
+                        ]),
+                        css=[{"selector": ".show-hide",
+                              "rule": "display: none"},
+                             {'selector':
+                              '.previous-next-container',
+                              'rule': 'font-size: 0.625rem;'}]
+                    )
+                ]),  # Table
+            ], className='py_table'),
+            html.Div([
+                dcc.Tabs(
+                    id='tab_plots',
+                    value='gene_plot',
+                    children=[
+                        dcc.Tab(
+                            label='Decay Plot [Gene level]',
+                            value='gene_plot',
+                            style=tab_style,
+                            selected_style=tab_selected_style,
+                            className="dropdownFont"),
+                        dcc.Tab(
+                            label='Decay Plot [Peak level]',
+                            value='peak_plot',
+                            style=tab_style,
+                            selected_style=tab_selected_style,
+                            className="dropdownFont"),
+                        dcc.Tab(
+                            label='miRNA alignment',
+                            value='miRNA_tab',
+                            style=tab_style,
+                            selected_style=tab_selected_style,
+                            className="dropdownFont",
+                            children=[
+                                dash_table.DataTable(
+                                    id='miRNA_datatable',
+                                    selected_cells=[])
+                            ]
+                        )
+                    ]
+                ),
+                html.Div(id='tabs-content-decay-plots')
+            ], className='plots'),
+            dcc.Store(
+                id='miRNAplot_df',
+                data=None
+            ),
+            # Dataset, settings and filters of the rows in py_table
+            dcc.Store(
+                id='py_table_view',
+                data=None
+            ),
+        ], className='py_results')
+    ]
+
+
+def refs_contents():
+    return [
+        dbc.Row([
+            dbc.Col([
+                dbc.Label("NCBI valid e-mail",
+                          html_for="ncbi_email",
+                          className='description_h4'),
+                dbc.Input(
+                    type="email",
+                    id="ncbi_email",
+                    placeholder="Enter email",
+                    debounce=True,
+                    persistence=True,
+                    persistence_type='session',
+                    required=True,
+                    style={"fontSize": "0.750rem"}
+                ),
+            ], width=4
+                    ),
+            dbc.Col([
+                dbc.Label("Search term",
+                          html_for="op_term",
+                          className='description_h4'),
+                dbc.Input(
+                    type="text",
+                    id="op_term",
+                    placeholder="Search term",
+                    debounce=True,
+                    persistence=True,
+                    persistence_type='session',
+                    required=False,
+                    style={"fontSize": "0.750rem"}
+                ),
+            ], width=3
+                    ),
+            dbc.Col([
+                dbc.Label("Results",
+                          html_for="n_results",
+                          className='description_h4'),
+                dbc.Input(
+                    type="number",
+                    id="n_results",
+                    min=1,
+                    max=99,
+                    value=5,
+                    debounce=True,
+                    style={"fontSize": "0.750rem"}
+                )
+            ], width=2
+                    ),
+            dbc.Col([
+                dbc.Button(
+                    id='search_biblio',
+                    outline=True,
+                    color="primary",
+                    n_clicks=0,
+                    children='Search',
+                    disabled=False,
+                    className="description_h4 position-absolute bottom-0 start-0",
+                ),
+            ], className="align-self-end position-relative",
+                    width=2
+                    ),
+            dbc.Col(html.Div(id="animate_search"),
+                    className="d-flex align-self-end")
+        ], className="d-flex"),
+
+        # Biblio output
+        html.Div(
+            id='biblio_search_output',
+            children=[
+                dbc.Col([
+                    dbc.Button(
+                        "Search log",
+                        id="btn_biblio_log",
+                        outline=True,
+                        className="w-auto description_h4 mb-3",
+                        color="secondary",
+                        size="sm",
+                        n_clicks=0,
+                    ),
+                    dbc.Collapse(
+                        dbc.Card(
+                            dbc.CardBody(id='biblio_log'),
+                            className='mb-3'
+                        ),
+                        id="biblio_card",
+                        is_open=False,
+                    )
+                ], className="mt-3"),
+                html.Table(
+                    id='biblio_table',
+                    children=[
+                        dash_table.DataTable(
+                            id='biblio_datatable',
+                            columns=[
+                                {'name': 'Author(s)',
+                                 'id': 'Author(s)'},
+                                {'name': 'Title',
+                                 'id': 'Title'},
+                                {'name': 'Year',
+                                 'id': 'Year'},
+                                {'name': 'Journal',
+                                 'id': 'Journal'},
+                                {'name': 'Transcript',
+                                 'id': 'Transcript'},
+                                {'name': 'Mentions',
+                                 'id': 'Mentions'},
+                                {'name': 'Doi',
+                                 'id': 'Doi',
+                                 'presentation': 'markdown'},
+                                {'name': 'Abstract',
+                                 'id': 'Abstract'}],
+                            hidden_columns=['Abstract'],
+                            markdown_options={"html": True},
+                            active_cell=initial_active_cell_bib,
+                            selected_cells=[],
+                            page_current=0,
+                            style_data={
+                                'whiteSpace': 'normal',
+                                'height': 'auto',
+                            },
+                            style_cell={
+                                'font-size': '0.625rem',
+                                'font-family': 'sans-serif',
+                                'padding': '0.5em 1em'
+                            },
+                            style_data_conditional=[
+                                {'if': {
+                                    'filter_query':
+                                    '{Mentions} is nonblank',
+                                    'column_id': 'Mentions'
+                                },
+                                 'color': 'var(--bs-primary)',
+                                 'fontWeight': 'bold'}
+                            ],
+                            css=[{"selector": ".show-hide",
+                                  "rule": "display: none"},
+                                 {'selector':
+                                  '.previous-next-container',
+                                  'rule': 'font-size: 0.625rem;'}],
+                            page_size=5,
+                            row_selectable='multi',
+                            selected_rows=[],
+                                    )  # Datatable
+                    ], className="mt-3"),  # Table
+                dbc.Col([
+                    dbc.Button(
+                        id='btn_save_biblio',
+                        outline=True,
+                        color="primary",
+                        children="Download bibliography",
+                        className="description_h4",
+                        size="sm"
+                    ),
+                    dcc.Download(
+                        id="download_biblio"
+                    )
+                ])
+            ], style={'display': 'none'}),
+        html.Div([
+            html.Div(id='entry_title',
+                     className='bibOutputTitle'),
+            html.Div(id='entry_author',
+                     className='description_h4'),
+            html.Div(id='entry_date',
+                     className='bibOutputDate'),
+            html.Div(id='entry_abstract',
+                     className='bibOutputAbstract')
+        ])
+    ]
+
+
+# Sections built on demand, by the 'section' key of their ids
+section_contents = {'summary': summary_contents,
+                    'candidates': candidates_contents,
+                    'refs': refs_contents}
+
 layout = html.Main([
     html.Div([
         html.Div(id='viewport-container', style={'display': 'none'}),
@@ -118,12 +585,28 @@ layout = html.Main([
         dcc.Store(
             id="ivars"
         ),
+        # Dataset and settings of the derived tables (see warmcache.py)
         dcc.Store(
-            id="pydeg_data"
+            id="pydeg_key"
         ),
+        # Used by several sections, kept outside the ones built on demand
         dcc.Store(
-            id="miRNA_data"
-        )
+            data=[],
+            id='bib_records'
+        ),
+        dcc.Store(
+            data={},
+            id='bib_mentions'
+        ),
+        dcc.Store(
+            data=True,
+            id='active_searching'
+        ),
+        dcc.Store(
+            data=[],
+            id='notes_input'
+        ),
+        notes_btn
     ]),
     html.Section([
         dbc.Alert([
@@ -193,70 +676,7 @@ layout = html.Main([
                 is_open=True,
                 id={"type": "description_html", "section":"summary"},
                 className="mt-4",
-                children=[
-                    html.Div(
-                        bib.get_description('peak_count'),
-                        className='description_h3 mt-3 mb-4'
-                    ),
-                    dbc.Row([
-                        dbc.Col([
-                            dbc.Label('X-axis variable',
-                                      className='description_h4'),
-                            dcc.Dropdown(
-                                id='x_axis_value',
-                                value='comparison',
-                                placeholder='Value for x axis',
-                                options=[
-                                    {'label': bib.new_columns[x_axis],
-                                     'value': x_axis} for x_axis in
-                                    bib.selected_cols[1:4]
-                                ], className="dropdownFont"
-                            )
-                        ], className='four.columns'),
-                        dbc.Col([
-                            dbc.Label('Group data by',
-                                      className='description_h4'),
-                            dcc.Dropdown(
-                                id='group_value',
-                                value='category_1',
-                                placeholder='Select a value divide bars',
-                                options=[
-                                    {'label': bib.new_columns[group],
-                                     'value': group} for group in
-                                    bib.selected_cols[4:10]
-                                ], className="dropdownFont"
-                            ),
-                        ], className='four.columns'),
-                        dbc.Col([
-                            dbc.Label('Exclude from classification 1',
-                                      className='description_h4'),
-                            dcc.Dropdown(
-                                id='class1_value',
-                                placeholder='Remove one or more',
-                                multi=True,
-                                persistence=False,
-                                className="dropdownFont"
-                            ),
-                        ], className='four.columns'),
-                        dbc.Col([
-                            dbc.Label('Remove comparison',
-                                      className='description_h4'),
-                            dcc.Dropdown(
-                                id='comparison_value',
-                                className="dropdownFont"
-                            ),
-                        ], className='four.columns')
-                    ], className="mb-3"),
-                    html.Div([
-                        dcc.Graph(id='peak_count_barplot',
-                                  figure=bib.make_empty_fig(),
-                                  ),
-                    ]),
-                    html.Div(
-                        id='factor_description',
-                        className='mt-4 description_h3'
-                    )
-                ])
+                children=section_placeholder('summary'))
         ], color='secondary')
     ]),
 
@@ -275,129 +695,7 @@ layout = html.Main([
                 is_open=True,
                 id={"type": "description_html", "section": "candidates"},
                 className="mt-4",
-                children=[
-                    html.Div(
-                        bib.get_description('peak_list'),
-                        className='description_h3',
-                        id='peak_list'
-                    ),
-                    html.Div([
-                        html.Div([
-                            html.Div(id="dropdown_pytable",
-                                     className="mb-2",
-                                     children=bib.pytable_dropdown_default),
-                            html.Div([
-                                dash_table.DataTable(
-                                    id='py_table',
-                                    columns=[
-                                        {'name': ['', 'Rank'],
-                                         'id': 'img_rank'},
-                                        {'name': ['Classification', '1'],
-                                         'id': 'category_1'},
-                                        {'name': ['Classification', '2'],
-                                         'id': 'category_2'},
-                                        {'name': ['', 'Transcript'],
-                                         'id': 'tx_name'},
-                                        {'name': ['', 'Repr.?'],
-                                         'id': 'rep_gene'},
-                                        {'name': ['', 'Feature'],
-                                         'id': 'feature_type'},
-                                        {'name': ['', 'Gene name'],
-                                         'id': 'gene_name'},
-                                        {'name': ['Peak(T):', 'Tx Max(C)'],
-                                         'id': 'ratioPTx'},
-                                        {'name': ['Peaks', '2>'],
-                                         'id': 'MorePeaks'},
-                                        {'name': 'Comparison',
-                                         'id': 'comparison'},
-                                        {'name': 'Plot link',
-                                         'id': 'plot_link'},
-                                        {'name': 'Alignment link',
-                                         'id': 'miRNA_link'},
-                                    ],
-                                    style_table={'overflowX': 'auto'},
-                                    merge_duplicate_headers=True,
-                                    page_size=15,
-                                    page_current=0,
-                                    row_selectable='multi',
-                                    selected_rows=[],
-                                    hidden_columns=['comparison',
-                                                    'plot_link', 'miRNA_link'],
-                                    active_cell=initial_active_cell,
-                                    style_cell={
-                                        'font-size': '0.575rem',
-                                        'font-family': 'sans-serif',
-                                        'padding': '0.5em 0.5em',
-                                        'backgroundColor': 'var(--bs-light)',
-                                        'color': 'var(--bs-dark)'
-                                    },
-                                    style_header={
-                                        'backgroundColor': 'var(--bs-primary)',
-                                        'fontWeight': '700'
-                                    },
-                                    style_data_conditional=([
-                                        {'if': {
-                                            'filter_query':
-                                            '{plot_link} = Yes',
-                                            'column_id': 'tx_name'
-                                        },
-                                         'backgroundColor': 'var(--bs-secondary)',
-                                         'fontWeight': 'bold'},
-                                        {'if': {
-                                            'filter_query':
-                                            '{miRNA_link} = Yes',
-                                            'column_id': 'tx_name'
-                                        },
-                                         'color': 'var(--bs-primary)',
-                                         'fontWeight': 'bold'}
-                                    ]),
-                                    css=[{"selector": ".show-hide",
-                                          "rule": "display: none"},
-                                         {'selector':
-                                          '.previous-next-container',
-                                          'rule': 'font-size: 0.625rem;'}]
-                                )
-                            ]),  # Table
-                        ], className='py_table'),
-                        html.Div([
-                            dcc.Tabs(
-                                id='tab_plots',
-                                value='gene_plot',
-                                children=[
-                                    dcc.Tab(
-                                        label='Decay Plot [Gene level]',
-                                        value='gene_plot',
-                                        style=tab_style,
-                                        selected_style=tab_selected_style,
-                                        className="dropdownFont"),
-                                    dcc.Tab(
-                                        label='Decay Plot [Peak level]',
-                                        value='peak_plot',
-                                        style=tab_style,
-                                        selected_style=tab_selected_style,
-                                        className="dropdownFont"),
-                                    dcc.Tab(
-                                        label='miRNA alignment',
-                                        value='miRNA_tab',
-                                        style=tab_style,
-                                        selected_style=tab_selected_style,
-                                        className="dropdownFont",
-                                        children=[
-                                            dash_table.DataTable(
-                                                id='miRNA_datatable',
-                                                selected_cells=[])
-                                        ]
-                                    )
-                                ]
-                            ),
-                            html.Div(id='tabs-content-decay-plots')
-                        ], className='plots'),
-                        dcc.Store(
-                            id='miRNAplot_df',
-                            data=None
-                        ),
-                    ], className='py_results')
-                ]),
+                children=section_placeholder('candidates'))
         ], color='secondary')
     ]),  # Section
     # # [S] Related literature
@@ -415,177 +713,7 @@ layout = html.Main([
                 is_open=True,
                 id={"type": "description_html", "section": "refs"},
                 className="mt-4",
-                children=[
-                    notes_btn,
-                    dbc.Row([
-                        dbc.Col([
-                            dbc.Label("NCBI valid e-mail",
-                                      html_for="ncbi_email",
-                                      className='description_h4'),
-                            dbc.Input(
-                                type="email",
-                                id="ncbi_email",
-                                placeholder="Enter email",
-                                debounce=True,
-                                persistence=True,
-                                persistence_type='session',
-                                required=True,
-                                style={"fontSize": "0.750rem"}
-                            ),
-                        ], width=4
-                                ),
-                        dbc.Col([
-                            dbc.Label("Search term",
-                                      html_for="op_term",
-                                      className='description_h4'),
-                            dbc.Input(
-                                type="text",
-                                id="op_term",
-                                placeholder="Search term",
-                                debounce=True,
-                                persistence=True,
-                                persistence_type='session',
-                                required=False,
-                                style={"fontSize": "0.750rem"}
-                            ),
-                        ], width=3
-                                ),
-                        dbc.Col([
-                            dbc.Label("Results",
-                                      html_for="n_results",
-                                      className='description_h4'),
-                            dbc.Input(
-                                type="number",
-                                id="n_results",
-                                min=1,
-                                max=99,
-                                value=5,
-                                debounce=True,
-                                style={"fontSize": "0.750rem"}
-                            )
-                        ], width=2
-                                ),
-                        dbc.Col([
-                            dbc.Button(
-                                id='search_biblio',
-                                outline=True,
-                                color="primary",
-                                n_clicks=0,
-                                children='Search',
-                                disabled=False,
-                                className="description_h4 position-absolute bottom-0 start-0",
-                            ),
-                        ], className="align-self-end position-relative",
-                                width=2
-                                ),
-                        dbc.Col(html.Div(id="animate_search"),
-                                className="d-flex align-self-end")
-                    ], className="d-flex"),
-
-                    # Biblio output
-                    html.Div(
-                        id='biblio_search_output',
-                        children=[
-                            dbc.Col([
-                                dbc.Button(
-                                    "Search log",
-                                    id="btn_biblio_log",
-                                    outline=True,
-                                    className="w-auto description_h4 mb-3",
-                                    color="secondary",
-                                    size="sm",
-                                    n_clicks=0,
-                                ),
-                                dbc.Collapse(
-                                    dbc.Card(
-                                        dbc.CardBody(id='biblio_log'),
-                                        className='mb-3'
-                                    ),
-                                    id="biblio_card",
-                                    is_open=False,
-                                )
-                            ], className="mt-3"),
-                            html.Table(
-                                id='biblio_table',
-                                children=[
-                                    dash_table.DataTable(
-                                        id='biblio_datatable',
-                                        columns=[
-                                            {'name': 'Author(s)',
-                                             'id': 'Author(s)'},
-                                            {'name': 'Title',
-                                             'id': 'Title'},
-                                            {'name': 'Year',
-                                             'id': 'Year'},
-                                            {'name': 'Journal',
-                                             'id': 'Journal'},
-                                            {'name': 'Transcript',
-                                             'id': 'Transcript'},
-                                            {'name': 'Doi',
-                                             'id': 'Doi',
-                                             'presentation': 'markdown'},
-                                            {'name': 'Abstract',
-                                             'id': 'Abstract'}],
-                                        hidden_columns=['Abstract'],
-                                        markdown_options={"html": True},
-                                        active_cell=initial_active_cell_bib,
-                                        selected_cells=[],
-                                        page_current=0,
-                                        style_data={
-                                            'whiteSpace': 'normal',
-                                            'height': 'auto',
-                                        },
-                                        style_cell={
-                                            'font-size': '0.625rem',
-                                            'font-family': 'sans-serif',
-                                            'padding': '0.5em 1em'
-                                        },
-                                        css=[{"selector": ".show-hide",
-                                              "rule": "display: none"},
-                                             {'selector':
-                                              '.previous-next-container',
-                                              'rule': 'font-size: 0.625rem;'}],
-                                        page_size=5,
-                                        row_selectable='multi',
-                                        selected_rows=[],
-                                                )  # Datatable
-                                ], className="mt-3"),  # Table
-                            dbc.Col([
-                                dbc.Button(
-                                    id='btn_save_biblio',
-                                    outline=True,
-                                    color="primary",
-                                    children="Download bibliography",
-                                    className="description_h4",
-                                    size="sm"
-                                ),
-                                dcc.Download(
-                                    id="download_biblio"
-                                )
-                            ])
-                        ], style={'display': 'none'}),
-                    dcc.Store(
-                        data=[],
-                        id='bib_records'
-                    ),
-                    dcc.Store(
-                        data=True,
-                        id='active_searching'
-                    ),
-                    dcc.Store(
-                        data=[],
-                        id='notes_input'
-                    ),
-                    html.Div([
-                        html.Div(id='entry_title',
-                                 className='bibOutputTitle'),
-                        html.Div(id='entry_author',
-                                 className='description_h4'),
-                        html.Div(id='entry_date',
-                                 className='bibOutputDate'),
-                        html.Div(id='entry_abstract',
-                                 className='bibOutputAbstract')
-                    ])]),
+                children=section_placeholder('refs'))
         ], color='secondary')
     ]),  # Section
     # References
@@ -646,6 +774,56 @@ def toggle_collapse_references(n, is_open):
 # END callback for header display
 
 
+# START Callbacks for the sections built on demand
+# Counts the times a section is shown: set to 1 when its empty body
+# first scrolls into view, increased when the section is opened again
+clientside_callback(
+    """(is_open, shown, id) => {
+    const no_update = window.dash_clientside.no_update;
+    if (!is_open) {
+        return no_update;
+    }
+    if (shown) {
+        return shown + 1;
+    }
+    const element = document.getElementById(id.section + '_placeholder');
+    if (!element) {
+        return 1;
+    }
+    if (element.dataset.watched) {
+        return no_update;
+    }
+    element.dataset.watched = 'true';
+    const observer = new IntersectionObserver((entries) => {
+        if (entries.some((entry) => entry.isIntersecting)) {
+            observer.disconnect();
+            window.dash_clientside.set_props(id, {data: 1});
+        }
+    }, {rootMargin: '200px'});
+    observer.observe(element);
+    return no_update;
+    }""",
+    Output({"type": "section_shown", "section": MATCH}, "data"),
+    Input({"type": "description_html", "section": MATCH}, "is_open"),
+    State({"type": "section_shown", "section": MATCH}, "data"),
+    State({"type": "section_shown", "section": MATCH}, "id"),
+)
+
+
+@callback(
+    Output({"type": "section_body", "section": MATCH}, "children"),
+    Input({"type": "section_shown", "section": MATCH}, "data"),
+    prevent_initial_call=True
+)
+def build_section(shown):
+    # Components of a section, the first time it is shown. Their
+    # callbacks only run from then on
+    if shown != 1:
+        return no_update
+    return section_contents[dash.ctx.triggered_id['section']]()
+# END callbacks for the sections built on demand
+
+
 @callback(
     [Output("zhang_btn", "children"),
      Output("zhang_btn", "color"),
@@ -700,18 +878,17 @@ def set_variables(name):
 
 
 @callback(
-    [Output("pydeg_data", "data"),
-     Output("miRNA_data", "data")],
+    Output("pydeg_key", "data"),
     [Input("dataSet_name", "data"),
      Input("ivars", "data"),
      Input("pydeg_settings_item", "value")]
 )
 def import_data(name, ivars, pysettings):
-    data_dict = bib.import_data(name, ivars, pysettings)
-    pydeg_data = data_dict["pydeg_df"]
-    miRNA_data = data_dict["miRNA_df"]
-
-    return pydeg_data.to_dict('records'), miRNA_data.to_dict('records')
+    # Tables derived once per dataset and setting (see warmcache.py);
+    # the other callbacks read them with this key
+    key = {'base': ivars['ibase'], 'settings': int(pysettings)}
+    warmcache.get(**key)
+    return key
 
 
 @callback(
@@ -719,15 +896,13 @@ def import_data(name, ivars, pysettings):
      Output("comparison_value", "options")],
     [Input('x_axis_value', 'value'),
      Input('group_value', 'value'),
-     Input("pydeg_data", "data"),
+     Input("pydeg_key", "data"),
      Input('ivars', 'data')]
 )
-def dropdown_barplot(x1, x2, pydeg_data, ivars):
-    pydeg_df = pd.DataFrame.from_records(pydeg_data)
-    comparisons = [x for x in
-                   sorted(pydeg_df.comparison.unique())]
-    class1_values = [x for x in
-                     sorted(pydeg_df.category_1.unique())]
+def dropdown_barplot(x1, x2, pydeg_key, ivars):
+    catalogs = warmcache.get(**pydeg_key)['catalogs']
+    comparisons = catalogs['comparison']
+    class1_values = catalogs['category_1']
     if x1 == 'comparison':
         options_2 = [{'label': icomp,
                       'value': icomp,
@@ -748,39 +923,41 @@ def dropdown_barplot(x1, x2, pydeg_data, ivars):
 
 
 @callback(
-    Output('peak_count_barplot', 'figure'),
-    [Input('pydeg_data', 'data'),
+    [Output('peak_count_barplot', 'figure'),
+     Output('peak_count_barplot_digest', 'data')],
+    [Input('pydeg_key', 'data'),
      Input('ivars', 'data'),
      Input('x_axis_value', 'value'),
      Input('group_value', 'value'),
      Input("class1_value", "value"),
      Input("comparison_value", "value"),
      Input(ThemeChangerAIO.ids.radio("theme"), "value"),
-     Input('viewport-container', 'children')
-     ]
+     Input('viewport-container', 'children'),
+     Input({"type": "section_shown", "section": "summary"}, "data")
+     ],
+    [State({"type": "description_html", "section": "summary"}, "is_open"),
+     State('peak_count_barplot_digest', 'data')]
 )
-def peak_count_barplot(pydeg_data, ivars,
-                       x1, x2, x3, x4, theme, viewport):
+def peak_count_barplot(pydeg_key, ivars,
+                       x1, x2, x3, x4, theme, viewport,
+                       shown, is_open, digest):
+    if not is_open:
+        # Drawn when the section is opened again
+        return no_update, no_update
     wd = int(viewport)
-    pydeg_df = pd.DataFrame.from_records(pydeg_data)
-    if x3:
-        pydeg_df_filtered = pydeg_df[(~pydeg_df['category_1'].isin(x3)) &
-                                     (pydeg_df['comparison'] != x4)]
-    else:
-        pydeg_df_filtered = pydeg_df[pydeg_df['comparison'] != x4]
+    df_counts = warmcache.peak_counts(warmcache.get(**pydeg_key), x1, x2,
+                                      x3, x4)
 
     if x2:
-        counts = pydeg_df_filtered.groupby([x1, x2]).size()
-        df_counts = counts.reset_index().rename(
-            columns={'level_0': x1, 'level_1': x2, 0: 'Peak number'}
-        )
         if df_counts.columns[1] == 'category_1':
-            df_counts.loc[:, 'category_1'] = df_counts['category_1'].\
+            # Whole column replaced: the labels are strings, the
+            # categories integers
+            df_counts['category_1'] = df_counts['category_1'].\
                 astype(str).replace(ivars['cat1_dict'])
             df_counts = df_counts.sort_values(by='category_1',
                                               ascending=True)
         elif df_counts.columns[1] == 'category_2':
-            df_counts.loc[:, 'category_2'] = df_counts['category_2'].\
+            df_counts['category_2'] = df_counts['category_2'].\
                     replace(ivars['cat2_dict'])
 
         df_counts = df_counts.rename(columns=bib.new_columns)
@@ -788,17 +965,13 @@ def peak_count_barplot(pydeg_data, ivars,
         x2_plot = bib.new_columns[x2]
         fig = px.bar(df_counts, x=x1_plot, y='Peak number',
                      color=x2_plot, barmode='group',
-                     template=template_from_url(theme),
+                     template=staticbundle.template_from_theme(theme),
                      )
     else:
-        counts = pydeg_df_filtered.groupby([x1]).size()
-        df_counts = counts.reset_index().rename(
-            columns={'level_0': x1, 0: 'Peak number'}
-        )
         df_counts = df_counts.rename(columns=bib.new_columns)
         x1_plot = bib.new_columns[x1]
         fig = px.bar(df_counts, x=x1_plot, y='Peak number',
-                     template=template_from_url(theme),
+                     template=staticbundle.template_from_theme(theme),
                      )
 
     axis_title = bib.calcFontSize(wd)
@@ -827,7 +1000,8 @@ def peak_count_barplot(pydeg_data, ivars,
         tickfont=dict(size=y_tick)
     )
 
-    return fig
+    # Only the traces and layout keys that changed (see patches.py)
+    return patches.json_update(fig, digest)
 
 
 @callback(
@@ -870,50 +1044,52 @@ def display_group_info(group1, group2):
 
 @callback(
     Output("dropdown_pytable", "children"),
-    [Input('pydeg_data', 'data'),
+    [Input('pydeg_key', 'data'),
      Input("pydeg_settings_item", "value")]
 )
-def dropdown_pytable(pydeg_data, pysettings):
-    pydeg_df = pd.DataFrame.from_records(pydeg_data)
+def dropdown_pytable(pydeg_key, pysettings):
+    catalogs = warmcache.get(**pydeg_key)['catalogs']
     dropdown_row = dbc.Row([
         dbc.Col([
             dcc.Dropdown(
                 id="class1_drop",
                 placeholder='Classification 1',
-                options=[x for x in
-                         sorted(pydeg_df.category_1.unique())],
+                options=catalogs['category_1'],
                 className="dropdownFont"
             )], className='five.columns'),
         dbc.Col([
             dcc.Dropdown(
                 id="class2_drop",
                 placeholder='Classification 2',
-                options=[x for x in
-                         sorted(pydeg_df.category_2.unique())],
+                options=catalogs['category_2'],
                 className="dropdownFont"
             )], className='five.columns'),
         dbc.Col([
             dcc.Dropdown(
                 id="feat_drop",
                 placeholder='Feature',
-                options=[x for x in
-                         sorted(pydeg_df.feature_type.unique())],
+                options=catalogs['feature_type'],
                 className="dropdownFont"
             )], className='five.columns'),
         dbc.Col([
             dcc.Dropdown(
                 id="plot_drop",
                 placeholder='Has peak plot',
-                options=[x for x in
-                         sorted(pydeg_df.plot_link.unique())],
+                options=catalogs['plot_link'],
                 className="dropdownFont"
             )], className='five.columns'),
         dbc.Col([
             dcc.Dropdown(
                 id="mirna_drop",
                 placeholder='Has miRNA alignment',
-                options=[x for x in
-                         sorted(pydeg_df.miRNA_link.unique())],
+                options=catalogs['miRNA_link'],
+                className="dropdownFont"
+            )], className='five.columns'),
+        dbc.Col([
+            dcc.Dropdown(
+                id="lit_drop",
+                placeholder='Mentioned in literature',
+                options=['No', 'Yes'],
                 className="dropdownFont"
             )], className='five.columns')
     ])
@@ -922,30 +1098,151 @@ def dropdown_pytable(pydeg_data, pysettings):
 
 
 @callback(
-    Output('py_table', 'data'),
-    [Input('pydeg_data', 'data'),
+    [Output('py_table', 'data'),
+     Output('py_table_view', 'data'),
+     Output('region_input', 'invalid')],
+    [Input('pydeg_key', 'data'),
      Input("class1_drop", 'value'),
      Input("class2_drop", 'value'),
      Input("feat_drop", 'value'),
      Input("plot_drop", 'value'),
-     Input("mirna_drop", 'value')],
+     Input("mirna_drop", 'value'),
+     Input("lit_drop", 'value'),
+     Input('region_input', 'value'),
+     Input('region_on', 'value'),
+     Input({"type": "metric_range", "metric": ALL}, 'value'),
+     Input({"type": "section_shown", "section": "candidates"}, "data")],
+    [State({"type": "description_html", "section": "candidates"},
+           "is_open"),
+     State('bib_mentions', 'data'),
+     State('py_table_view', 'data')],
     prevent_initial_call=True
 )
-def update_dropdown_options(pydeg_data, class_1,
-                            class_2, feat, plot, mirna):
-    pydeg_df = pd.DataFrame.from_records(pydeg_data)
-    if class_1:
-        pydeg_df = pydeg_df[pydeg_df.category_1 == class_1]
-    if class_2:
-        pydeg_df = pydeg_df[pydeg_df.category_2 == class_2]
-    if feat:
-        pydeg_df = pydeg_df[pydeg_df.feature_type == feat]
-    if plot:
-        pydeg_df = pydeg_df[pydeg_df.plot_link == plot]
-    if mirna:
-        pydeg_df = pydeg_df[pydeg_df.miRNA_link == mirna]
-
-    return pydeg_df.to_dict('records')
+def update_dropdown_options(pydeg_key, class_1,
+                            class_2, feat, plot, mirna, literature,
+                            region_text, region_on, metric_values,
+                            shown, is_open, mentions, view):
+    if not is_open:
+        # Filled when the section is opened again
+        return no_update, no_update, no_update
+    entry = warmcache.get(**pydeg_key)
+    region = None
+    if region_text and region_text.strip():
+        # Peaks overlapping a region, from the index of the entry
+        region = intervals.parse_region(region_text,
+                                        entry['catalogs']['chr'])
+        if region is None:
+            return no_update, no_update, True
+        region['on'] = region_on
+    # Peaks found by the last literature search, if it was made on the
+    # same dataset and settings (ids are rows of its entry)
+    mentioned = None
+    if literature:
+        mentioned = mentions['peaks'] \
+            if mentions and mentions['key'] == pydeg_key else []
+    # Rows shown by the table, kept to send only the rows that change
+    # next time (see patches.py)
+    current = {'key': pydeg_key,
+               'filters': {'category_1': class_1, 'category_2': class_2,
+                           'feature_type': feat, 'plot_link': plot,
+                           'miRNA_link': mirna},
+               'literature': literature,
+               'mentioned': mentioned,
+               'region': region,
+               'ranges': metric_ranges(entry, metric_values)}
+    previous = table_view_rows(view) \
+        if view and view['key'] == pydeg_key else None
+    return patches.rows_update(entry['pydeg_records'], previous,
+                               table_view_rows(current)), current, False
+
+
+def table_view_rows(view):
+    return warmcache.table_rows(warmcache.get(**view['key']),
+                                view['filters'], view['literature'],
+                                view['mentioned'], view.get('region'),
+                                view.get('ranges'))
+
+
+def metric_ranges(entry, metric_values):
+    """
+    Bounds of the metrics selected with the sliders (log10 values, in
+    the order of warmcache.metric_columns); a slider at its end leaves
+    that side open (None).
+    """
+    ranges = {}
+    for column, value in zip(warmcache.metric_columns, metric_values or []):
+        index = entry['metrics'][column]
+        if not value:
+            continue
+        low = None if value[0] <= index['low'] else 10**value[0]
+        high = None if value[1] >= index['high'] else 10**value[1]
+        if low is not None or high is not None:
+            ranges[column] = [low, high]
+    return ranges
+
+
+def metric_label(value):
+    return f'{value / 1000:.3g}k' if value >= 1000 else f'{value:.3g}'
+
+
+@callback(
+    [Output({"type": "metric_range", "metric": ALL}, 'min'),
+     Output({"type": "metric_range", "metric": ALL}, 'max'),
+     Output({"type": "metric_range", "metric": ALL}, 'marks'),
+     Output({"type": "metric_range", "metric": ALL}, 'value')],
+    Input('pydeg_key', 'data')
+)
+def metric_sliders(pydeg_key):
+    # Sliders over the whole range of each metric, powers of ten marked.
+    # Only those in the page (none before the candidates section is
+    # built), in their order
+    entry = warmcache.get(**pydeg_key)
+    indexes = [entry['metrics'][output['id']['metric']]
+               for output in dash.ctx.outputs_list[0]]
+    return ([index['low'] for index in indexes],
+            [index['high'] for index in indexes],
+            [{power: metric_label(10**power)
+              for power in range(index['low'], index['high'] + 1)}
+             for index in indexes],
+            [[index['low'], index['high']] for index in indexes])
+
+
+@callback(
+    [Output({"type": "metric_histogram", "metric": MATCH}, 'figure'),
+     Output({"type": "metric_range_text", "metric": MATCH}, 'children')],
+    [Input({"type": "metric_range", "metric": MATCH}, 'value'),
+     Input(ThemeChangerAIO.ids.radio("theme"), "value")],
+    State('pydeg_key', 'data')
+)
+def metric_histogram(value, theme, pydeg_key):
+    """
+    Histogram of a metric above its slider (log10 bins), the bins out
+    of the selected range faded.
+    """
+    column = dash.ctx.outputs_list[0]['id']['metric']
+    index = warmcache.get(**pydeg_key)['metrics'][column]
+    edges = index['edges']
+    centers = [(a + b) / 2 for a, b in zip(edges[:-1], edges[1:])]
+    low, high = value or [index['low'], index['high']]
+    fig = px.bar(x=centers, y=index['counts'],
+                 template=staticbundle.template_from_theme(theme))
+    fig.update_traces(
+        width=1 / warmcache.bins_per_decade,
+        marker_opacity=[1 if low <= center <= high else 0.25
+                        for center in centers])
+    fig.update_layout(margin=dict(l=0, r=0, t=0, b=0),
+                      paper_bgcolor='rgba(0,0,0,0)',
+                      plot_bgcolor='rgba(0,0,0,0)',
+                      xaxis=dict(visible=False,
+                                 range=[index['low'], index['high']]),
+                      yaxis=dict(visible=False))
+    text = f'{metric_label(10**low)} - {metric_label(10**high)}'
+    if low <= index['low']:
+        text = f'< {metric_label(10**high)}' \
+            if high < index['high'] else 'All'
+    elif high >= index['high']:
+        text = f'> {metric_label(10**low)}'
+    return fig, text
 
 
 @callback(
@@ -963,43 +1260,101 @@ def dataSet_description(ivars):
 
 
 @callback(
-     Output('py_table', 'active_cell'),
-     [Input('py_table', 'page_current'),
-      Input('py_table', 'page_size')],
-     prevent_initial_call=True
- )
-def reset_active_cell(page, size):
+    Output('tx_search', 'options'),
+    Input('tx_search', 'search_value'),
+    [State('pydeg_key', 'data'),
+     State('tx_search', 'value'),
+     State('tx_search', 'options')],
+    prevent_initial_call=True
+)
+def tx_suggestions(query, pydeg_key, selected, options):
+    """
+    Transcripts matching the text typed in the search box, from the
+    typeahead index of the dataset and settings (see typeahead.py).
+    """
+    if not query or not pydeg_key:
+        return no_update
+    found = typeahead.search(warmcache.get(**pydeg_key)['search'], query)
+    suggestions = []
+    for record in found:
+        label = ' - '.join(filter(None, [record['tx_name'],
+                                         record['gene_name'],
+                                         record['Description']]))
+        if len(label) > 90:
+            label = label[:89] + '…'
+        # The dropdown filters the options again with the typed text,
+        # which is not always in the (shortened) label
+        suggestions.append({'label': label, 'value': record['tx_name'],
+                            'search': query})
+    # The selected transcript stays an option so that it is still shown
+    suggestions += [option for option in options or []
+                    if option['value'] == selected
+                    and selected not in [r['tx_name'] for r in found]]
+    return suggestions
+
+
+@callback(
+    [Output('py_table', 'active_cell'),
+     Output('py_table', 'page_current'),
+     Output('tx_search_feedback', 'children')],
+    [Input('py_table', 'page_current'),
+     Input('py_table', 'page_size'),
+     Input('tx_search', 'value')],
+    [State('py_table_view', 'data')],
+    prevent_initial_call=True
+)
+def reset_active_cell(page, size, transcript, view):
+    """
+    First row of a new page, or the first peak of the transcript picked
+    in the search box, whose page is then shown. row_id is the row of
+    the peak table read by the plots.
+    """
+    rows = table_view_rows(view) if view else None
+    if dash.ctx.triggered_id == 'tx_search':
+        if not transcript or rows is None:
+            return no_update, no_update, ''
+        position = warmcache.transcript_position(
+            warmcache.get(**view['key']), rows, transcript)
+        if position is None:
+            return no_update, no_update, \
+                f'{transcript} is hidden by the filters of the table'
+        page = position // size
+        active_cell = {'row': position % size, 'column': 3,
+                       'row_id': int(rows[position])}
+        return active_cell, page, ''
     row_id = page*size
+    if rows is not None and row_id < len(rows):
+        row_id = int(rows[row_id])
     active_cell = {'row': 0, 'column': 3, 'row_id': row_id}
-    return active_cell
+    return active_cell, no_update, no_update
 
 
 @callback(
     [Output('tabs-content-decay-plots', 'children'),
      Output('miRNAplot_df', 'data')],
     [Input('py_table', 'active_cell'),
-     Input('pydeg_data', 'data'),
-     Input('miRNA_data', 'data'),
-     Input('tab_plots', 'value')],
+     Input('pydeg_key', 'data'),
+     Input('tab_plots', 'value'),
+     Input({"type": "section_shown", "section": "candidates"}, "data")],
+    [State({"type": "description_html", "section": "candidates"},
+           "is_open")],
 )
-def render_tab_content(active_cell, pydeg_data, miRNA_data, tab):
-    if active_cell is None:
-        return no_update
-
-    pydeg_df = pd.DataFrame.from_records(pydeg_data)
-    row = active_cell['row_id']
-    transcript = pydeg_df.at[row, 'tx_name']
-    comparison = pydeg_df.at[row, 'comparison']
-    cat1 = str(pydeg_df.at[row, 'category_1'])
-    cat2 = str(pydeg_df.at[row, 'category_2'])
+def render_tab_content(active_cell, pydeg_key, tab, shown, is_open):
+    if active_cell is None or not is_open:
+        return no_update, no_update
+
+    record, mirna_records = warmcache.row_context(
+        warmcache.get(**pydeg_key), active_cell['row_id'])
+    transcript = record['tx_name']
+    comparison = record['comparison']
+    cat1 = str(record['category_1'])
+    cat2 = str(record['category_2'])
     category = cat1 + "-" + cat2
     header = f'Decay plot for {transcript} ({category}) \
 from comparison {comparison}'
 
-    df = pd.DataFrame.from_records(miRNA_data)
-    dff = df.loc[df['Transcript'] == transcript]
     if tab == 'gene_plot':
-        gene_plot_link = pydeg_df.at[row, 'gene_plot_link']
+        gene_plot_link = record['gene_plot_link']
         if isinstance(gene_plot_link, str):
             decay_plot = html.Div([
                 html.Div(id='miRNA_plot'),
@@ -1014,7 +1369,7 @@ from comparison {comparison}'
                 f'No plot was produced for transcript {transcript}',
                 className='no_output_w')
     elif tab == 'peak_plot':
-        peak_plot_link = pydeg_df.at[row, 'peak_plot_link']
+        peak_plot_link = record['peak_plot_link']
         if isinstance(peak_plot_link, str):
             decay_plot = html.Div([
                 html.Div(id='miRNA_plot'),
@@ -1029,9 +1384,9 @@ from comparison {comparison}'
                 f'No plot was produced for transcript {transcript}',
                 className='no_output_w')
     elif tab == 'miRNA_tab':
-        page_size = len(dff)
+        page_size = len(mirna_records)
         if page_size > 0:
-            row_id = dff.loc[dff.index[0], 'id']
+            row_id = mirna_records[0]['id']
             decay_plot = html.Div([
                 dash_table.DataTable(
                     id="miRNA_datatable",
@@ -1047,7 +1402,7 @@ from comparison {comparison}'
                         {'name': ['', 'Comparison'],
                          'id': 'Comparison'},
                     ],
-                    data=dff.to_dict("records"),
+                    data=mirna_records,
                     merge_duplicate_headers=True,
                     style_cell={
                         'font-size': '0.575rem',
@@ -1073,7 +1428,7 @@ the peak of transcript {transcript}',
                        className='no_output_w')
             )
 
-    return decay_plot, dff.to_dict('records')
+    return decay_plot, mirna_records
 
 
 @callback(
@@ -1103,7 +1458,8 @@ def update_miRNA_plot(active_cell, miRNA_data):
     miRNA_df = pd.DataFrame.from_records(miRNA_data)
     mirmap_link = miRNA_df.loc[active_cell['row'], 'mirmap_link']
     globalAln_link = miRNA_df.loc[active_cell['row'], 'global_link']
-    miRNA_alignment_plot = bib.draw_miRNAplot(mirmap_link, globalAln_link)
+    # The plot of another row is shown: only its label and image change
+    miRNA_alignment_plot = bib.patch_miRNAplot(mirmap_link, globalAln_link)
 
     return miRNA_alignment_plot
 
@@ -1123,6 +1479,7 @@ def animate_search(clicks):
 @callback(
     [Output('biblio_datatable', 'data'),
      Output('bib_records', 'data'),
+     Output('bib_mentions', 'data'),
      Output('biblio_search_output', 'style'),
      Output('biblio_log', 'children'),
      Output('animate_search', 'children')],
@@ -1131,37 +1488,51 @@ def animate_search(clicks):
      State('py_table', 'data'),
      State('op_term', 'value'),
      State('ncbi_email', 'value'),
-     State('n_results', 'value')],
+     State('n_results', 'value'),
+     State('dataSet_name', 'data'),
+     State('pydeg_key', 'data')],
     prevent_initial_call=True
 )
 def result_biblio(search_biblio, selected_tx, pydeg_data,
-                  op_term, email, n_results):
+                  op_term, email, n_results, name, pydeg_key):
     if search_biblio > 0:
         loaded_df = pd.DataFrame.from_records(pydeg_data)
         itx_list = loaded_df.loc[selected_tx, 'tx_name']
-        bib.setEmail(email)
+        identity = bib.entrezIdentity(email)
+        bib.resetFlightStats()
+        lit_index = litindex.open_index(name)
 
         entries_list = []
         biblio_list = []
         entries_found = 0
         not_found = []
+        local_found = 0
+        # References found on NCBI are summaries, without abstracts
+        ncbi_found = 0
         for transcript in itx_list:
             print('------------------------')
             print(f'Working on {transcript}')
-            transcript_2 = re.sub(r'\.[0-9]$', '', transcript)
-
-            if op_term:
-                search_term = f"{transcript} OR {transcript_2} AND {op_term}"
+            entries = None
+            if lit_index:
+                entries = litindex.search_local(lit_index, transcript,
+                                                op_term, n_results)
+            if entries is not None:
+                print("Found in local index")
+                local_found += 1
             else:
-                search_term = f"{transcript} OR {transcript_2}"
-
-            print("Searching")
-            ref_ids = bib.esearch('pmc', search_term, n_items=n_results)
-            if ref_ids:
-                ref_ids_pubmed = bib.getPubmedId(ref_ids)
-
-                print("Parsing records")
-                entries = bib.getRefRecords('pubmed', ref_ids_pubmed)
+                search_term = bib.searchTerm(transcript, op_term)
+                print("Searching")
+                ref_ids = bib.esearch('pmc', search_term, n_items=n_results,
+                                      identity=identity)
+                if ref_ids:
+                    ref_ids_pubmed = bib.getPubmedId(ref_ids, identity)
+
+                    print("Fetching summaries")
+                    entries = bib.getSummaries('pubmed', ref_ids_pubmed,
+                                               identity)
+                    ncbi_found += len(entries)
+
+            if entries:
                 entries_list.append(entries)
                 n_entries = len(entries)
                 entries_found += n_entries
@@ -1170,27 +1541,58 @@ def result_biblio(search_biblio, selected_tx, pydeg_data,
                 print("Finished")
             else:
                 not_found.append(transcript)
+        if lit_index:
+            lit_index.close()
 
         entries_combined = [item for sublist in
                             entries_list for item in sublist]
         biblio_df_combined = pd.concat(biblio_list, axis=0)
+
+        # Transcripts and genes of the peak table mentioned by each article
+        mention_index = bib.mentionIndex(
+            warmcache.get(**pydeg_key)['pydeg_df'])
+        mentions = [bib.findMentions(entrie, mention_index)
+                    for entrie in entries_combined]
+        biblio_df_combined['Mentions'] = [', '.join(imentions)
+                                          for imentions in mentions]
+        mentioned_peaks = sorted({peak for imentions in mentions
+                                  for key in imentions
+                                  for peak in mention_index[key]})
         display_status = {'display': 'block'}
         # Log results
+        log_items = [html.P(f"Entries found: {entries_found}",
+                            className="text-success")]
+        if lit_index:
+            log_items.append(
+                html.P(f"Transcripts answered from the local index: \
+{local_found} of {len(itx_list)}", className="text-info"))
+        flight_stats = bib.flightStats()
+        if flight_stats['calls']:
+            log_items.append(
+                html.P(f"NCBI queries shared with identical searches in \
+progress: {flight_stats['shared']} of {flight_stats['calls']} \
+({flight_stats['total_shared']} of {flight_stats['total_calls']} since \
+start)", className="text-info"))
+        if mentioned_peaks:
+            if not ncbi_found:
+                searched = "titles or abstracts"
+            elif ncbi_found == entries_found:
+                searched = "titles"
+            else:
+                searched = "titles or abstracts (titles only for the \
+references found on NCBI)"
+            log_items.append(
+                html.P(f"Peaks mentioned in {searched}: \
+{len(mentioned_peaks)}", className="text-info"))
         if not_found:
             txs = ', '.join(not_found)
-            biblio_log = html.Div([
-                html.P(f"Entries found: {entries_found}",
-                       className="text-success"),
+            log_items.append(
                 html.P(f"No results for the following transcripts: \
-    {txs}", className="text-warning")
-            ], className='description_h4')
-        else:
-            biblio_log = html.Div([
-                html.P(f"Entries found: {entries_found}",
-                       className="text-success")
-            ], className='description_h4')
-        return biblio_df_combined.to_dict('records'), \
-            entries_combined, display_status, biblio_log, None
+    {txs}", className="text-warning"))
+        biblio_log = html.Div(log_items, className='description_h4')
+        return biblio_df_combined.to_dict('records'), entries_combined, \
+            {'key': pydeg_key, 'peaks': mentioned_peaks}, display_status, \
+            biblio_log, None
 
 
 @callback(
@@ -1203,12 +1605,22 @@ def result_biblio(search_biblio, selected_tx, pydeg_data,
      Input('biblio_datatable', 'page_current'),
      Input('biblio_datatable', 'page_size')
      ],
+    [State('ncbi_email', 'value')],
     prevent_initial_call=True
 )
-def cell_clicked_bib(active_cell, entries, page_current, page_size):
+def cell_clicked_bib(active_cell, entries, page_current, page_size, email):
     if active_cell:
         biblio_df = entries
         row = active_cell['row'] + (page_current*page_size)
+        if "abstract" not in biblio_df[row]:
+            # Search results only hold summaries, fetch the abstract
+            # (and the full author names)
+            full_record = bib.getFullRecord(biblio_df[row]['pubmed_id'],
+                                            bib.entrezIdentity(email))
+            biblio_df[row] = dict(biblio_df[row], **{
+                key: full_record[key]
+                for key in ("abstract", "keywords", "authors")
+                if key in full_record})
         key_list = ["title", "authors", "journal", "publication_date",
                     "doi", "abstract", "keywords"]
         ititle = bib.printBibSection(biblio_df[row], key_list[0:1], "\n")
@@ -1234,12 +1646,14 @@ def save_notes(n_clicks, value):
     Output("download_biblio", "data"),
     [Input("btn_save_biblio", "n_clicks")],
     [State('biblio_datatable', 'selected_rows'),
-     State('bib_records', 'data')],
+     State('bib_records', 'data'),
+     State('ncbi_email', 'value')],
     prevent_initial_call=True
 )
-def save_refs(n_clicks, selected_refs, bib_records):
+def save_refs(n_clicks, selected_refs, bib_records, email):
     pubmed_ids = [bib_records[i]['pubmed_id'] for i in selected_refs]
-    biblio_data = bib.fetchRefs('pubmed', pubmed_ids)
+    biblio_data = bib.fetchRefs('pubmed', pubmed_ids,
+                                bib.entrezIdentity(email))
     return dict(content=biblio_data, filename="References.medline")
 
 
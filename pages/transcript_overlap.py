@@ -0,0 +1,278 @@
+import math
+
+import dash
+from dash import dcc, html, Input, Output, callback, dash_table
+import dash_bootstrap_components as dbc
+from dash_bootstrap_templates import ThemeChangerAIO
+import plotly.express as px
+import pandas as pd
+from . import bibsearch as bib
+from . import overlap
+from . import staticbundle
+from . import warmcache
+
+dash.register_page(__name__, name='Dataset overlap')
+
+default_a, default_b = overlap.default_bases()
+
+
+def settings_options(base):
+    labels = bib.import_vars(base)['pydeg_settings']
+    return [{'label': labels[str(key)], 'value': key}
+            for key in warmcache.settings_keys(base)]
+
+
+def side_controls(side, base):
+    return dbc.Col([
+        dbc.Label(f'Dataset {side.upper()}',
+                  className='description_h4'),
+        dcc.Dropdown(
+            id=f'overlap_base_{side}',
+            value=base,
+            options=bib.dataset_bases(),
+            clearable=False,
+            className="dropdownFont mb-2"
+        ),
+        dbc.RadioItems(
+            id=f'overlap_settings_{side}',
+            options=settings_options(base),
+            value=0,
+            className='pysettings_items'
+        )
+    ])
+
+
+def side_columns(side):
+    # Columns of the joined table for one side
+    return [
+        {'name': [f'Dataset {side.upper()}', 'Comparison'],
+         'id': f'comparison_{side}'},
+        {'name': [f'Dataset {side.upper()}', 'Class. 1'],
+         'id': f'category_1_{side}'},
+        {'name': [f'Dataset {side.upper()}', 'Class. 2'],
+         'id': f'category_2_{side}'},
+        {'name': [f'Dataset {side.upper()}', 'Feature'],
+         'id': f'feature_type_{side}'},
+        {'name': [f'Dataset {side.upper()}', 'Max peak coor.'],
+         'id': f'max_peak_test_{side}'},
+        {'name': [f'Dataset {side.upper()}', 'Peak(T):Tx Max(C)'],
+         'id': f'ratioPTx_{side}'},
+    ]
+
+
+layout = html.Main([
+    html.Section([
+        dbc.Alert([
+            html.H2('Transcripts found in two datasets',
+                    className=bib.summary_cls),
+            html.Div(
+                'Peaks of the candidate tables of two datasets (or two '
+                'PyDegradome settings of one dataset) are paired by '
+                'transcript. Two peaks are counted as the same site when '
+                'the gap between them is at most the selected number of '
+                'nucleotides.',
+                className='description_h3 mb-4'
+            ),
+            dbc.Row([
+                side_controls('a', default_a),
+                side_controls('b', default_b),
+                dbc.Col([
+                    dbc.Label('Largest gap between peaks (nt)',
+                              className='description_h4'),
+                    dcc.Dropdown(
+                        id='overlap_window',
+                        value=overlap.default_window,
+                        options=overlap.windows,
+                        clearable=False,
+                        className="dropdownFont mb-2"
+                    ),
+                    dbc.Label('Group data by',
+                              className='description_h4'),
+                    dcc.Dropdown(
+                        id='overlap_group',
+                        value='category_1',
+                        options=[{'label': bib.new_columns[column],
+                                  'value': column}
+                                 for column in overlap.group_cols],
+                        clearable=False,
+                        className="dropdownFont"
+                    )
+                ])
+            ], className="mb-3")
+        ], color='primary')
+    ]),
+    html.Section([
+        dbc.Alert([
+            html.H2('Overlap by classification',
+                    className=bib.summary_cls),
+            html.Div(id='overlap_totals',
+                     className='description_h3 mb-3'),
+            dcc.Graph(id='overlap_barplot',
+                      figure=bib.make_empty_fig())
+        ], color='secondary')
+    ]),
+    html.Section([
+        dbc.Alert([
+            html.H2('Peaks of the shared transcripts',
+                    className=bib.summary_cls),
+            dbc.Checklist(
+                id='overlap_close_only',
+                options=[{'label': 'Only close peaks', 'value': 'close'}],
+                value=['close'],
+                switch=True,
+                className='description_h4 mb-2'
+            ),
+            dash_table.DataTable(
+                id='overlap_table',
+                columns=[
+                    {'name': ['', 'Transcript'], 'id': 'tx_name'},
+                    {'name': ['', 'Gene name'], 'id': 'gene_name'},
+                    {'name': ['', 'Chr'], 'id': 'chr'},
+                    {'name': ['', 'Strand'], 'id': 'strand'},
+                ] + side_columns('a') + side_columns('b') + [
+                    {'name': ['', 'Gap (nt)'], 'id': 'gap'},
+                ],
+                style_table={'overflowX': 'auto'},
+                merge_duplicate_headers=True,
+                page_size=15,
+                page_current=0,
+                page_action='custom',
+                sort_action='custom',
+                sort_mode='single',
+                sort_by=[],
+                style_cell={
+                    'font-size': '0.575rem',
+                    'font-family': 'sans-serif',
+                    'padding': '0.5em 0.5em',
+                    'backgroundColor': 'var(--bs-light)',
+                    'color': 'var(--bs-dark)'
+                },
+                style_header={
+                    'backgroundColor': 'var(--bs-primary)',
+                    'fontWeight': '700'
+                },
+                style_data_conditional=[
+                    {'if': {'filter_query': '{close} = Yes',
+                            'column_id': 'tx_name'},
+                     'color': 'var(--bs-primary)',
+                     'fontWeight': 'bold'}
+                ],
+                css=[{'selector': '.previous-next-container',
+                      'rule': 'font-size: 0.625rem;'}]
+            )
+        ], color='secondary')
+    ])
+])
+
+
+# ------------------------------
+# [F] Call back functions
+@callback(
+    Output('overlap_settings_a', 'options'),
+    Input('overlap_base_a', 'value')
+)
+def settings_a(base):
+    return settings_options(base)
+
+
+@callback(
+    Output('overlap_settings_b', 'options'),
+    Input('overlap_base_b', 'value')
+)
+def settings_b(base):
+    return settings_options(base)
+
+
+def side_label(base, settings):
+    labels = bib.import_vars(base)['pydeg_settings']
+    return f'{base} ({labels[str(settings)]})'
+
+
+@callback(
+    [Output('overlap_barplot', 'figure'),
+     Output('overlap_totals', 'children')],
+    [Input('overlap_base_a', 'value'),
+     Input('overlap_settings_a', 'value'),
+     Input('overlap_base_b', 'value'),
+     Input('overlap_settings_b', 'value'),
+     Input('overlap_window', 'value'),
+     Input('overlap_group', 'value'),
+     Input(ThemeChangerAIO.ids.radio("theme"), "value")]
+)
+def overlap_barplot(base_a, settings_a, base_b, settings_b, window,
+                    group, theme):
+    """
+    Peaks of each side by classification: all of them, those of a
+    transcript found on the other side and those with a close peak
+    there.
+    """
+    result = overlap.get(base_a, settings_a, base_b, settings_b, window)
+    labels = bib.import_vars(base_a)['cat1_dict' if group == 'category_1'
+                                     else 'cat2_dict']
+    sides = {'a': side_label(base_a, settings_a),
+             'b': side_label(base_b, settings_b)}
+    df_counts = pd.concat([
+        pd.DataFrame.from_records(result['counts'][side][group])
+        .assign(dataset=label)
+        for side, label in sides.items()])
+    df_counts[group] = df_counts[group].astype(str).replace(labels)
+    df_counts = df_counts.rename(columns={
+        group: bib.new_columns[group], 'measure': 'Peaks counted',
+        'count': 'Peak number', 'dataset': 'Dataset'})
+    fig = px.bar(df_counts, x=bib.new_columns[group], y='Peak number',
+                 color='Peaks counted', barmode='group',
+                 facet_col='Dataset',
+                 category_orders={'Peaks counted': overlap.measures},
+                 template=staticbundle.template_from_theme(theme))
+    fig.for_each_annotation(
+        lambda a: a.update(text=a.text.split('=')[-1]))
+    fig.update_layout(
+        legend=dict(orientation="h", yanchor="bottom", y=-0.4,
+                    xanchor="right", x=1))
+
+    totals = result['totals']
+    summary = (
+        f"{totals['shared_transcripts']} transcripts have peaks in both "
+        f"({totals['transcripts_a']} in {sides['a']}, "
+        f"{totals['transcripts_b']} in {sides['b']}); "
+        f"{totals['close_transcripts']} of them have peaks at most "
+        f"{window} nt apart ({totals['close_pairs']} of "
+        f"{totals['pairs']} pairs of peaks).")
+    return fig, summary
+
+
+@callback(
+    [Output('overlap_table', 'data'),
+     Output('overlap_table', 'page_count'),
+     Output('overlap_table', 'page_current')],
+    [Input('overlap_base_a', 'value'),
+     Input('overlap_settings_a', 'value'),
+     Input('overlap_base_b', 'value'),
+     Input('overlap_settings_b', 'value'),
+     Input('overlap_window', 'value'),
+     Input('overlap_close_only', 'value'),
+     Input('overlap_table', 'page_current'),
+     Input('overlap_table', 'page_size'),
+     Input('overlap_table', 'sort_by')]
+)
+def overlap_table(base_a, settings_a, base_b, settings_b, window,
+                  close_only, page, size, sort_by):
+    """
+    One page of the pairs of peaks, sorted and sliced here: the pairs
+    of two settings can be thousands of rows. Other selections go back
+    to the first page.
+    """
+    pairs = overlap.get(base_a, settings_a, base_b, settings_b,
+                        window)['pairs']
+    if close_only:
+        pairs = pairs[pairs['close'] == 'Yes']
+    if sort_by:
+        pairs = pairs.sort_values(
+            sort_by[0]['column_id'],
+            ascending=sort_by[0]['direction'] == 'asc', kind='stable')
+    page_count = max(1, math.ceil(len(pairs) / size))
+    if dash.ctx.triggered_id != 'overlap_table':
+        page = 0
+    page = min(page or 0, page_count - 1)
+    rows = pairs.iloc[page * size:(page + 1) * size]
+    return rows.to_dict('records'), page_count, page
@@ -0,0 +1,111 @@
+"""
+Typeahead suggestions for the transcripts of the peak table.
+
+Transcripts are searched by name (tx_name), gene name and description.
+The index of a dataset and setting keeps:
+
+- the sorted names (transcript and gene) and description words, so
+  that the ones starting with the query are found by binary search;
+- the transcripts holding each trigram of their text, so that a query
+  matched inside a word or across words is only checked against the
+  transcripts holding all of its trigrams.
+
+Names are suggested first, then description words, then other
+matches; within each group transcripts keep the order of the peak
+table (best classified first). Indexes are built with the warm cache
+entries (see warmcache.get).
+"""
+import bisect
+import re
+from functools import reduce
+
+import numpy as np
+
+max_suggestions = 10
+description_word = re.compile(r'[a-z0-9]+')
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def sorted_keys(pairs):
+    # (key, transcript) pairs sorted by key then transcript, as two lists
+    pairs = sorted(pairs)
+    return [key for key, _ in pairs], [doc for _, doc in pairs]
+
+
+def build(pydeg_df):
+    """
+    Index of the transcripts of a peak table, each one pointing to its
+    first row.
+    """
+    first = pydeg_df.drop_duplicates('tx_name')
+    fields = first[['tx_name', 'gene_name', 'Description']].fillna('')
+    records = fields.to_dict('records')
+    texts = [' '.join(record.values()).lower() for record in records]
+    names, words, postings = [], [], {}
+    for doc, record in enumerate(records):
+        for name in {record['tx_name'].lower(),
+                     record['gene_name'].lower()} - {''}:
+            names.append((name, doc))
+        for word in set(description_word.findall(
+                record['Description'].lower())):
+            words.append((word, doc))
+        for gram in trigrams(texts[doc]):
+            postings.setdefault(gram, []).append(doc)
+    return {
+        'records': records,
+        'rows': first.index.to_numpy(),
+        'texts': texts,
+        'names': sorted_keys(names),
+        'words': sorted_keys(words),
+        'postings': {gram: np.array(docs)
+                     for gram, docs in postings.items()},
+    }
+
+
+def prefixed(keys, query):
+    # Transcripts with a key starting with 'query', by binary search
+    keys, docs = keys
+    first = bisect.bisect_left(keys, query)
+    last = bisect.bisect_left(keys, query + '\uffff', first)
+    return sorted(set(docs[first:last]))
+
+
+def matches(index, query):
+    # Groups of matching transcripts, best first
+    yield prefixed(index['names'], query)
+    yield prefixed(index['words'], query)
+    if len(query) >= 3:
+        yield contained(index, query)
+
+
+def search(index, query, limit=max_suggestions):
+    """
+    Up to 'limit' transcripts matching 'query', as their records (with
+    the row of the peak table holding their first peak).
+    """
+    query = ' '.join(query.lower().split())
+    if not query:
+        return []
+    # Ordered set: a transcript keeps the place of its best match
+    found = {}
+    for group in matches(index, query):
+        found.update(dict.fromkeys(group))
+        if len(found) >= limit:
+            break
+    return [{**index['records'][doc], 'row': int(index['rows'][doc])}
+            for doc in list(found)[:limit]]
+
+
+def contained(index, query):
+    # Transcripts whose text contains 'query': those holding all its
+    # trigrams (rarest first), checked one by one
+    postings = [index['postings'].get(gram) for gram in trigrams(query)]
+    if any(docs is None for docs in postings):
+        return []
+    postings.sort(key=len)
+    candidates = reduce(np.intersect1d, postings)
+    return [doc for doc in candidates.tolist()
+            if query in index['texts'][doc]]
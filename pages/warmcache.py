@@ -0,0 +1,371 @@
+"""
+Warm cache of the tables derived from each dataset and PyDegradome
+setting.
+
+For every dataset in data/ and every key of ivars['pydeg_settings'],
+the derivations of bibsearch.import_data (filtered tables with renamed
+comparisons, peak coordinates, the other settings calling each peak)
+are stored with their records, the dropdown catalogs, the barplot
+counts and the miRNA rows of each transcript. Region indexes of the
+peaks and gene regions, the typeahead index of the transcripts and
+the sorted values of the peak metrics are built when an entry is
+loaded. This is the
+one derived state of the Test cases page: its callbacks read slices of
+an entry, the browser only holds the (dataset, settings) key. Build
+the cache (again after changing the data files, stale entries are
+ignored) with:
+
+    python -m pages.warmcache
+
+The files go to data/warm/v<cache_version>; change cache_version when
+the derivations change so that older caches are not read.
+
+The frames are written as uncompressed Arrow files and memory mapped
+when read: their columns (numbers, and strings, which pandas keeps in
+Arrow arrays) are views on the page cache, shared by the worker
+processes. The records, catalogs and indexes of an entry are Python
+objects held by each worker; bench_arrow_memory.py measures both.
+"""
+import json
+import math
+import os
+import threading
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from . import arrowdata
+from . import bibsearch as bib
+from . import intervals
+from . import typeahead
+
+cache_version = 5
+cache_dir = f'./data/warm/v{cache_version}'
+
+# Columns with a dropdown of their values, in the summary barplot or
+# above the peak table, and the chromosomes of the region search
+catalog_columns = ['comparison', 'category_1', 'category_2',
+                   'feature_type', 'plot_link', 'miRNA_link', 'chr']
+
+# Peak metrics filtered by range above the peak table, and the number
+# of histogram bins per power of ten (their sliders use log10 values)
+metric_columns = ['ratioPTx', 'max_peak_scaled', 'max_read_tx_scaled']
+bins_per_decade = 10
+
+# A peak called with other settings: an overlapping peak on the same
+# chromosome and strand, for the same comparison
+concordance_group = ['chr', 'strand', 'comparison']
+
+# Tables of an entry, stored as Arrow files
+frame_names = ('pydeg_df', 'miRNA_df', 'position_df')
+
+# Derived entries of this process, by (base, settings)
+entries = {}
+entries_lock = threading.Lock()
+
+
+def entry_dir(base, settings):
+    return f'{cache_dir}/{base}_{settings}'
+
+
+def source_files(base):
+    return [f'./data/{base}_local_vars.json'] + \
+        [arrowdata.tsv_path(name, base) for name in arrowdata.table_files]
+
+
+def fingerprint(base):
+    # Size and modification time of the files a dataset is built from
+    return {path: [os.path.getsize(path), os.path.getmtime(path)]
+            for path in source_files(base)}
+
+
+def barplot_groups():
+    # (x axis, grouping) pairs offered by the summary barplot
+    x_values = bib.selected_cols[1:4]
+    groups = [None] + bib.selected_cols[4:10]
+    return [(x1, x2) for x1 in x_values for x2 in groups if x2 != x1]
+
+
+def barplot_counts(pydeg_df):
+    # Peak counts for every (x axis, grouping) pair, as records
+    counts = {}
+    for x1, x2 in barplot_groups():
+        keys = [x1, x2] if x2 else [x1]
+        df_counts = pydeg_df.groupby(keys).size().reset_index(
+            name='Peak number')
+        counts[f'{x1}|{x2 or ""}'] = df_counts.to_dict('records')
+    return counts
+
+
+def concordance(base, settings):
+    """
+    For each peak of a setting (in the order of import_data), the
+    labels of the other settings calling an overlapping peak, or
+    'None'.
+    """
+    labels = bib.import_vars(base)['pydeg_settings']
+    columns = concordance_group + bib.position_cols[:2] + ['pydeg_settings']
+    table = arrowdata.to_frame(bib.load_dataset(base)['pydeg_df'],
+                               columns=columns)
+    peaks = table[table['pydeg_settings'].eq(settings)]
+    called = []
+    for other in settings_keys(base):
+        if other == settings:
+            continue
+        others = table[table['pydeg_settings'].eq(other)]
+        codes, other_codes = intervals.shared_codes(peaks, others,
+                                                    concordance_group)
+        found = intervals.overlaps_any(
+            codes, peaks['peak_start'].to_numpy(),
+            peaks['peak_stop'].to_numpy(), other_codes,
+            others['peak_start'].to_numpy(), others['peak_stop'].to_numpy())
+        called.append(np.where(found, labels[str(other)], ''))
+    if not called:
+        return ['None'] * len(peaks)
+    return ['; '.join(filter(None, row)) or 'None' for row in zip(*called)]
+
+
+def derive(base, settings):
+    """
+    Tables and derived values for one dataset and setting, computed
+    from the dataset files.
+    """
+    ivars = bib.import_vars(base)
+    data = bib.import_data(base, ivars, settings)
+    pydeg_df = data['pydeg_df'].reset_index(drop=True)
+    pydeg_df['concordance'] = concordance(base, settings)
+    miRNA_df = data['miRNA_df'].reset_index(drop=True)
+    position_df = data['position_df'].reset_index(drop=True)
+    mirna_rows = {transcript: rows.tolist() for transcript, rows in
+                  miRNA_df.groupby('Transcript').indices.items()}
+    return {
+        'pydeg_df': pydeg_df,
+        'miRNA_df': miRNA_df,
+        'position_df': position_df,
+        'pydeg_records': pydeg_df.to_dict('records'),
+        'miRNA_records': miRNA_df.to_dict('records'),
+        'catalogs': {column: sorted(pydeg_df[column].dropna().unique()
+                                    .tolist())
+                     for column in catalog_columns},
+        'counts': barplot_counts(pydeg_df),
+        'mirna_rows': mirna_rows,
+    }
+
+
+def write(base, settings, entry):
+    path = entry_dir(base, settings)
+    os.makedirs(path, exist_ok=True)
+    for name in frame_names:
+        table = pa.Table.from_pandas(entry[name], preserve_index=False)
+        feather.write_feather(table, f'{path}/{name}.arrow',
+                              compression='uncompressed')
+    with open(f'{path}/records.json', 'w') as f:
+        json.dump({name: entry[name] for name in
+                   ('pydeg_records', 'miRNA_records')}, f)
+    # Written last: an entry without it is incomplete
+    with open(f'{path}/derived.json', 'w') as f:
+        json.dump({'version': cache_version,
+                   'sources': fingerprint(base),
+                   'catalogs': entry['catalogs'],
+                   'counts': entry['counts'],
+                   'mirna_rows': entry['mirna_rows']}, f)
+
+
+def read_frame(path):
+    # Frame whose columns are views on the memory mapped file (no copy)
+    table = feather.read_table(path, memory_map=True)
+    return table.to_pandas(split_blocks=True, self_destruct=False)
+
+
+def read(base, settings):
+    # Entry from the cache directory, None if missing or stale
+    path = entry_dir(base, settings)
+    try:
+        with open(f'{path}/derived.json') as f:
+            derived = json.load(f)
+    except FileNotFoundError:
+        return None
+    if derived['version'] != cache_version \
+            or derived['sources'] != fingerprint(base):
+        return None
+    with open(f'{path}/records.json') as f:
+        records = json.load(f)
+    entry = {name: read_frame(f'{path}/{name}.arrow')
+             for name in frame_names}
+    entry.update(records)
+    entry.update({key: derived[key]
+                  for key in ('catalogs', 'counts', 'mirna_rows')})
+    return entry
+
+
+def get(base, settings):
+    """
+    Derived tables of a dataset and setting: from memory, else from
+    the cache directory, else computed. The returned values are shared
+    between requests and must not be modified; read them directly or
+    with table_rows, peak_counts and row_context.
+    """
+    key = (base, int(settings))
+    with entries_lock:
+        if key not in entries:
+            entry = read(*key)
+            if entry is None:
+                entry = derive(*key)
+            entry['regions'] = region_indexes(entry)
+            entry['search'] = typeahead.build(entry['pydeg_df'])
+            entry['metrics'] = metric_indexes(entry['pydeg_df'])
+            entries[key] = entry
+    return entries[key]
+
+
+def region_indexes(entry):
+    # Region indexes of the peaks and of their gene regions, by name
+    # ('peak', 'gene') as in the region search of the peak table
+    chroms = entry['pydeg_df']['chr'].to_numpy()
+    positions = entry['position_df']
+    return {
+        'peak': intervals.build_index(chroms, positions['peak_start'],
+                                      positions['peak_stop']),
+        'gene': intervals.build_index(chroms,
+                                      positions['gene_region_start'],
+                                      positions['gene_region_end']),
+    }
+
+
+def metric_indexes(pydeg_df):
+    """
+    For each column of metric_columns: the rows sorted by value
+    (argsort) with the sorted values, the range of the slider (log10,
+    whole powers of ten) and the histogram of the values on it. Values
+    below the slider's minimum (zeros) are counted in its first bin.
+    """
+    metrics = {}
+    for column in metric_columns:
+        values = pydeg_df[column].to_numpy(dtype=float)
+        order = np.argsort(values, kind='stable')
+        positive = values[values > 0]
+        low = math.floor(np.log10(positive.min())) if positive.size else 0
+        high = max(math.ceil(np.log10(values.max())), low + 1) \
+            if positive.size else 1
+        edges = np.linspace(low, high, (high - low) * bins_per_decade + 1)
+        counts, _ = np.histogram(
+            np.log10(np.clip(values, 10.0**low, None)), bins=edges)
+        metrics[column] = {'order': order, 'values': values[order],
+                           'low': low, 'high': high,
+                           'edges': edges.tolist(),
+                           'counts': counts.tolist()}
+    return metrics
+
+
+def metric_rows(entry, column, low=None, high=None):
+    # Rows (sorted) whose value of a metric is within [low, high], None
+    # for an open bound: two binary searches in the sorted values
+    index = entry['metrics'][column]
+    first = 0 if low is None else \
+        np.searchsorted(index['values'], low, side='left')
+    last = len(index['values']) if high is None else \
+        np.searchsorted(index['values'], high, side='right')
+    return np.sort(index['order'][first:last])
+
+
+def table_rows(entry, filters, literature=None, mentioned=None,
+               region=None, ranges=None):
+    """
+    Positions of the peak table rows whose columns equal the values of
+    'filters' (column: value, None for any), when 'literature' is 'Yes'
+    or 'No' whose id is or is not in 'mentioned', when 'region' is
+    given ('chr', 'start', 'stop' and 'on': 'peak' or 'gene') whose
+    peak or gene region overlaps it and whose metrics are within
+    'ranges' (column: [low, high], None for an open bound).
+    """
+    pydeg_df = entry['pydeg_df']
+    rows = np.arange(len(pydeg_df))
+    # Rows found with the indexes (region, metric ranges); only those
+    # are checked against the other filters
+    selected = []
+    if region:
+        selected.append(intervals.query(entry['regions'][region['on']],
+                                        region['chr'], region['start'],
+                                        region['stop']))
+    for column, (low, high) in (ranges or {}).items():
+        if low is not None or high is not None:
+            selected.append(metric_rows(entry, column, low, high))
+    if selected:
+        selected.sort(key=len)
+        rows = reduce(lambda a, b: np.intersect1d(a, b, assume_unique=True),
+                      selected)
+        pydeg_df = pydeg_df.take(rows)
+    keep = np.ones(len(pydeg_df), dtype=bool)
+    for column, value in filters.items():
+        if value:
+            keep &= (pydeg_df[column] == value).to_numpy()
+    if literature:
+        is_mentioned = pydeg_df['id'].isin(mentioned or []).to_numpy()
+        keep &= is_mentioned if literature == 'Yes' else ~is_mentioned
+    return rows[keep]
+
+
+def transcript_position(entry, rows, transcript):
+    # Position, among the table rows 'rows', of the first peak of a
+    # transcript. None if none of them is on it
+    found = np.flatnonzero(
+        entry['pydeg_df']['tx_name'].to_numpy()[rows] == transcript)
+    return int(found[0]) if found.size else None
+
+
+def peak_counts(entry, x1, x2=None, exclude_cat1=None,
+                exclude_comparison=None):
+    """
+    Peak counts by x1 (and x2) as a new DataFrame, from the stored
+    counts unless some peaks are excluded.
+    """
+    keys = [x1, x2] if x2 else [x1]
+    stored = entry['counts'].get(f'{x1}|{x2 or ""}')
+    if stored is not None and not exclude_cat1 \
+            and exclude_comparison is None:
+        return pd.DataFrame.from_records(stored,
+                                         columns=keys + ['Peak number'])
+    pydeg_df = entry['pydeg_df']
+    keep = pydeg_df['comparison'] != exclude_comparison
+    if exclude_cat1:
+        keep &= ~pydeg_df['category_1'].isin(exclude_cat1)
+    return pydeg_df[keep].groupby(keys).size().reset_index(
+        name='Peak number')
+
+
+def row_context(entry, row):
+    """
+    Record of a row of the peak table and the miRNA records of its
+    transcript, for the plots of the active row.
+    """
+    record = entry['pydeg_records'][row]
+    mirna = [entry['miRNA_records'][i]
+             for i in entry['mirna_rows'].get(record['tx_name'], [])]
+    return record, mirna
+
+
+def settings_keys(base):
+    return [int(key) for key in bib.import_vars(base)['pydeg_settings']]
+
+
+def preload():
+    # Every entry of every dataset, before the server forks its workers
+    keys = [(base, settings) for base in bib.dataset_bases()
+            for settings in settings_keys(base)]
+    for base, settings in keys:
+        get(base, settings)
+    return keys
+
+
+def build():
+    for base in bib.dataset_bases():
+        for settings in settings_keys(base):
+            write(base, settings, derive(base, settings))
+            print(f'Warm cache built for {base}, settings {settings}')
+
+
+if __name__ == "__main__":
+    build()
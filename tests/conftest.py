@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The modules read data/ and assets/ relative to the repository
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+os.chdir(repo_dir)
@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+
+from pages import intervals
+
+
+def brute_overlaps(codes, starts, stops, other):
+    return np.array([any(c == oc and start <= ostop and ostart <= stop
+                         for oc, ostart, ostop in zip(*other))
+                     for c, start, stop in zip(codes, starts, stops)],
+                    dtype=bool)
+
+
+def test_overlaps_any():
+    found = intervals.overlaps_any([0, 0, 1], [10, 30, 10], [20, 40, 20],
+                                   [0, 1], [20, 21], [25, 30])
+    # Closed intervals: [10, 20] touches [20, 25]; [10, 20] and [21, 30]
+    # are next to each other without overlapping; groups are apart
+    assert found.tolist() == [True, False, False]
+
+
+def test_overlaps_any_empty():
+    assert intervals.overlaps_any([], [], [], [0], [1], [2]).size == 0
+    assert not intervals.overlaps_any([0], [1], [2], [], [], []).any()
+
+
+def test_overlaps_any_random():
+    rng = np.random.default_rng(0)
+    left = (rng.integers(0, 3, 200), rng.integers(0, 1000, 200))
+    right = (rng.integers(0, 3, 50), rng.integers(0, 1000, 50))
+    starts, other_starts = left[1], right[1]
+    stops = starts + rng.integers(0, 30, 200)
+    other_stops = other_starts + rng.integers(0, 100, 50)
+    found = intervals.overlaps_any(left[0], starts, stops, right[0],
+                                   other_starts, other_stops)
+    expected = brute_overlaps(left[0], starts, stops,
+                              (right[0], other_starts, other_stops))
+    assert found.tolist() == expected.tolist()
+
+
+def test_shared_codes():
+    left = pd.DataFrame({'chr': ['1', '2'], 'strand': ['+', '+']})
+    right = pd.DataFrame({'chr': ['2', '3'], 'strand': ['+', '-']})
+    codes, other_codes = intervals.shared_codes(left, right,
+                                                ['chr', 'strand'])
+    assert codes[1] == other_codes[0]
+    assert len(set(codes) | set(other_codes)) == 3
+
+
+def test_region_index():
+    index = intervals.build_index(['1', '1', '2', '1'], [100, 150, 100, 10],
+                                  [200, 160, 300, 500])
+    assert intervals.query(index, '1', 160, 170).tolist() == [0, 1, 3]
+    # Touching the end of an interval, then after all but the longest
+    assert intervals.query(index, '1', 200, 200).tolist() == [0, 3]
+    assert intervals.query(index, '1', 201, 400).tolist() == [3]
+    assert intervals.query(index, '1', 501, 600).tolist() == []
+    assert intervals.query(index, '3', 0, 10).tolist() == []
+
+
+def test_region_index_empty():
+    index = intervals.build_index([], [], [])
+    assert index == {}
+    assert intervals.query(index, '1', 0, 10).size == 0
+
+
+def test_parse_region():
+    chromosomes = ['1', '2', 'Mt']
+    assert intervals.parse_region('Chr1:1,200-1,350', chromosomes) == \
+        {'chr': '1', 'start': 1200, 'stop': 1350}
+    assert intervals.parse_region('mt:300..100', chromosomes) == \
+        {'chr': 'Mt', 'start': 100, 'stop': 300}
+    assert intervals.parse_region(' 2:500 ', chromosomes) == \
+        {'chr': '2', 'start': 500, 'stop': 500}
+    assert intervals.parse_region('chromosome 2', chromosomes) == \
+        {'chr': '2', 'start': 0, 'stop': intervals.whole_chromosome}
+    assert intervals.parse_region('chrX:1-2', chromosomes) is None
+    assert intervals.parse_region('1:a-b', chromosomes) is None
+    assert intervals.parse_region('', chromosomes) is None
+    assert intervals.parse_region(None, chromosomes) is None
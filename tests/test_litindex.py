@@ -0,0 +1,43 @@
+import sqlite3
+
+import pytest
+
+from pages import litindex
+from pages.litindex import fts_query
+
+
+def test_fts_query():
+    assert fts_query('mirna AND review') == '"mirna" AND "review"'
+    assert fts_query('mirna AND NOT review') == '"mirna" NOT "review"'
+    assert fts_query('mirna[Title] OR deg*') == '"mirna" OR "deg"*'
+    assert fts_query('(mirna OR sirna) AND cleavage') == \
+        '( "mirna" OR "sirna" ) AND "cleavage"'
+
+
+def test_fts_query_parentheses():
+    assert fts_query('mirna (') == '"mirna"'
+    assert fts_query('review)') == '"review"'
+    assert fts_query('mirna AND (sirna OR') == '"mirna" AND ( "sirna" )'
+    assert fts_query('mirna AND () review') == '"mirna" AND "review"'
+
+
+def test_fts_query_unsupported_not():
+    for op_term in ('NOT review', 'mirna AND (NOT review)',
+                    'mirna OR NOT review'):
+        with pytest.raises(ValueError):
+            fts_query(op_term)
+
+
+def test_search_local_truncated_harvest():
+    conn = sqlite3.connect(':memory:')
+    conn.executescript(litindex.schema)
+    records = [{'pubmed_id': 1, 'title': 'miRNA review'},
+               {'pubmed_id': 2, 'title': 'miRNA cleavage'}]
+    litindex.add_records(conn, 'AT1G01010.1', records, 2)
+    litindex.add_records(conn, 'AT1G01020.1', records[:1], 20)
+    # Harvest at its limit: a search term goes to NCBI
+    assert litindex.search_local(conn, 'AT1G01010.1', 'review', 2) is None
+    assert len(litindex.search_local(conn, 'AT1G01010.1', None, 2)) == 2
+    # Complete harvest: answered locally
+    assert len(litindex.search_local(conn, 'AT1G01020.1', 'review', 5)) == 1
+    assert litindex.search_local(conn, 'AT1G01030.1', None, 5) is None
@@ -0,0 +1,63 @@
+from pages.bibsearch import iterMedline, parseMedlineLine
+
+record = """\
+PMID- 1
+TI  - A title split
+      over two lines.
+FAU - Doe, Jane
+FAU - Roe, Richard
+AU  - Doe J
+AID - S0000-0000(00)00000-0 [pii]
+AID - 10.1000/xyz [doi]
+OT  - miRNA
+OT  - degradome
+"""
+
+
+def test_parse_medline_line():
+    assert parseMedlineLine('PMID- 32581015\n') == ('PMID', '32581015')
+    assert parseMedlineLine(b'TI  - A title\r\n') == ('TI', 'A title')
+    assert parseMedlineLine('AB  -') == ('AB', '')
+    # Continuation lines can hold text that looks like a dash
+    assert parseMedlineLine('      31 - family') == (None, '31 - family')
+    assert parseMedlineLine('\n') == (None, '')
+
+
+def test_iter_medline():
+    second = "PMID- 2\nTI  - Other\n"
+    records = list(iterMedline((record + "\n" + second).splitlines(True)))
+    assert records == [
+        {'pubmed_id': 1, 'title': 'A title split over two lines.',
+         'authors': [{'author': 'Doe, Jane'}, {'author': 'Roe, Richard'}],
+         'doi': '10.1000/xyz', 'keywords': ['miRNA', 'degradome']},
+        {'pubmed_id': 2, 'title': 'Other'},
+    ]
+
+
+def test_iter_medline_bytes():
+    lines = [line.encode() for line in record.splitlines(True)]
+    assert list(iterMedline(lines)) == list(iterMedline(record.splitlines()))
+
+
+def test_iter_medline_empty_field():
+    lines = ["PMID- 3", "AB  -", "      Text on the next line.",
+             "AID - x [pii]"]
+    (parsed,) = iterMedline(lines)
+    assert parsed == {'pubmed_id': 3, 'abstract': 'Text on the next line.'}
+
+
+def test_iter_medline_empty():
+    assert list(iterMedline([])) == []
+    assert list(iterMedline(["\n", "\n"])) == []
+
+
+def test_iter_medline_fixture():
+    with open('benchmarks/fixtures/pubmed_medline.txt', 'rb') as handle:
+        records = list(iterMedline(handle))
+    assert [r['pubmed_id'] for r in records] == \
+        [32581015, 34718799, 26646420]
+    assert [r['doi'] for r in records] == ['10.1093/plcell/koaa049',
+                                           '10.1093/plcell/koab280',
+                                           '10.1371/journal.ppat.1005305']
+    assert records[0]['abstract'].endswith('(AT1G53290.1).')
+    assert all(r['title'] and r['authors'] for r in records)
@@ -0,0 +1,91 @@
+import copy
+
+from dash import Patch, no_update
+
+from pages import patches
+
+
+def apply(value, patch):
+    # What the browser does with a Patch (the operations used here)
+    value = copy.deepcopy(value)
+    for operation in patch.to_plotly_json()['operations']:
+        *path, last = operation['location'] or [None]
+        target = value
+        for step in path:
+            target = target[step]
+        params = operation['params']
+        if operation['operation'] == 'Delete':
+            del target[last]
+        elif operation['operation'] == 'Insert':
+            target = target[last] if last is not None else target
+            target.insert(params['index'], params['value'])
+        elif operation['operation'] == 'Assign':
+            target[last] = params['value']
+        else:
+            raise AssertionError(operation)
+    return value
+
+
+records = [{'id': i, 'text': 'x' * 50} for i in range(20)]
+
+
+def test_rows_update():
+    shown = list(range(0, 20, 2))
+    wanted = list(range(0, 20, 2))[1:] + [3]
+    wanted.sort()
+    update = patches.rows_update(records, shown, wanted)
+    assert isinstance(update, Patch)
+    assert apply([records[i] for i in shown], update) == \
+        [records[i] for i in wanted]
+
+
+def test_rows_update_whole_or_nothing():
+    # Unknown previous rows (e.g. another dataset): the rows
+    assert patches.rows_update(records, None, [1, 2]) == records[1:3]
+    assert patches.rows_update(records, [1, 2], [1, 2]) is no_update
+    # Nothing in common: the rows are smaller than the patch
+    assert patches.rows_update(records, [1, 2], [3, 4]) == records[3:5]
+    assert patches.rows_update(records, [1, 2], []) == []
+
+
+def figure(y, name='a'):
+    return {'data': [{'type': 'bar', 'x': [1, 2], 'y': y, 'name': name}],
+            'layout': {'title': {'text': 'Peaks'}, 'height': 400}}
+
+
+def test_json_update():
+    value, digest = patches.json_update(figure([1, 2]), None)
+    assert value == figure([1, 2])
+    update, same = patches.json_update(figure([1, 2]), digest)
+    assert update is no_update and same == digest
+    update, _ = patches.json_update(figure([3, 4]), digest)
+    assert isinstance(update, Patch)
+    assert apply(figure([1, 2]), update) == figure([3, 4])
+
+
+def test_json_update_new_shape():
+    _, digest = patches.json_update(figure([1, 2]), None)
+    changed = figure([1, 2])
+    changed['data'].append(figure([5, 6], 'b')['data'][0])
+    update, _ = patches.json_update(changed, digest)
+    assert update == changed
+
+
+def test_stale_view_key():
+    import app  # noqa: F401  (registers the pages)
+    from pages import bibsearch as bib
+    from pages import test_cases as tc
+    from pages import warmcache
+
+    base = bib.dataset_bases()[0]
+    key = {'base': base, 'settings': 0}
+    entry = warmcache.get(**key)
+    args = (None, None, None, None, None, None, None, 'peak', [], 1, True,
+            {})
+    _, view, _ = tc.update_dropdown_options(key, *args, None)
+    # Same view: nothing sent; the view of other settings: every row
+    assert tc.update_dropdown_options(key, *args, view)[0] is no_update
+    other = {'base': base, 'settings': 1}
+    rows, _, _ = tc.update_dropdown_options(other, *args, view)
+    assert rows == warmcache.get(**other)['pydeg_records']
+    assert len(rows) != len(entry['pydeg_records'])
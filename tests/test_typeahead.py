@@ -0,0 +1,51 @@
+import pandas as pd
+
+from pages import typeahead
+
+
+def index():
+    return typeahead.build(pd.DataFrame({
+        'tx_name': ['AT1G01010.1', 'AT1G01010.1', 'AT2G02020.1',
+                    'AT3G03030.2'],
+        'gene_name': ['NAC001', 'NAC001', 'XRN4', None],
+        'Description': ['NAC domain containing protein 1',
+                        'NAC domain containing protein 1',
+                        'exoribonuclease 4', 'Exosome subunit'],
+    }))
+
+
+def names(found):
+    return [record['tx_name'] for record in found]
+
+
+def test_prefix():
+    found = typeahead.search(index(), 'at1g')
+    # Each transcript once, pointing to its first peak
+    assert names(found) == ['AT1G01010.1']
+    assert found[0]['row'] == 0
+    assert names(typeahead.search(index(), 'xrn')) == ['AT2G02020.1']
+
+
+def test_description_words_then_contained():
+    # 'exo' starts a word of two descriptions
+    assert names(typeahead.search(index(), 'EXO')) == \
+        ['AT2G02020.1', 'AT3G03030.2']
+    # Inside a word, found through its trigrams
+    assert names(typeahead.search(index(), 'ribonuc')) == ['AT2G02020.1']
+    # Across words
+    assert names(typeahead.search(index(), 'domain  containing')) == \
+        ['AT1G01010.1']
+
+
+def test_limit_and_no_match():
+    assert len(typeahead.search(index(), 'at', limit=2)) == 2
+    assert typeahead.search(index(), 'zzz') == []
+    assert typeahead.search(index(), '   ') == []
+    # Shorter than a trigram and not a prefix
+    assert typeahead.search(index(), 'xx') == []
+
+
+def test_empty_table():
+    empty = typeahead.build(pd.DataFrame(
+        {'tx_name': [], 'gene_name': [], 'Description': []}))
+    assert typeahead.search(empty, 'at1') == []
@@ -0,0 +1,54 @@
+"""
+Production entry point.
+
+Loads every dataset found in data/ before the WSGI server forks its
+workers, so that the tables are shared copy-on-write by all of them.
+Run with gunicorn (settings in gunicorn.conf.py):
+
+    gunicorn
+    WEB_CONCURRENCY=8 GUNICORN_THREADS=4 gunicorn
+"""
+import gc
+import os
+import resource
+import time
+
+# Data files are read relative to the app folder
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+from app import server  # noqa: E402,F401
+from pages import bibsearch as bib  # noqa: E402
+from pages import overlap, warmcache  # noqa: E402
+
+
+def resident_memory_mb():
+    # Current resident memory (Linux), else the peak
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * resource.getpagesize() / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10
+
+
+def preload():
+    start = time.perf_counter()
+    bases = bib.preload_datasets()
+    # Derived tables of every dataset and setting, from data/warm when
+    # built (python -m pages.warmcache)
+    warmcache.preload()
+    # Transcript overlap of the default datasets, every pair of settings
+    overlap.preload()
+    # Dash finishes its setup (copying the callbacks registered by the
+    # pages) on the first request. Do it now: with threaded workers,
+    # requests arriving together could otherwise find no callbacks
+    server.test_client().get('/_dash-dependencies')
+    elapsed = time.perf_counter() - start
+    # Keep the loaded objects out of the garbage collector, which would
+    # otherwise touch (and copy) their memory pages in every worker
+    gc.freeze()
+    print(f"Preloaded datasets {', '.join(bases)} in {elapsed:.2f} s, "
+          f"resident memory {resident_memory_mb():.0f} MiB", flush=True)
+
+
+preload()